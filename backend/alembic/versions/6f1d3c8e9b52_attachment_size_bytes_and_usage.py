@@ -0,0 +1,94 @@
+"""attachment_size_bytes_and_usage
+
+Revision ID: 6f1d3c8e9b52
+Revises: e2b8d4f61a07
+Create Date: 2026-10-19 16:05:42.903117
+
+"""
+import os
+import re
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6f1d3c8e9b52'
+down_revision: Union[str, Sequence[str], None] = 'e2b8d4f61a07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+
+
+def parse_size(value):
+    """Inverse of the old format_file_size ("12 B", "3.00 KB", "1.23 MB")."""
+    match = re.match(r"^\s*([\d.]+)\s*([KMG]?B)\s*$", value or "", re.IGNORECASE)
+    if not match:
+        return None
+    return int(round(float(match.group(1)) * UNITS[match.group(2).upper()]))
+
+
+def format_size(size):
+    if size < 1024:
+        return f"{size} B"
+    elif size < 1024 * 1024:
+        return f"{size / 1024:.2f} KB"
+    return f"{size / (1024 * 1024):.2f} MB"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('attachments', sa.Column('file_size_bytes', sa.BigInteger(), nullable=True))
+
+    # Exact sizes first: content-addressed attachments know theirs from the blob
+    op.execute(
+        "UPDATE attachments a SET file_size_bytes = b.size FROM attachment_blobs b "
+        "WHERE a.sha256 = b.sha256 AND b.size > 0"
+    )
+    # Then the file on disk, and only as a last resort the rounded display string
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT id, file_path, file_size FROM attachments WHERE file_size_bytes IS NULL"
+    )).fetchall()
+    for attachment_id, file_path, file_size in rows:
+        path = file_path if os.path.isabs(file_path) else os.path.join(BACKEND_DIR, file_path)
+        size = os.path.getsize(path) if os.path.exists(path) else parse_size(file_size)
+        bind.execute(sa.text("UPDATE attachments SET file_size_bytes = :size WHERE id = :id"),
+                     {"size": size or 0, "id": attachment_id})
+
+    op.drop_column('attachments', 'file_size')
+    op.alter_column('attachments', 'file_size_bytes', new_column_name='file_size', nullable=False)
+
+    op.create_table('storage_usage',
+    sa.Column('scope', sa.String(length=16), nullable=False),
+    sa.Column('scope_id', postgresql.UUID(as_uuid=True), nullable=False),
+    sa.Column('total_bytes', sa.BigInteger(), nullable=False),
+    sa.Column('attachment_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('scope', 'scope_id')
+    )
+    op.execute(
+        "INSERT INTO storage_usage (scope, scope_id, total_bytes, attachment_count) "
+        "SELECT 'incident', incident_id, sum(file_size), count(*) FROM attachments GROUP BY incident_id"
+    )
+    op.execute(
+        "INSERT INTO storage_usage (scope, scope_id, total_bytes, attachment_count) "
+        "SELECT 'department', i.department_id, sum(a.file_size), count(*) FROM attachments a "
+        "JOIN incidents i ON i.id = a.incident_id WHERE i.department_id IS NOT NULL GROUP BY i.department_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('storage_usage')
+    op.alter_column('attachments', 'file_size', new_column_name='file_size_bytes')
+    op.add_column('attachments', sa.Column('file_size', sa.String(), nullable=True))
+    bind = op.get_bind()
+    rows = bind.execute(sa.text("SELECT id, file_size_bytes FROM attachments")).fetchall()
+    for attachment_id, size in rows:
+        bind.execute(sa.text("UPDATE attachments SET file_size = :size WHERE id = :id"),
+                     {"size": format_size(size), "id": attachment_id})
+    op.drop_column('attachments', 'file_size_bytes')
@@ -0,0 +1,55 @@
+"""add_attachment_blobs
+
+Revision ID: a4e7b2c9d130
+Revises: 9c3e5a1b2d47
+Create Date: 2026-10-19 12:02:51.114870
+
+"""
+import os
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4e7b2c9d130'
+down_revision: Union[str, Sequence[str], None] = '9c3e5a1b2d47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('attachment_blobs',
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('content_type', sa.String(), nullable=True),
+    sa.Column('storage_path', sa.String(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('sha256')
+    )
+
+    # Attachments hashed on upload before blobs existed: the first file of each
+    # hash becomes the blob, the others keep owning their own copy.
+    bind = op.get_bind()
+    rows = bind.execute(sa.text(
+        "SELECT sha256, min(file_path), min(content_type), count(*), min(created_at) "
+        "FROM attachments WHERE sha256 IS NOT NULL GROUP BY sha256"
+    )).fetchall()
+    for sha256, file_path, content_type, refs, created_at in rows:
+        size = os.path.getsize(file_path) if os.path.exists(file_path) else 0
+        bind.execute(sa.text(
+            "INSERT INTO attachment_blobs (sha256, size, content_type, storage_path, ref_count, created_at) "
+            "VALUES (:sha256, :size, :content_type, :storage_path, :ref_count, :created_at)"
+        ), {"sha256": sha256, "size": size, "content_type": content_type, "storage_path": file_path,
+            "ref_count": refs, "created_at": created_at})
+
+    op.create_foreign_key('attachments_sha256_fkey', 'attachments', 'attachment_blobs', ['sha256'], ['sha256'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('attachments_sha256_fkey', 'attachments', type_='foreignkey')
+    op.drop_table('attachment_blobs')
@@ -0,0 +1,42 @@
+"""add_sla_monitor
+
+Revision ID: a7e3c9f5b210
+Revises: f2c6b8e1d497
+Create Date: 2026-10-19 20:47:13.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7e3c9f5b210'
+down_revision: Union[str, Sequence[str], None] = 'f2c6b8e1d497'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('incidents', sa.Column('sla_breached_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_incidents_sla_pending', 'incidents', ['sla_breach_at'], unique=False,
+                    postgresql_where=sa.text("status IN ('OPEN', 'IN_PROGRESS') AND sla_breach_at IS NOT NULL "
+                                             "AND sla_breached_at IS NULL"))
+    op.alter_column('audit_logs', 'actor_id', existing_type=sa.UUID(), nullable=True)
+    op.create_table('leases',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('holder', sa.String(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('leases')
+    op.execute("DELETE FROM audit_logs WHERE actor_id IS NULL")
+    op.alter_column('audit_logs', 'actor_id', existing_type=sa.UUID(), nullable=False)
+    op.drop_index('ix_incidents_sla_pending', table_name='incidents')
+    op.drop_column('incidents', 'sla_breached_at')
@@ -0,0 +1,30 @@
+"""add_export_watermark_indexes
+
+Revision ID: a9d3e7c5f218
+Revises: f4a8c1e7b396
+Create Date: 2026-10-20 18:05:31.240976
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a9d3e7c5f218'
+down_revision: Union[str, Sequence[str], None] = 'f4a8c1e7b396'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_comments_created_id', 'comments', ['created_at', 'id'], unique=False)
+    op.create_index('ix_audit_logs_created_id', 'audit_logs', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_audit_logs_created_id', table_name='audit_logs')
+    op.drop_index('ix_comments_created_id', table_name='comments')
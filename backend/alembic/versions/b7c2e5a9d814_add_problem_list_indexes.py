@@ -0,0 +1,33 @@
+"""add_problem_list_indexes
+
+Revision ID: b7c2e5a9d814
+Revises: 6f1d3c8e9b52
+Create Date: 2026-10-19 17:12:30.481266
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7c2e5a9d814'
+down_revision: Union[str, Sequence[str], None] = '6f1d3c8e9b52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_problems_created', 'problems', ['created_at', 'id'], unique=False)
+    op.create_index('ix_problems_status_created', 'problems', ['status', 'created_at', 'id'], unique=False)
+    op.create_index('ix_incidents_problem_created', 'incidents', ['problem_id', 'created_at', 'id'], unique=False,
+                    postgresql_where=sa.text('problem_id IS NOT NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_incidents_problem_created', table_name='incidents')
+    op.drop_index('ix_problems_status_created', table_name='problems')
+    op.drop_index('ix_problems_created', table_name='problems')
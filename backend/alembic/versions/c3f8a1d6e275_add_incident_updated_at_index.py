@@ -0,0 +1,28 @@
+"""add_incident_updated_at_index
+
+Revision ID: c3f8a1d6e275
+Revises: b7c2e5a9d814
+Create Date: 2026-10-19 18:02:11.904113
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3f8a1d6e275'
+down_revision: Union[str, Sequence[str], None] = 'b7c2e5a9d814'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_incidents_updated_at', 'incidents', ['updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_incidents_updated_at', table_name='incidents')
@@ -0,0 +1,56 @@
+"""add_business_calendars
+
+Revision ID: c8f1a4d7e923
+Revises: b5d8e2f4a617
+Create Date: 2026-10-19 23:18:09.664120
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8f1a4d7e923'
+down_revision: Union[str, Sequence[str], None] = 'b5d8e2f4a617'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('business_calendars',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('timezone', sa.String(), nullable=False),
+    sa.Column('working_hours', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('calendar_holidays',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('calendar_id', sa.UUID(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['calendar_id'], ['business_calendars.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_calendar_holidays_calendar_day', 'calendar_holidays', ['calendar_id', 'day'], unique=True)
+    op.add_column('sla_policies', sa.Column('calendar_id', sa.UUID(), nullable=True))
+    op.create_foreign_key('sla_policies_calendar_id_fkey', 'sla_policies', 'business_calendars', ['calendar_id'], ['id'])
+    op.add_column('incidents', sa.Column('sla_paused_at', sa.DateTime(), nullable=True))
+    op.add_column('incidents', sa.Column('sla_paused_minutes', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('incidents', 'sla_paused_minutes')
+    op.drop_column('incidents', 'sla_paused_at')
+    op.drop_constraint('sla_policies_calendar_id_fkey', 'sla_policies', type_='foreignkey')
+    op.drop_column('sla_policies', 'calendar_id')
+    op.drop_index('ix_calendar_holidays_calendar_day', table_name='calendar_holidays')
+    op.drop_table('calendar_holidays')
+    op.drop_table('business_calendars')
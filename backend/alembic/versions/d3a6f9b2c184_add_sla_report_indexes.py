@@ -0,0 +1,36 @@
+"""add_sla_report_indexes
+
+Revision ID: d3a6f9b2c184
+Revises: c8f1a4d7e923
+Create Date: 2026-10-20 00:41:27.905133
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3a6f9b2c184'
+down_revision: Union[str, Sequence[str], None] = 'c8f1a4d7e923'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_incidents_sla_report', 'incidents', ['created_at'], unique=False,
+                    postgresql_include=['status', 'priority', 'department_id', 'category_id', 'assignee_id',
+                                        'sla_breach_at', 'resolved_at'],
+                    postgresql_where=sa.text('sla_breach_at IS NOT NULL'))
+    op.create_index('ix_incidents_sla_report_department', 'incidents', ['department_id', 'created_at'], unique=False,
+                    postgresql_include=['status', 'priority', 'category_id', 'assignee_id', 'sla_breach_at',
+                                        'resolved_at'],
+                    postgresql_where=sa.text('sla_breach_at IS NOT NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_incidents_sla_report_department', table_name='incidents')
+    op.drop_index('ix_incidents_sla_report', table_name='incidents')
@@ -0,0 +1,43 @@
+"""add_problem_action_schedule
+
+Revision ID: d9a4f2b7c618
+Revises: c3f8a1d6e275
+Create Date: 2026-10-19 18:41:37.215840
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd9a4f2b7c618'
+down_revision: Union[str, Sequence[str], None] = 'c3f8a1d6e275'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+OPEN_DUE = "status IN ('PENDING', 'IN_PROGRESS') AND due_date IS NOT NULL"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('problem_actions', sa.Column('reminder_sent_at', sa.DateTime(), nullable=True))
+    op.add_column('problem_actions', sa.Column('overdue_notified_at', sa.DateTime(), nullable=True))
+    # Actions that are already late must not all notify at once on the first deploy
+    op.execute(
+        f"UPDATE problem_actions SET reminder_sent_at = timezone('utc', now()), overdue_notified_at = timezone('utc', now()) "
+        f"WHERE {OPEN_DUE} AND due_date < timezone('utc', now())"
+    )
+    op.create_index('ix_problem_actions_open_due', 'problem_actions', ['due_date', 'id'], unique=False,
+                    postgresql_where=sa.text(OPEN_DUE))
+    op.create_index('ix_problem_actions_assignee_open_due', 'problem_actions', ['assignee_id', 'due_date', 'id'],
+                    unique=False, postgresql_where=sa.text(OPEN_DUE))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_problem_actions_assignee_open_due', table_name='problem_actions')
+    op.drop_index('ix_problem_actions_open_due', table_name='problem_actions')
+    op.drop_column('problem_actions', 'overdue_notified_at')
+    op.drop_column('problem_actions', 'reminder_sent_at')
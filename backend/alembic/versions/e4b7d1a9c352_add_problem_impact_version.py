@@ -0,0 +1,28 @@
+"""add_problem_impact_version
+
+Revision ID: e4b7d1a9c352
+Revises: d9a4f2b7c618
+Create Date: 2026-10-19 19:20:05.611742
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4b7d1a9c352'
+down_revision: Union[str, Sequence[str], None] = 'd9a4f2b7c618'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('problems', sa.Column('impact_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('problems', 'impact_version')
@@ -0,0 +1,41 @@
+"""add_change_request_schedule_range
+
+Revision ID: f2c6b8e1d497
+Revises: e4b7d1a9c352
+Create Date: 2026-10-19 19:58:42.330917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c6b8e1d497'
+down_revision: Union[str, Sequence[str], None] = 'e4b7d1a9c352'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Windows entered before validation existed may be inverted; they cannot form a range
+    op.execute(
+        "UPDATE change_requests SET scheduled_start = scheduled_end, scheduled_end = scheduled_start "
+        "WHERE scheduled_end < scheduled_start"
+    )
+    op.add_column('change_requests', sa.Column('schedule', postgresql.TSRANGE(), sa.Computed(
+        "CASE WHEN scheduled_start IS NOT NULL AND scheduled_end IS NOT NULL "
+        "THEN tsrange(scheduled_start, scheduled_end, '[)') END",
+        persisted=True,
+    ), nullable=True))
+    op.create_index('ix_change_requests_schedule', 'change_requests', ['schedule'], unique=False,
+                    postgresql_using='gist', postgresql_where=sa.text('schedule IS NOT NULL'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_change_requests_schedule', table_name='change_requests', postgresql_using='gist')
+    op.drop_column('change_requests', 'schedule')
@@ -0,0 +1,47 @@
+"""add_incident_resolve_sketches
+
+Revision ID: f4a8c1e7b396
+Revises: e6c2b9d4a751
+Create Date: 2026-10-20 13:47:05.662810
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f4a8c1e7b396'
+down_revision: Union[str, Sequence[str], None] = 'e6c2b9d4a751'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('incident_resolve_sketches',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('bucket_start', sa.DateTime(), nullable=False),
+    sa.Column('department_id', sa.UUID(), nullable=True),
+    sa.Column('priority', postgresql.ENUM('LOW', 'MEDIUM', 'HIGH', 'CRITICAL', name='incidentpriority', create_type=False), nullable=True),
+    sa.Column('bin', sa.Integer(), nullable=False),
+    sa.Column('incident_count', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['department_id'], ['departments.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_incident_resolve_sketches_key', 'incident_resolve_sketches',
+                    ['bucket_start', 'department_id', 'priority', 'bin'],
+                    unique=True, postgresql_nulls_not_distinct=True)
+    # Histograms of the incidents already resolved
+    from app.services import rollups
+    table = rollups.IncidentResolveSketch
+    columns = list(rollups.KEYS[table] + rollups.MEASURES[table])
+    op.execute(sa.insert(table.__table__).from_select(columns, rollups._expected(table)))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_incident_resolve_sketches_key', table_name='incident_resolve_sketches')
+    op.drop_table('incident_resolve_sketches')
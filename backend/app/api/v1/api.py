@@ -1,5 +1,5 @@
 from fastapi import APIRouter
-from app.api.v1.endpoints import auth, departments, incidents, comments, users, categories, websockets, attachments, problems, service_catalog
+from app.api.v1.endpoints import auth, departments, incidents, comments, users, categories, websockets, attachments, problems, service_catalog, notifications, changes, sla, exports
 
 api_router = APIRouter()
 api_router.include_router(auth.router, prefix="/auth", tags=["auth"])
@@ -11,4 +11,8 @@ api_router.include_router(users.router, prefix="/users", tags=["users"])
 api_router.include_router(websockets.router, tags=["websockets"])
 api_router.include_router(attachments.router, prefix="/incidents", tags=["attachments"])
 api_router.include_router(problems.router, prefix="/problems", tags=["problems"])
+api_router.include_router(changes.router, prefix="/changes", tags=["changes"])
+api_router.include_router(sla.router, prefix="/sla", tags=["sla"])
 api_router.include_router(service_catalog.router, prefix="/catalog", tags=["catalog"])
+api_router.include_router(notifications.router, prefix="/notifications", tags=["notifications"])
+api_router.include_router(exports.router, prefix="/exports", tags=["exports"])
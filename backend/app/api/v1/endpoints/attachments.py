@@ -1,63 +1,93 @@
+import logging
 import os
-import uuid
-import shutil
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, status
-from fastapi.responses import FileResponse
+from typing import List, Optional
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from app.api import deps
 from app.core.database import get_db
-from app.models.models import Attachment, Incident, User, UserRole
+from app.models.models import Attachment, AttachmentBlob, Department, Incident, StorageUsage, UploadChunk, UploadSession, User, UserRole
 from app.schemas.attachment import AttachmentInDB
+from app.schemas.upload_session import UploadChunkReceipt, UploadSessionCreate, UploadSessionStatus
+from app.services import archives, previews, resumable_uploads, storage_quota
+from app.services.uploads import receive_upload, StreamedUpload, UploadError, MULTIPART_OVERHEAD
+from app.services.blobs import acquire_blob, purge_blob, release_blob
+from app.services.storage import get_storage, legacy_path
 from pydantic import UUID4
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
-UPLOAD_DIR = "uploads"
+MULTIPART_UPLOAD_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
 
-@router.post("/{incident_id}/upload", response_model=AttachmentInDB)
+@router.post("/{incident_id}/upload", response_model=AttachmentInDB, openapi_extra=MULTIPART_UPLOAD_SCHEMA)
 async def upload_attachment(
     incident_id: UUID4,
-    file: UploadFile = File(...),
+    request: Request,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_active_user),
 ):
-    incident = db.query(Incident).filter(Incident.id == incident_id).first()
-    if not incident:
-        raise HTTPException(status_code=404, detail="Incident not found")
-    
     # Permission check: Reporter can only upload to their own incident
-    if current_user.role == UserRole.REPORTER and incident.reporter_id != current_user.id:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
+    incident = await run_in_threadpool(_get_incident_for_upload, db, incident_id, current_user)
 
-    # Create upload directory if it doesn't exist
-    if not os.path.exists(UPLOAD_DIR):
-        os.makedirs(UPLOAD_DIR)
+    # The body is parsed here, chunk by chunk, so limits apply before the file is on disk
+    storage = get_storage()
+    try:
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit():
+            # Lower bound on the file size; the exact size is charged once it is known
+            file_size = max(int(content_length) - MULTIPART_OVERHEAD, 0)
+            await run_in_threadpool(storage_quota.check_quota, db, incident, file_size)
+        upload = await receive_upload(request, storage.staging_dir)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
 
-    file_ext = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
+    attachment = await run_in_threadpool(_store_attachment, db, incident, current_user, upload)
+    _schedule_preview(background_tasks, attachment)
+    return attachment
 
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+def _store_attachment(db: Session, incident: Incident, current_user: User, upload: StreamedUpload,
+                      upload_session: Optional[UploadSession] = None) -> Attachment:
+    try:
+        # In a savepoint, so a refusal undoes a partial charge and nothing else
+        with db.begin_nested():
+            storage_quota.charge(db, incident, upload.size)
+    except UploadError as e:
+        # A resumable upload keeps its session and staged file and can be completed once there is room
+        if upload_session is None:
+            os.remove(upload.path)
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if upload_session is not None:
+        resumable_uploads.consume_session(db, upload_session)
 
-    # Get file size
-    file_size = os.path.getsize(file_path)
-    # Format file size
-    if file_size < 1024:
-        size_str = f"{file_size} B"
-    elif file_size < 1024 * 1024:
-        size_str = f"{file_size / 1024:.2f} KB"
-    else:
-        size_str = f"{file_size / (1024 * 1024):.2f} MB"
+    # Identical content is stored once and shared between attachments
+    blob = acquire_blob(db, upload, get_storage())
 
     db_obj = Attachment(
-        incident_id=incident_id,
+        incident_id=incident.id,
         uploader_id=current_user.id,
-        file_name=file.filename,
-        file_path=file_path,
-        content_type=file.content_type,
-        file_size=size_str
+        file_name=upload.filename,
+        file_path=blob.storage_path,
+        content_type=upload.content_type,
+        file_size=upload.size,
+        sha256=upload.sha256
     )
     db.add(db_obj)
     db.commit()
@@ -67,6 +97,121 @@ async def upload_attachment(
     db_obj.uploader_name = current_user.full_name or current_user.email
     return db_obj
 
+def _schedule_preview(background_tasks: BackgroundTasks, attachment: Attachment):
+    # Rendered after the response is sent, in the preview process pool
+    if previews.preview_kind(attachment.content_type):
+        background_tasks.add_task(previews.ensure_preview, get_storage(), attachment.file_path, attachment.content_type)
+
+def _get_incident_for_upload(db: Session, incident_id, current_user: User) -> Incident:
+    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    if not incident:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    if current_user.role == UserRole.REPORTER and incident.reporter_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return incident
+
+def _get_upload_session(db: Session, session_id, current_user: User) -> UploadSession:
+    session = db.query(UploadSession).filter(UploadSession.id == session_id).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    if session.uploader_id != current_user.id and current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    return session
+
+def _session_status(db: Session, session: UploadSession) -> UploadSessionStatus:
+    received = db.query(UploadChunk.chunk_index, UploadChunk.size).filter(
+        UploadChunk.session_id == session.id
+    ).order_by(UploadChunk.chunk_index).all()
+    indices = [index for index, _ in received]
+    return UploadSessionStatus(
+        id=session.id,
+        incident_id=session.incident_id,
+        file_name=session.file_name,
+        content_type=session.content_type,
+        total_size=session.total_size,
+        chunk_size=session.chunk_size,
+        total_chunks=resumable_uploads.total_chunks(session),
+        received_chunks=indices,
+        received_bytes=sum(size for _, size in received),
+        received_ranges=resumable_uploads.received_ranges(session, indices),
+        expires_at=session.expires_at,
+    )
+
+# Resumable uploads: create a session, PUT numbered chunks (in any order, possibly in
+# parallel), GET the session to see which byte ranges arrived, then complete it.
+
+@router.post("/{incident_id}/uploads", response_model=UploadSessionStatus, status_code=status.HTTP_201_CREATED)
+def create_upload_session(
+    incident_id: UUID4,
+    session_in: UploadSessionCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    incident = _get_incident_for_upload(db, incident_id, current_user)
+    try:
+        storage_quota.check_quota(db, incident, session_in.total_size)
+        session = resumable_uploads.create_session(
+            db, get_storage(), incident_id, current_user.id, session_in.file_name,
+            session_in.content_type, session_in.total_size, session_in.chunk_size,
+        )
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    db.commit()
+    db.refresh(session)
+    return _session_status(db, session)
+
+@router.get("/uploads/{session_id}", response_model=UploadSessionStatus)
+def read_upload_session(
+    session_id: UUID4,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    return _session_status(db, _get_upload_session(db, session_id, current_user))
+
+@router.put("/uploads/{session_id}/chunks/{index}", response_model=UploadChunkReceipt)
+async def upload_chunk(
+    session_id: UUID4,
+    index: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    session = await run_in_threadpool(_get_upload_session, db, session_id, current_user)
+    try:
+        chunk = await resumable_uploads.write_chunk(request, db, get_storage(), session, index)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    receipt = UploadChunkReceipt(index=chunk.chunk_index, size=chunk.size, sha256=chunk.sha256)
+    await run_in_threadpool(db.commit)
+    return receipt
+
+@router.post("/uploads/{session_id}/complete", response_model=AttachmentInDB)
+def complete_upload_session(
+    session_id: UUID4,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    session = _get_upload_session(db, session_id, current_user)
+    incident = _get_incident_for_upload(db, session.incident_id, current_user)
+    try:
+        session, upload = resumable_uploads.finalize_session(db, get_storage(), session.id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    attachment = _store_attachment(db, incident, current_user, upload, upload_session=session)
+    _schedule_preview(background_tasks, attachment)
+    return attachment
+
+@router.delete("/uploads/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+def abort_upload_session(
+    session_id: UUID4,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    session = _get_upload_session(db, session_id, current_user)
+    resumable_uploads.abort_session(db, get_storage(), session)
+    return None
+
 @router.get("/{incident_id}/attachments", response_model=List[AttachmentInDB])
 def read_attachments(
     incident_id: UUID4,
@@ -84,33 +229,154 @@ def read_attachments(
     for att in attachments:
         uploader = db.query(User).filter(User.id == att.uploader_id).first()
         att.uploader_name = uploader.full_name or uploader.email if uploader else "Unknown"
+        att.preview_kind = previews.preview_kind(att.content_type) if att.sha256 else None
         
     return attachments
 
-@router.get("/download/{attachment_id}")
-def download_attachment(
-    attachment_id: UUID4,
+@router.get("/{incident_id}/attachments/archive")
+def download_attachments_archive(
+    incident_id: UUID4,
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_active_user),
 ):
-    attachment = db.query(Attachment).filter(Attachment.id == attachment_id).first()
-    if not attachment:
+    incident = db.query(Incident).filter(Incident.id == incident_id).first()
+    if not incident:
+        raise HTTPException(status_code=404, detail="Incident not found")
+
+    if current_user.role == UserRole.REPORTER and incident.reporter_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    rows = db.query(Attachment, AttachmentBlob.storage_path).outerjoin(
+        AttachmentBlob, AttachmentBlob.sha256 == Attachment.sha256
+    ).filter(Attachment.incident_id == incident_id).order_by(Attachment.created_at).all()
+    if not rows:
+        raise HTTPException(status_code=404, detail="Incident has no attachments")
+
+    storage = get_storage()
+    names = archives.unique_names([attachment.file_name for attachment, _ in rows])
+    entries = []
+    # Missing files are left out now: once streaming starts, an error can only truncate the ZIP
+    for name, (attachment, blob_key) in zip(names, rows):
+        if blob_key and attachment.file_path == blob_key:
+            if storage.exists(blob_key):
+                entries.append(archives.ArchiveEntry(name, attachment.content_type, attachment.created_at,
+                                                     key=blob_key))
+                continue
+        elif os.path.exists(legacy_path(attachment.file_path)):
+            entries.append(archives.ArchiveEntry(name, attachment.content_type, attachment.created_at,
+                                                 path=legacy_path(attachment.file_path)))
+            continue
+        logger.warning(f"Attachment {attachment.id} left out of the archive: its file is missing")
+    if not entries:
+        raise HTTPException(status_code=404, detail="Attachment files not found")
+
+    # Generated while it is sent: no temporary file, memory bounded by one copy block
+    filename = f"{incident.incident_key}-attachments.zip"
+    return StreamingResponse(
+        archives.stream_zip(storage, entries),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+# Blobs are addressed by their hash, so a given ETag can never change content
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison function (RFC 9110 13.1.2)
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
+
+def _get_readable_attachment(db: Session, attachment_id, current_user: User):
+    # Attachment, the owning incident's reporter and the blob key in a single query
+    row = db.query(Attachment, Incident.reporter_id, AttachmentBlob.storage_path).join(
+        Incident, Incident.id == Attachment.incident_id
+    ).outerjoin(
+        AttachmentBlob, AttachmentBlob.sha256 == Attachment.sha256
+    ).filter(Attachment.id == attachment_id).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Attachment not found")
-    
+    attachment, reporter_id, blob_key = row
+
     # Check if user has access to the incident
-    incident = db.query(Incident).filter(Incident.id == attachment.incident_id).first()
-    if current_user.role == UserRole.REPORTER and incident.reporter_id != current_user.id:
+    if current_user.role == UserRole.REPORTER and reporter_id != current_user.id:
         raise HTTPException(status_code=403, detail="Not enough permissions")
+    return attachment, blob_key
 
-    if not os.path.exists(attachment.file_path):
+@router.get("/download/{attachment_id}")
+def download_attachment(
+    attachment_id: UUID4,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    attachment, blob_key = _get_readable_attachment(db, attachment_id, current_user)
+
+    headers = {}
+    if attachment.sha256:
+        headers["ETag"] = f'"{attachment.sha256}"'
+        headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    storage = get_storage()
+    if blob_key and attachment.file_path == blob_key:
+        file_path = storage.local_path(blob_key)
+        if file_path is None:
+            # Object storage serves the bytes itself (ranges included) via a short-lived URL
+            url = storage.download_url(blob_key, attachment.file_name, attachment.content_type)
+            return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT, headers=headers)
+    else:
+        file_path = legacy_path(attachment.file_path)
+
+    try:
+        stat_result = os.stat(file_path)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found on disk")
 
+    # FileResponse answers Range / If-Range (single and multipart/byteranges) against the
+    # ETag above, and hands the whole file to the server via http.response.pathsend
+    # (sendfile) when the ASGI server supports it.
     return FileResponse(
-        attachment.file_path, 
+        file_path, 
         media_type=attachment.content_type, 
-        filename=attachment.file_name
+        filename=attachment.file_name,
+        headers=headers,
+        stat_result=stat_result
     )
 
+@router.get("/preview/{attachment_id}")
+async def preview_attachment(
+    attachment_id: UUID4,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    attachment, blob_key = await run_in_threadpool(_get_readable_attachment, db, attachment_id, current_user)
+    kind = previews.preview_kind(attachment.content_type)
+    if not blob_key or attachment.file_path != blob_key or kind is None:
+        raise HTTPException(status_code=404, detail="No preview available for this attachment")
+
+    # Derived from immutable content, so it can be cached as long as the original
+    headers = {"ETag": f'"{attachment.sha256}-{kind}"', "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # Rendered on a miss: uploads from before previews existed, or a render still queued
+    storage = get_storage()
+    key = await previews.ensure_preview(storage, blob_key, attachment.content_type)
+    if key is None:
+        raise HTTPException(status_code=404, detail="No preview available for this attachment")
+
+    path = storage.local_path(key)
+    if path is None:
+        url = storage.download_url(key, f"{attachment.file_name}{previews.PREVIEW_SUFFIX[kind]}", previews.PREVIEW_MEDIA_TYPE[kind])
+        return RedirectResponse(url, status_code=status.HTTP_307_TEMPORARY_REDIRECT, headers=headers)
+    return FileResponse(path, media_type=previews.PREVIEW_MEDIA_TYPE[kind], headers=headers)
+
 @router.delete("/{attachment_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_attachment(
     attachment_id: UUID4,
@@ -125,10 +391,112 @@ def delete_attachment(
     if attachment.uploader_id != current_user.id and current_user.role != UserRole.ADMIN:
         raise HTTPException(status_code=403, detail="Not enough permissions")
 
-    # Delete from disk
-    if os.path.exists(attachment.file_path):
-        os.remove(attachment.file_path)
+    storage = get_storage()
+    # Files uploaded before content addressing are owned by this attachment alone
+    owns_file = attachment.blob is None or attachment.file_path != attachment.blob.storage_path
+    blob_key = attachment.blob.storage_path if attachment.blob else None
+    sha256 = attachment.sha256
+    file_path = legacy_path(attachment.file_path)
+    storage_quota.refund(db, attachment.incident_id, attachment.incident.department_id, attachment.file_size)
+    token = release_blob(db, sha256, storage) if sha256 else None
 
     db.delete(attachment)
-    db.commit()
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        if token:
+            storage.restore(token)
+        raise
+
+    # The shared blob is only removed once its last reference is gone
+    if token and purge_blob(db, sha256, storage, token):
+        previews.delete_previews(storage, blob_key)
+    if owns_file and os.path.exists(file_path):
+        os.remove(file_path)
     return None
+
+@router.get("/attachments/dedup-report")
+def read_dedup_report(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    blob_count, physical_bytes, logical_bytes, reference_count = db.query(
+        func.count(AttachmentBlob.sha256),
+        func.coalesce(func.sum(AttachmentBlob.size), 0),
+        func.coalesce(func.sum(AttachmentBlob.size * AttachmentBlob.ref_count), 0),
+        func.coalesce(func.sum(AttachmentBlob.ref_count), 0),
+    ).filter(AttachmentBlob.ref_count > 0).one()
+
+    top_duplicates = db.query(AttachmentBlob).filter(
+        AttachmentBlob.ref_count > 1
+    ).order_by((AttachmentBlob.size * (AttachmentBlob.ref_count - 1)).desc()).limit(10).all()
+
+    return {
+        "blob_count": blob_count,
+        "attachment_count": int(reference_count),
+        "logical_bytes": int(logical_bytes),
+        "physical_bytes": int(physical_bytes),
+        "bytes_saved": int(logical_bytes) - int(physical_bytes),
+        "top_duplicates": [
+            {
+                "sha256": b.sha256,
+                "size": b.size,
+                "references": b.ref_count,
+                "bytes_saved": b.size * (b.ref_count - 1),
+            }
+            for b in top_duplicates
+        ],
+    }
+
+@router.get("/attachments/storage-usage")
+def read_storage_usage(
+    limit: int = 20,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    total_bytes, attachment_count = db.query(
+        func.coalesce(func.sum(StorageUsage.total_bytes), 0),
+        func.coalesce(func.sum(StorageUsage.attachment_count), 0),
+    ).filter(StorageUsage.scope == storage_quota.INCIDENT_SCOPE).one()
+
+    departments = db.query(StorageUsage, Department.name).join(
+        Department, Department.id == StorageUsage.scope_id
+    ).filter(
+        StorageUsage.scope == storage_quota.DEPARTMENT_SCOPE
+    ).order_by(StorageUsage.total_bytes.desc()).all()
+
+    top_incidents = db.query(StorageUsage, Incident.incident_key, Incident.title).join(
+        Incident, Incident.id == StorageUsage.scope_id
+    ).filter(
+        StorageUsage.scope == storage_quota.INCIDENT_SCOPE
+    ).order_by(StorageUsage.total_bytes.desc()).limit(limit).all()
+
+    def quota_info(usage: StorageUsage, quota: int) -> dict:
+        return {
+            "total_bytes": usage.total_bytes,
+            "attachment_count": usage.attachment_count,
+            "quota_bytes": quota or None,
+            "percent_used": round(100 * usage.total_bytes / quota, 2) if quota else None,
+        }
+
+    return {
+        "total_bytes": int(total_bytes),
+        "attachment_count": int(attachment_count),
+        "departments": [
+            {"department_id": usage.scope_id, "name": name,
+             **quota_info(usage, storage_quota.ATTACHMENT_QUOTA_PER_DEPARTMENT)}
+            for usage, name in departments
+        ],
+        "top_incidents": [
+            {"incident_id": usage.scope_id, "incident_key": key, "title": title,
+             **quota_info(usage, storage_quota.ATTACHMENT_QUOTA_PER_INCIDENT)}
+            for usage, key, title in top_incidents
+        ],
+    }
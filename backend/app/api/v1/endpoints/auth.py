@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from app.core import security
@@ -15,7 +15,6 @@ router = APIRouter()
 @router.post("/register", response_model=UserInDB)
 def register(
     user_in: UserCreate, 
-    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db)
 ):
     user = db.query(User).filter(User.email == user_in.email).first()
@@ -33,11 +32,10 @@ def register(
         department_id=user_in.department_id,
     )
     db.add(db_obj)
+    NotificationService.send_welcome_email(db, db_obj)
     db.commit()
     db.refresh(db_obj)
     
-    background_tasks.add_task(NotificationService.send_welcome_email, db_obj)
-    
     return db_obj
 
 @router.post("/login", response_model=Token)
@@ -5,18 +5,23 @@ from app.api import deps
 from app.core.database import get_db
 from app.models.models import User, UserRole, Category, Subcategory
 from app.schemas.category import Category as CategorySchema, CategoryCreate, Subcategory as SubcategorySchema, SubcategoryCreate
+from app.services import reference_cache
 from pydantic import UUID4
 
 router = APIRouter()
 
+def _load_categories(db: Session) -> List[CategorySchema]:
+    categories = db.query(Category).options(joinedload(Category.subcategories)).order_by(Category.name, Category.id).all()
+    return [CategorySchema.model_validate(c) for c in categories]
+
 @router.get("/", response_model=List[CategorySchema])
 def read_categories(
     db: Session = Depends(get_db),
     skip: int = 0,
     limit: int = 100,
 ):
-    categories = db.query(Category).options(joinedload(Category.subcategories)).offset(skip).limit(limit).all()
-    return categories
+    categories = reference_cache.cache.get(db, reference_cache.CATEGORIES, _load_categories)
+    return categories[skip:skip + limit]
 
 @router.post("/", response_model=CategorySchema)
 def create_category(
@@ -29,6 +34,7 @@ def create_category(
     
     db_obj = Category(**category_in.dict())
     db.add(db_obj)
+    reference_cache.bump(db, reference_cache.CATEGORIES)
     db.commit()
     db.refresh(db_obj)
     return db_obj
@@ -44,6 +50,7 @@ def create_subcategory(
     
     db_obj = Subcategory(**subcategory_in.dict())
     db.add(db_obj)
+    reference_cache.bump(db, reference_cache.CATEGORIES)
     db.commit()
     db.refresh(db_obj)
     return db_obj
@@ -62,5 +69,6 @@ def delete_category(
         raise HTTPException(status_code=404, detail="Category not found")
     
     db.delete(category)
+    reference_cache.bump(db, reference_cache.CATEGORIES)
     db.commit()
     return category
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.api import deps
+from app.core.database import get_db
+from app.models.models import User
+from app.schemas.problem import ChangeCalendar, ChangeRequest as ChangeRequestSchema
+from app.services.change_calendar import ScheduleError, month_window, overlapping, validate_window
+
+router = APIRouter()
+
+MAX_WINDOW = timedelta(days=366)
+
+@router.get("/calendar", response_model=ChangeCalendar)
+def read_change_calendar(
+    year: int = Query(..., ge=2000, le=2100),
+    month: int = Query(..., ge=1, le=12),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """Every scheduled change overlapping the month, including ones that start before or end after it."""
+    start, end = month_window(year, month)
+    return ChangeCalendar(
+        year=year,
+        month=month,
+        changes=[ChangeRequestSchema.model_validate(c) for c in overlapping(db, start, end)],
+    )
+
+@router.get("/", response_model=List[ChangeRequestSchema])
+def read_changes_in_window(
+    start: datetime,
+    end: datetime,
+    active_only: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """Changes overlapping [start, end); with active_only, the ones a new change in this window would conflict with."""
+    try:
+        start, end = validate_window(start, end)
+    except ScheduleError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    if end - start > MAX_WINDOW:
+        raise HTTPException(status_code=400, detail="Window must not be longer than a year")
+    return overlapping(db, start, end, active_only=active_only)
@@ -3,11 +3,12 @@ from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
 from sqlalchemy.orm import Session, joinedload
 from app.api import deps
 from app.core.database import get_db
-from app.models.models import Incident, Comment, User, UserRole, IncidentStatus
+from app.models.models import Incident, Comment, User, UserRole, IncidentStatus, AuditLog
 from pydantic import BaseModel, UUID4
 from datetime import datetime
 from app.services.notifications import NotificationService
 from app.core.websockets import manager
+from app.services import sla_calendar, sla_monitor
 import logging
 
 logger = logging.getLogger(__name__)
@@ -82,18 +83,23 @@ def create_comment(
         author_id=current_user.id
     )
     db.add(db_obj)
+    # The reporter answering restarts an SLA clock that was waiting on them
+    if incident.sla_paused_at is not None and current_user.id == incident.reporter_id:
+        sla_calendar.resume(db, incident)
+        db.add(AuditLog(
+            incident_id=incident.id,
+            actor_id=current_user.id,
+            action="SLA_RESUMED",
+            new_value=incident.sla_breach_at.isoformat() if incident.sla_breach_at else None
+        ))
+        sla_monitor.incident_changed(db, incident.id)
+    # Queued in the same transaction as the comment itself
+    NotificationService.send_new_comment_notification(db, incident, db_obj, current_user)
     db.commit()
-    db.refresh(db_obj)
     
-    # Reload with author and incident relationships for notification
-    db_obj = db.query(Comment).options(
-        joinedload(Comment.author),
-        joinedload(Comment.incident).joinedload(Incident.reporter),
-        joinedload(Comment.incident).joinedload(Incident.assignee)
-    ).filter(Comment.id == db_obj.id).first()
+    db_obj = db.query(Comment).options(joinedload(Comment.author)).filter(Comment.id == db_obj.id).first()
 
-    logger.info(f"Triggering broadcast for new comment on: {db_obj.incident.incident_key}")
-    background_tasks.add_task(NotificationService.send_new_comment_notification, db_obj.incident, db_obj, current_user)
+    logger.info(f"Triggering broadcast for new comment on: {incident.incident_key}")
     background_tasks.add_task(manager.broadcast, {"type": "COMMENT_CREATED", "incident_id": str(incident_id)})
 
     return CommentInDB.from_orm_custom(db_obj)
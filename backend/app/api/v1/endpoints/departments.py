@@ -4,6 +4,7 @@ from sqlalchemy.orm import Session
 from app.api import deps
 from app.core.database import get_db
 from app.models.models import Department, UserRole
+from app.services import reference_cache
 from pydantic import BaseModel, UUID4
 
 router = APIRouter()
@@ -18,6 +19,9 @@ class DepartmentInDB(DepartmentBase):
     class Config:
         from_attributes = True
 
+def _load_departments(db: Session) -> List[DepartmentInDB]:
+    return [DepartmentInDB.model_validate(d) for d in db.query(Department).order_by(Department.name).all()]
+
 @router.get("/", response_model=List[DepartmentInDB])
 def read_departments(
     db: Session = Depends(get_db),
@@ -25,8 +29,8 @@ def read_departments(
     limit: int = 100,
     current_user = Depends(deps.get_current_active_user),
 ):
-    departments = db.query(Department).offset(skip).limit(limit).all()
-    return departments
+    departments = reference_cache.cache.get(db, reference_cache.DEPARTMENTS, _load_departments)
+    return departments[skip:skip + limit]
 
 @router.post("/", response_model=DepartmentInDB)
 def create_department(
@@ -39,6 +43,7 @@ def create_department(
     
     db_obj = Department(name=department_in.name, description=department_in.description)
     db.add(db_obj)
+    reference_cache.bump(db, reference_cache.DEPARTMENTS)
     db.commit()
     db.refresh(db_obj)
     return db_obj
@@ -0,0 +1,41 @@
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from app.api import deps
+from app.core.database import get_db
+from app.models.models import User, UserRole
+from app.services import analytics_export, change_calendar
+
+router = APIRouter()
+
+@router.get("/{dataset}")
+def stream_dataset(
+    dataset: str,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """Rows of ``incidents``, ``comments`` or ``audit_logs`` as an Arrow IPC stream.
+
+    ``since`` / ``until`` bound the export's watermark column (``updated_at`` for
+    incidents, ``created_at`` otherwise); pass the largest value already loaded
+    as ``since`` to fetch only what changed. Read with pyarrow.ipc.open_stream.
+    """
+    if current_user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if dataset not in analytics_export.DATASETS:
+        raise HTTPException(status_code=404, detail="Unknown dataset")
+    # Watermark columns hold naive UTC
+    since, until = change_calendar.to_utc(since), change_calendar.to_utc(until)
+    if since and until and since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+
+    # Generated while it is sent, one record batch at a time from a server-side cursor
+    return StreamingResponse(
+        analytics_export.stream_ipc(db, analytics_export.DATASETS[dataset], since, until),
+        media_type=analytics_export.IPC_MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{dataset}.arrows"'},
+    )
@@ -3,13 +3,17 @@ from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks,
 from sqlalchemy.orm import Session, joinedload
 from app.api import deps
 from app.core.database import get_db
-from app.models.models import Incident, IncidentStatus, IncidentPriority, User, UserRole, AuditLog, Department, Category, Subcategory, Comment, SLAPolicy
+from app.models.models import Incident, IncidentStatus, IncidentPriority, User, UserRole, AuditLog, Department, Category, Subcategory, Comment, SLAPolicy, IncidentRollupDaily, IncidentStatusTotal
 from pydantic import BaseModel, UUID4
 from datetime import datetime, timedelta
 from app.schemas.audit import AuditLog as AuditLogSchema
-from sqlalchemy import func
+from sqlalchemy import Float, and_, cast, func
 from app.services.notifications import NotificationService
 from app.core.websockets import manager
+from app.schemas.problem import SimilarIncident
+from app.services import change_calendar, problem_impact, resolution_sketch, rollups, similarity, sla_calendar, sla_monitor, sla_report, stats_cache
+from app.schemas.sla import SLAComplianceReport
+from app.schemas.analytics import ResolutionPercentiles
 import logging
 
 logger = logging.getLogger(__name__)
@@ -59,103 +63,153 @@ def read_incident_timeline(
         
     return results
 
-@router.get("/stats")
-def get_incident_stats(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(deps.get_current_active_user),
-):
-    if current_user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
-        raise HTTPException(status_code=403, detail="Not enough permissions")
-    
-    # Base queries
-    status_query = db.query(Incident.status, func.count(Incident.id))
-    dept_query = db.query(Department.name, func.count(Incident.id)).join(Incident, Incident.department_id == Department.id)
-    priority_query = db.query(Incident.priority, func.count(Incident.id))
-    mttr_query = db.query(Incident).filter(Incident.resolved_at != None)
-    
+def _compute_stats(db: Session, manager: bool, department_id) -> dict:
+    """Dashboard figures, read from the rollup tables maintained by services/rollups.py."""
+    totals = IncidentStatusTotal
+    daily = IncidentRollupDaily
+    total_filters, daily_filters = [], []
     # Apply department filter if Manager
-    if current_user.role == UserRole.MANAGER:
-        status_query = status_query.filter(Incident.department_id == current_user.department_id)
-        dept_query = dept_query.filter(Incident.department_id == current_user.department_id)
-        priority_query = priority_query.filter(Incident.department_id == current_user.department_id)
-        mttr_query = mttr_query.filter(Incident.department_id == current_user.department_id)
-
-    status_counts = status_query.group_by(Incident.status).all()
-    dept_counts = dept_query.group_by(Department.name).all()
-    priority_counts = priority_query.group_by(Incident.priority).all()
-
-    # MTTR Calculation
-    resolved_incidents = mttr_query.all()
-    
-    mttr_total = 0
-    mttr_count = len(resolved_incidents)
-    mttr_by_priority = {}
-
-    for inc in resolved_incidents:
-        duration = (inc.resolved_at - inc.created_at).total_seconds() / 3600 # hours
-        mttr_total += duration
-        
-        p = inc.priority
-        if p not in mttr_by_priority:
-            mttr_by_priority[p] = {"total": 0, "count": 0}
-        mttr_by_priority[p]["total"] += duration
-        mttr_by_priority[p]["count"] += 1
-
-    avg_mttr = mttr_total / mttr_count if mttr_count > 0 else 0
-    
-    # 30-Day MTTR Trend
-    thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-    trend_query = db.query(Incident).filter(Incident.resolved_at >= thirty_days_ago)
-    
-    if current_user.role == UserRole.MANAGER:
-        trend_query = trend_query.filter(Incident.department_id == current_user.department_id)
-        
-    trend_incidents = trend_query.all()
-
-    daily_mttr = {}
-    for inc in trend_incidents:
-        date_str = str(inc.resolved_at.date())
-        duration = (inc.resolved_at - inc.created_at).total_seconds() / 3600
-        
-        if date_str not in daily_mttr:
-            daily_mttr[date_str] = {"total": 0, "count": 0}
-        
-        daily_mttr[date_str]["total"] += duration
-        daily_mttr[date_str]["count"] += 1
-
+    if manager:
+        total_filters.append(totals.department_id == department_id)
+        daily_filters.append(daily.department_id == department_id)
+
+    count = func.sum(totals.incident_count)
+    status_counts = db.query(totals.status, count).filter(*total_filters) \
+        .group_by(totals.status).having(count > 0).all()
+    dept_counts = db.query(Department.name, count).join(totals, totals.department_id == Department.id) \
+        .filter(*total_filters).group_by(Department.name).having(count > 0).all()
+    priority_counts = db.query(totals.priority, count).filter(*total_filters) \
+        .group_by(totals.priority).having(count > 0).all()
+
+    # MTTR: summed resolution seconds over resolved incidents, per priority
+    resolved = func.sum(totals.resolved_count)
+    mttr_rows = db.query(totals.priority, resolved, cast(func.sum(totals.resolve_seconds_sum), Float)) \
+        .filter(*total_filters).group_by(totals.priority).having(resolved > 0).all()
+    resolved_total = sum(r for _, r, _ in mttr_rows)
+    avg_mttr = sum(seconds for _, _, seconds in mttr_rows) / resolved_total / 3600 if resolved_total else 0
+
+    # 30-Day MTTR Trend, from the daily buckets
+    thirty_days_ago = rollups.bucket(datetime.utcnow() - timedelta(days=30), "day")
+    day_resolved = func.sum(daily.resolved_count)
+    trend_rows = db.query(daily.bucket_start, day_resolved, cast(func.sum(daily.resolve_seconds_sum), Float)) \
+        .filter(daily.bucket_start >= thirty_days_ago, *daily_filters) \
+        .group_by(daily.bucket_start).having(day_resolved > 0).order_by(daily.bucket_start).all()
     resolution_trend = [
-        {"date": d, "mttr": round(data["total"] / data["count"], 2)} 
-        for d, data in sorted(daily_mttr.items())
+        {"date": str(day.date()), "mttr": round(seconds / count / 3600, 2)}
+        for day, count, seconds in trend_rows
     ]
 
     # Additional Manager specific stats: Team Workload
     team_workload = []
-    if current_user.role == UserRole.MANAGER:
-        team_members = db.query(User).filter(User.department_id == current_user.department_id).all()
-        for member in team_members:
-            open_count = db.query(func.count(Incident.id)).filter(
-                Incident.assignee_id == member.id,
-                Incident.status.in_([IncidentStatus.OPEN, IncidentStatus.IN_PROGRESS])
-            ).scalar()
-            team_workload.append({
-                "name": member.full_name or member.email,
-                "value": open_count
-            })
+    if manager:
+        open_count = func.count(Incident.id)
+        members = db.query(User.full_name, User.email, open_count).outerjoin(Incident, and_(
+            Incident.assignee_id == User.id,
+            Incident.status.in_([IncidentStatus.OPEN, IncidentStatus.IN_PROGRESS]),
+        )).filter(User.department_id == department_id) \
+            .group_by(User.id, User.full_name, User.email).order_by(User.full_name, User.email).all()
+        team_workload = [{"name": full_name or email, "value": value} for full_name, email, value in members]
+
+    # Percentiles over the same 30 days; a few slow incidents barely move them
+    now = datetime.utcnow()
+    percentiles = resolution_sketch.compute_percentiles(
+        db, now - timedelta(days=30), now,
+        scoped=manager, department_id=department_id,
+    )["overall"]
 
     mttr_stats = {
         "overall": round(avg_mttr, 2),
-        "by_priority": {str(p): round(data["total"] / data["count"], 2) for p, data in mttr_by_priority.items()}
+        "by_priority": {p.value: round(seconds / count / 3600, 2) for p, count, seconds in mttr_rows if p is not None},
+        "percentiles": {k: percentiles[k] for k in ("p50_hours", "p90_hours", "p99_hours")},
     }
 
     return {
         "by_status": {s: c for s, c in status_counts},
         "by_department": {d: c for d, c in dept_counts},
-        "by_priority": {p: d for p, d in priority_counts},
+        "by_priority": {p: c for p, c in priority_counts},
         "mttr": mttr_stats,
         "trend": resolution_trend,
         "team_workload": team_workload
     }
 
+@router.get("/stats")
+def get_incident_stats(
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """Served from services/stats_cache.py: at most a few seconds old, refreshed in the background."""
+    if current_user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    manager = current_user.role == UserRole.MANAGER
+    department_id = current_user.department_id if manager else None
+    return stats_cache.cache.get(
+        db, stats_cache.key_for(current_user.role, department_id),
+        lambda session: _compute_stats(session, manager, department_id),
+        schedule=background_tasks.add_task,
+    )
+
+SLA_REPORT_MAX_PERIOD = timedelta(days=366)
+
+@router.get("/sla-report", response_model=SLAComplianceReport)
+def get_sla_report(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    group_by: str = Query("priority", pattern="^(priority|department|category|assignee)$"),
+    bucket: str = Query("week", pattern="^(day|week|month)$"),
+    at_risk_hours: float = Query(4, gt=0, le=24 * 7),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """Met / breached / at-risk SLA counts for incidents created in [start, end), per group and per bucket."""
+    if current_user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    end = change_calendar.to_utc(end) or datetime.utcnow()
+    start = change_calendar.to_utc(start) or end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if end - start > SLA_REPORT_MAX_PERIOD:
+        raise HTTPException(status_code=400, detail="The report period cannot exceed 366 days")
+
+    try:
+        return sla_report.compute_report(
+            db, start, end, group_by=group_by, bucket=bucket, at_risk=timedelta(hours=at_risk_hours),
+            # Managers only see their own department
+            scoped=current_user.role == UserRole.MANAGER, department_id=current_user.department_id,
+        )
+    except sla_report.ReportTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.get("/resolution-percentiles", response_model=ResolutionPercentiles)
+def get_resolution_percentiles(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    mode: str = Query("sketch", pattern="^(sketch|exact)$"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """p50/p90/p99 time to resolve of incidents resolved in the days covering [start, end).
+
+    ``mode=exact`` computes them from the incidents with percentile_cont, to check the sketches.
+    """
+    if current_user.role not in [UserRole.ADMIN, UserRole.MANAGER]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+    end = change_calendar.to_utc(end) or datetime.utcnow()
+    start = change_calendar.to_utc(start) or end - timedelta(days=30)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+    if mode == "exact" and end - start > SLA_REPORT_MAX_PERIOD:
+        raise HTTPException(status_code=400, detail="Exact percentiles cannot span more than 366 days")
+
+    return resolution_sketch.compute_percentiles(
+        db, start, end, mode=mode,
+        # Managers only see their own department
+        scoped=current_user.role == UserRole.MANAGER, department_id=current_user.department_id,
+    )
+
 class IncidentBase(BaseModel):
     title: str
     description: str
@@ -176,6 +230,7 @@ class IncidentUpdate(BaseModel):
     category_id: Optional[UUID4] = None
     subcategory_id: Optional[UUID4] = None
     status_comment: Optional[str] = None
+    awaiting_reporter: Optional[bool] = None
 
 class IncidentInDB(IncidentBase):
     id: UUID4
@@ -188,6 +243,8 @@ class IncidentInDB(IncidentBase):
     updated_at: datetime
     resolved_at: Optional[datetime]
     sla_breach_at: Optional[datetime] = None
+    sla_breached_at: Optional[datetime] = None
+    sla_paused_at: Optional[datetime] = None
     
     reporter_name: Optional[str] = None
     department_name: Optional[str] = None
@@ -230,11 +287,9 @@ def create_incident(
     # Use reporter's department if not provided
     dept_id = incident_in.department_id or current_user.department_id
 
-    # Calculate SLA
-    sla_breach_at = None
-    policy = db.query(SLAPolicy).filter(SLAPolicy.priority == incident_in.priority).first()
-    if policy:
-        sla_breach_at = datetime.utcnow() + timedelta(minutes=policy.resolution_time_minutes)
+    # Calculate SLA; bulk recomputation derives it from created_at the same way
+    created_at = datetime.utcnow()
+    sla_breach_at = sla_calendar.deadline_for(db, created_at, incident_in.priority)
 
     db_obj = Incident(
         **incident_in.dict(exclude={"department_id"}),
@@ -242,9 +297,11 @@ def create_incident(
         reporter_id=current_user.id,
         department_id=dept_id,
         status=IncidentStatus.OPEN,
+        created_at=created_at,
         sla_breach_at=sla_breach_at
     )
     db.add(db_obj)
+    rollups.record_created(db, db_obj)
     db.commit()
     db.refresh(db_obj)
     
@@ -256,9 +313,12 @@ def create_incident(
         new_value=db_obj.incident_key
     )
     db.add(audit)
+    NotificationService.send_incident_creation_notification(db, db_obj, current_user)
+    if db_obj.sla_breach_at:
+        sla_monitor.incident_changed(db, db_obj.id)
     db.commit()
+    similarity.index_incident(db_obj)
 
-    background_tasks.add_task(NotificationService.send_incident_creation_notification, db_obj, current_user)
     logger.info(f"Triggering broadcast for new incident: {db_obj.incident_key}")
     background_tasks.add_task(manager.broadcast, {"type": "INCIDENT_CREATED", "id": str(db_obj.id)})
     
@@ -354,6 +414,35 @@ def read_incident(
     
     return IncidentInDB.from_orm_custom(incident)
 
+@router.get("/{id}/similar", response_model=List[SimilarIncident])
+def read_similar_incidents(
+    id: UUID4,
+    db: Session = Depends(get_db),
+    limit: int = Query(10, ge=1, le=50),
+    include_closed: bool = False,
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    if current_user.role not in [UserRole.STAFF, UserRole.MANAGER, UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+    if not similarity.index.ready:
+        raise HTTPException(status_code=503, detail="Similarity index is still being built")
+
+    incident = db.query(Incident).filter(Incident.id == id).first()
+    if not incident:
+        raise HTTPException(status_code=404, detail="Incident not found")
+
+    matches = similarity.index.query(
+        similarity.incident_text(incident.title, incident.description),
+        limit=limit, exclude=incident.id, open_only=not include_closed,
+    )
+    scores = dict(matches)
+    found = db.query(Incident).filter(Incident.id.in_(scores)).all() if scores else []
+    return sorted(
+        (SimilarIncident(id=i.id, incident_key=i.incident_key, title=i.title, status=i.status, similarity=scores[i.id])
+         for i in found),
+        key=lambda s: s.similarity, reverse=True,
+    )
+
 @router.patch("/{id}", response_model=IncidentInDB)
 def update_incident(
     id: UUID4,
@@ -370,6 +459,8 @@ def update_incident(
     is_owner = incident.reporter_id == current_user.id
     if current_user.role == UserRole.REPORTER and not is_owner:
         raise HTTPException(status_code=403, detail="Not enough permissions")
+    before = rollups.snapshot(incident)
+    reopened_at = None
 
     # 1. Title/Description Updates
     if incident_update.title:
@@ -430,19 +521,20 @@ def update_incident(
             old_value=incident.status,
             new_value=incident_update.status
         )
+        if incident.status == IncidentStatus.RESOLVED and incident_update.status == IncidentStatus.IN_PROGRESS:
+            # The rollups bucket the reopen by this exact time
+            reopened_at = audit.created_at = datetime.utcnow()
         db.add(audit)
         
-        background_tasks.add_task(
-            NotificationService.send_status_change_notification, 
-            incident, 
-            incident.status, 
-            incident_update.status
-        )
+        NotificationService.send_status_change_notification(db, incident, incident.status, incident_update.status)
         
         if incident_update.status == IncidentStatus.RESOLVED:
             incident.resolved_at = datetime.utcnow()
         
         incident.status = incident_update.status
+        # Open / resolved counts and resolution times of the linked problem change
+        problem_impact.touch(db, incident.problem_id)
+        sla_monitor.incident_changed(db, incident.id)
 
     # 3. Assignment Logic
     update_data = incident_update.dict(exclude_unset=True)
@@ -470,7 +562,7 @@ def update_incident(
         incident.assignee_id = assignee_id
         
         if new_assignee:
-            background_tasks.add_task(NotificationService.send_assignment_notification, incident, new_assignee)
+            NotificationService.send_assignment_notification(db, incident, new_assignee)
             
         if assignee_id and incident.status == IncidentStatus.OPEN:
             incident.status = IncidentStatus.IN_PROGRESS
@@ -492,9 +584,39 @@ def update_incident(
         )
         db.add(audit)
         incident.priority = incident_update.priority
+        # The SLA deadline follows the priority, counted from when the incident was raised
+        if incident.sla_paused_at is None:
+            incident.sla_breach_at = sla_calendar.deadline_for(
+                db, incident.created_at, incident.priority, incident.sla_paused_minutes or 0
+            )
+            if incident.sla_breach_at and incident.sla_breach_at > datetime.utcnow():
+                incident.sla_breached_at = None
+            sla_monitor.incident_changed(db, incident.id)
+
+    # 5. SLA clock: stopped while the incident waits on the reporter
+    if incident_update.awaiting_reporter is not None \
+            and incident_update.awaiting_reporter != (incident.sla_paused_at is not None):
+        if current_user.role not in [UserRole.MANAGER, UserRole.ADMIN, UserRole.STAFF]:
+            raise HTTPException(status_code=403, detail="Not authorized to pause the SLA")
+        if incident.status not in [IncidentStatus.OPEN, IncidentStatus.IN_PROGRESS]:
+            raise HTTPException(status_code=400, detail=f"Cannot pause the SLA of a {incident.status.lower()} incident")
+
+        if incident_update.awaiting_reporter:
+            sla_calendar.pause(incident)
+        else:
+            sla_calendar.resume(db, incident)
+        db.add(AuditLog(
+            incident_id=incident.id,
+            actor_id=current_user.id,
+            action="SLA_PAUSED" if incident_update.awaiting_reporter else "SLA_RESUMED",
+            new_value=incident.sla_breach_at.isoformat() if incident.sla_breach_at else None
+        ))
+        sla_monitor.incident_changed(db, incident.id)
 
+    rollups.record_update(db, before, incident, reopened_at)
     db.commit()
     db.refresh(incident)
+    similarity.index_incident(incident)
 
     logger.info(f"Triggering broadcast for incident update: {incident.incident_key}")
     background_tasks.add_task(manager.broadcast, {"type": "INCIDENT_UPDATED", "id": str(incident.id)})
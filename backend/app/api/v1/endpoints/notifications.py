@@ -0,0 +1,53 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from app.api import deps
+from app.core.database import get_db
+from app.models.models import User
+from app.schemas.notification import Notification as NotificationSchema, NotificationPage, UnreadCount, MarkRead
+from app.services.inbox import InboxService
+from pydantic import UUID4
+from datetime import datetime
+
+router = APIRouter()
+
+@router.get("/", response_model=NotificationPage)
+def read_notifications(
+    db: Session = Depends(get_db),
+    limit: int = Query(20, ge=1, le=100),
+    before_created_at: Optional[datetime] = None,
+    before_id: Optional[UUID4] = None,
+    unread_only: bool = False,
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    items = InboxService.list_for_user(
+        db, current_user.id, limit=limit,
+        before_created_at=before_created_at, before_id=before_id, unread_only=unread_only
+    )
+    last = items[-1] if len(items) == limit else None
+    return NotificationPage(
+        items=[NotificationSchema.model_validate(n) for n in items],
+        unread_count=InboxService.unread_count(db, current_user.id),
+        next_before_created_at=last.created_at if last else None,
+        next_before_id=last.id if last else None,
+    )
+
+@router.get("/unread-count", response_model=UnreadCount)
+def read_unread_count(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    return UnreadCount(unread_count=InboxService.unread_count(db, current_user.id))
+
+@router.post("/mark-read", response_model=UnreadCount)
+def mark_notifications_read(
+    mark_in: MarkRead,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    if not mark_in.all and mark_in.ids is None and mark_in.up_to is None:
+        raise HTTPException(status_code=400, detail="Provide ids, up_to or all=true")
+
+    InboxService.mark_read(db, current_user.id, ids=None if mark_in.all else mark_in.ids, up_to=mark_in.up_to)
+    db.commit()
+    return UnreadCount(unread_count=InboxService.unread_count(db, current_user.id))
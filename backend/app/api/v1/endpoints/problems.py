@@ -1,6 +1,7 @@
-from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session, joinedload
+from typing import Iterable, List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, selectinload
 from app.api import deps
 from app.core.database import get_db
 from app.models.models import Problem, Incident, User, UserRole, ChangeRequest, ProblemAction
@@ -12,10 +13,20 @@ from app.schemas.problem import (
     ChangeRequestCreate,
     ProblemAction as ProblemActionSchema,
     ProblemActionCreate,
-    ProblemActionUpdate
+    ProblemActionUpdate,
+    ProblemActionPage,
+    ProblemPage,
+    IncidentSummary,
+    IncidentSummaryPage,
+    ProblemCandidate,
+    ProblemImpact,
 )
+from app.services import problem_impact, similarity
+from app.services.change_calendar import ScheduleError, check_conflicts, validate_window
+from app.services.action_scheduler import ACTION_REMINDER_LEAD, open_actions, scheduler
+from collections import Counter
 from uuid import UUID
-from datetime import datetime
+from datetime import datetime, timedelta
 
 router = APIRouter()
 
@@ -44,27 +55,158 @@ def list_all_actions(
         a.assignee_name = a.assignee.full_name or a.assignee.email if a.assignee else "Unknown"
     return actions
 
-# --- Problems ---
+def _action_page(
+    db: Session,
+    current_user: User,
+    assignee_id: Optional[UUID],
+    due_from: Optional[datetime],
+    due_before: datetime,
+    limit: int,
+    after_due_date: Optional[datetime],
+    after_id: Optional[UUID],
+) -> ProblemActionPage:
+    # Served from the partial indexes on open actions with a due date, earliest first
+    query = open_actions(db.query(ProblemAction)).filter(ProblemAction.due_date < due_before)
+    if current_user.role == UserRole.REPORTER:
+        query = query.filter(ProblemAction.assignee_id == current_user.id)
+    elif assignee_id:
+        query = query.filter(ProblemAction.assignee_id == assignee_id)
+    if due_from:
+        query = query.filter(ProblemAction.due_date >= due_from)
+    if after_due_date:
+        if after_id:
+            query = query.filter(
+                (ProblemAction.due_date > after_due_date) |
+                ((ProblemAction.due_date == after_due_date) & (ProblemAction.id > after_id))
+            )
+        else:
+            query = query.filter(ProblemAction.due_date > after_due_date)
 
-@router.get("/", response_model=List[ProblemSchema])
-def list_problems(
+    actions = query.options(joinedload(ProblemAction.assignee)).order_by(
+        ProblemAction.due_date.asc(), ProblemAction.id.asc()
+    ).limit(limit).all()
+    for a in actions:
+        a.assignee_name = a.assignee.full_name or a.assignee.email if a.assignee else "Unknown"
+    last = actions[-1] if len(actions) == limit else None
+    return ProblemActionPage(
+        items=[ProblemActionSchema.model_validate(a) for a in actions],
+        next_after_due_date=last.due_date if last else None,
+        next_after_id=last.id if last else None,
+    )
+
+@router.get("/actions/overdue", response_model=ProblemActionPage)
+def list_overdue_actions(
     db: Session = Depends(get_db),
-    status: Optional[str] = None,
+    assignee_id: Optional[UUID] = None,
+    limit: int = Query(50, ge=1, le=200),
+    after_due_date: Optional[datetime] = None,
+    after_id: Optional[UUID] = None,
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    return _action_page(db, current_user, assignee_id, None, datetime.utcnow(), limit, after_due_date, after_id)
+
+@router.get("/actions/due-soon", response_model=ProblemActionPage)
+def list_due_soon_actions(
+    db: Session = Depends(get_db),
+    assignee_id: Optional[UUID] = None,
+    within_hours: Optional[float] = Query(None, gt=0, le=24 * 90),
+    limit: int = Query(50, ge=1, le=200),
+    after_due_date: Optional[datetime] = None,
+    after_id: Optional[UUID] = None,
     current_user: User = Depends(deps.get_current_active_user),
 ):
-    query = db.query(Problem).options(
-        joinedload(Problem.change_requests),
-        joinedload(Problem.actions).joinedload(ProblemAction.assignee)
+    now = datetime.utcnow()
+    window = timedelta(hours=within_hours) if within_hours else ACTION_REMINDER_LEAD
+    return _action_page(db, current_user, assignee_id, now, now + window, limit, after_due_date, after_id)
+
+# --- Problems ---
+
+def _keyset(query, model, before_created_at: Optional[datetime], before_id: Optional[UUID]):
+    # Keyset pagination on (created_at, id), newest first
+    if before_created_at:
+        if before_id:
+            query = query.filter(
+                (model.created_at < before_created_at) |
+                ((model.created_at == before_created_at) & (model.id < before_id))
+            )
+        else:
+            query = query.filter(model.created_at < before_created_at)
+    return query.order_by(model.created_at.desc(), model.id.desc())
+
+def _with_details(query):
+    # One extra query per collection for the whole page (no changes x actions cartesian product)
+    return query.options(
+        selectinload(Problem.change_requests),
+        selectinload(Problem.actions).joinedload(ProblemAction.assignee),
     )
-    if status:
-        query = query.filter(Problem.status == status)
-    
-    problems = query.all()
+
+def _prepare(db: Session, problems: Iterable[Problem]):
+    """Fills in the computed response fields: assignee names and linked-incident counts."""
+    problems = list(problems)
+    counts = dict(
+        db.query(Incident.problem_id, func.count(Incident.id)).filter(
+            Incident.problem_id.in_([p.id for p in problems])
+        ).group_by(Incident.problem_id).all()
+    ) if problems else {}
     for p in problems:
+        p.incident_count = counts.get(p.id, 0)
         for a in p.actions:
             a.assignee_name = a.assignee.full_name or a.assignee.email if a.assignee else "Unknown"
     return problems
 
+@router.get("/", response_model=ProblemPage)
+def list_problems(
+    db: Session = Depends(get_db),
+    status: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    before_created_at: Optional[datetime] = None,
+    before_id: Optional[UUID] = None,
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    query = _with_details(db.query(Problem))
+    if status:
+        query = query.filter(Problem.status == status)
+
+    problems = _prepare(db, _keyset(query, Problem, before_created_at, before_id).limit(limit).all())
+    last = problems[-1] if len(problems) == limit else None
+    return ProblemPage(
+        items=[ProblemSchema.model_validate(p) for p in problems],
+        next_before_created_at=last.created_at if last else None,
+        next_before_id=last.id if last else None,
+    )
+
+@router.get("/candidates", response_model=List[ProblemCandidate])
+def list_problem_candidates(
+    db: Session = Depends(get_db),
+    min_size: int = Query(3, ge=2),
+    limit: int = Query(20, ge=1, le=100),
+    sample: int = Query(10, ge=1, le=50),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """Clusters of near-duplicate open incidents that are not linked to a problem yet."""
+    if current_user.role not in [UserRole.STAFF, UserRole.MANAGER, UserRole.ADMIN]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if not similarity.index.ready:
+        raise HTTPException(status_code=503, detail="Similarity index is still being built")
+
+    clusters = similarity.index.clusters(min_size=min_size)[:limit]
+    sampled = {i for cluster in clusters for i in cluster[:sample]}
+    incidents = {
+        i.id: i for i in db.query(Incident).filter(Incident.id.in_(sampled)).all()
+    } if sampled else {}
+
+    candidates = []
+    for cluster in clusters:
+        members = [incidents[i] for i in cluster[:sample] if i in incidents]
+        if not members:
+            continue
+        candidates.append(ProblemCandidate(
+            size=len(cluster),
+            suggested_title=Counter(m.title for m in members).most_common(1)[0][0],
+            incidents=[IncidentSummary.model_validate(m) for m in members],
+        ))
+    return candidates
+
 @router.post("/", response_model=ProblemSchema)
 def create_problem(
     problem_in: ProblemCreate,
@@ -83,9 +225,11 @@ def create_problem(
     if incident_id:
         incident = db.query(Incident).filter(Incident.id == incident_id).first()
         if incident:
+            problem_impact.touch(db, incident.problem_id, problem.id)
             incident.problem_id = problem.id
             db.commit()
 
+    _prepare(db, [problem])
     return problem
 
 @router.get("/{id}", response_model=ProblemSchema)
@@ -94,19 +238,47 @@ def get_problem(
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_active_user),
 ):
-    problem = db.query(Problem).options(
-        joinedload(Problem.change_requests),
-        joinedload(Problem.incidents),
-        joinedload(Problem.actions).joinedload(ProblemAction.assignee)
-    ).filter(Problem.id == id).first()
+    problem = _with_details(db.query(Problem)).filter(Problem.id == id).first()
     if not problem:
         raise HTTPException(status_code=404, detail="Problem not found")
     
-    for a in problem.actions:
-        a.assignee_name = a.assignee.full_name or a.assignee.email if a.assignee else "Unknown"
-        
+    _prepare(db, [problem])
     return problem
 
+@router.get("/{id}/incidents", response_model=IncidentSummaryPage)
+def list_problem_incidents(
+    id: UUID,
+    db: Session = Depends(get_db),
+    limit: int = Query(20, ge=1, le=100),
+    before_created_at: Optional[datetime] = None,
+    before_id: Optional[UUID] = None,
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    if not db.query(Problem.id).filter(Problem.id == id).first():
+        raise HTTPException(status_code=404, detail="Problem not found")
+
+    # Served from ix_incidents_problem_created
+    query = db.query(Incident).filter(Incident.problem_id == id)
+    incidents = _keyset(query, Incident, before_created_at, before_id).limit(limit).all()
+    last = incidents[-1] if len(incidents) == limit else None
+    return IncidentSummaryPage(
+        items=[IncidentSummary.model_validate(i) for i in incidents],
+        next_before_created_at=last.created_at if last else None,
+        next_before_id=last.id if last else None,
+    )
+
+@router.get("/{id}/impact", response_model=ProblemImpact)
+def get_problem_impact(
+    id: UUID,
+    bucket: str = Query("week", pattern="^(day|week|month)$"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    problem = db.query(Problem).filter(Problem.id == id).first()
+    if not problem:
+        raise HTTPException(status_code=404, detail="Problem not found")
+    return problem_impact.get_impact(db, problem, bucket)
+
 @router.patch("/{id}", response_model=ProblemSchema)
 def update_problem(
     id: UUID,
@@ -168,6 +340,7 @@ def update_problem(
 
     db.commit()
     db.refresh(problem)
+    _prepare(db, [problem])
     return problem
 
 @router.post("/{id}/actions", response_model=ProblemActionSchema)
@@ -187,6 +360,7 @@ def create_problem_action(
     action = ProblemAction(**action_in.dict(), problem_id=id)
     db.add(action)
     db.commit()
+    scheduler.schedule(action)
     
     # Auto-trigger status update for problem (transition to MONITORING)
     if problem.status == "COUNTERMEASURE":
@@ -212,10 +386,15 @@ def update_problem_action(
         raise HTTPException(status_code=404, detail="Action not found")
     
     update_data = action_in.dict(exclude_unset=True)
+    if "due_date" in update_data and update_data["due_date"] != action.due_date:
+        # A new due date gets its own reminder and overdue events
+        action.reminder_sent_at = None
+        action.overdue_notified_at = None
     for field, value in update_data.items():
         setattr(action, field, value)
     
     db.commit()
+    scheduler.schedule(action)
     
     # Auto-trigger status update for problem (check if all completed -> CLOSED)
     problem = db.query(Problem).filter(Problem.id == id).first()
@@ -250,8 +429,10 @@ def link_incident_to_problem(
     if not incident:
         raise HTTPException(status_code=404, detail="Incident not found")
         
+    problem_impact.touch(db, incident.problem_id, id)
     incident.problem_id = id
     db.commit()
+    similarity.index_incident(incident)
     
     return {"message": "Incident linked to problem"}
 
@@ -259,6 +440,7 @@ def link_incident_to_problem(
 def create_change_request(
     id: UUID,
     change_in: ChangeRequestCreate,
+    allow_conflicts: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_active_user),
 ):
@@ -268,9 +450,26 @@ def create_change_request(
     problem = db.query(Problem).filter(Problem.id == id).first()
     if not problem:
         raise HTTPException(status_code=404, detail="Problem not found")
-        
+
+    try:
+        start, end = validate_window(change_in.scheduled_start, change_in.scheduled_end)
+    except ScheduleError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    conflicts = check_conflicts(db, start, end)
+    if conflicts and not allow_conflicts:
+        raise HTTPException(status_code=409, detail={
+            "message": "The scheduled window overlaps other active changes; pass allow_conflicts=true to schedule anyway",
+            "conflicts": [
+                {"id": str(c.id), "title": c.title, "scheduled_start": c.scheduled_start.isoformat(),
+                 "scheduled_end": c.scheduled_end.isoformat()}
+                for c in conflicts
+            ],
+        })
+
     change = ChangeRequest(
-        **change_in.dict(exclude={"problem_id"}),
+        **change_in.dict(exclude={"problem_id", "scheduled_start", "scheduled_end"}),
+        scheduled_start=start,
+        scheduled_end=end,
         problem_id=id,
         requester_id=current_user.id
     )
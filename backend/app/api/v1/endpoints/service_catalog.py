@@ -5,22 +5,27 @@ from app.api import deps
 from app.core.database import get_db
 from app.models.models import ServiceItem, Category, User, UserRole, Incident, IncidentStatus, AuditLog, IncidentPriority
 from app.schemas.service_item import ServiceItem as ServiceItemSchema, ServiceItemCreate
+from app.services import reference_cache, rollups, sla_calendar, sla_monitor
 from uuid import UUID
 from datetime import datetime
 from pydantic import BaseModel
 
 router = APIRouter()
 
+def _load_service_items(db: Session) -> List[ServiceItemSchema]:
+    items = db.query(ServiceItem).filter(ServiceItem.is_active == True).order_by(ServiceItem.name).all()
+    return [ServiceItemSchema.model_validate(item) for item in items]
+
 @router.get("/", response_model=List[ServiceItemSchema])
 def list_service_items(
     db: Session = Depends(get_db),
     category_id: Optional[UUID] = None,
     current_user: User = Depends(deps.get_current_active_user),
 ):
-    query = db.query(ServiceItem).filter(ServiceItem.is_active == True)
+    items = reference_cache.cache.get(db, reference_cache.SERVICE_ITEMS, _load_service_items)
     if category_id:
-        query = query.filter(ServiceItem.category_id == category_id)
-    return query.all()
+        items = [item for item in items if item.category_id == category_id]
+    return items
 
 @router.post("/", response_model=ServiceItemSchema)
 def create_service_item(
@@ -33,6 +38,7 @@ def create_service_item(
     
     item = ServiceItem(**item_in.dict())
     db.add(item)
+    reference_cache.bump(db, reference_cache.SERVICE_ITEMS)
     db.commit()
     db.refresh(item)
     return item
@@ -53,7 +59,9 @@ def request_service_item(
 
     count = db.query(Incident).count()
     incident_key = f"REQ-{datetime.utcnow().year}-{count + 1:03d}"
-    
+    # SLA deadline from created_at, the way bulk recomputation derives it
+    created_at = datetime.utcnow()
+
     incident = Incident(
         incident_key=incident_key,
         title=f"Request: {service_item.name}",
@@ -63,10 +71,16 @@ def request_service_item(
         reporter_id=current_user.id,
         category_id=service_item.category_id,
         department_id=current_user.department_id, # Or service item department if defined
-        service_item_id=service_item.id
+        service_item_id=service_item.id,
+        created_at=created_at,
+        sla_breach_at=sla_calendar.deadline_for(db, created_at, service_item.base_priority),
     )
     db.add(incident)
+    rollups.record_created(db, incident)
     db.commit()
     db.refresh(incident)
-    
+    if incident.sla_breach_at:
+        sla_monitor.incident_changed(db, incident.id)
+        db.commit()
+
     return {"id": incident.id, "key": incident_key, "message": "Service request submitted"}
@@ -0,0 +1,181 @@
+import logging
+from typing import List
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, selectinload
+from app.api import deps
+from app.core.database import SessionLocal, get_db
+from app.models.models import BusinessCalendar, CalendarHoliday, SLAPolicy, User, UserRole
+from app.schemas.sla import (
+    BusinessCalendar as BusinessCalendarSchema, BusinessCalendarCreate, BusinessCalendarUpdate,
+    CalendarHoliday as CalendarHolidaySchema, CalendarHolidayCreate,
+    SLAPolicy as SLAPolicySchema, SLAPolicyUpdate,
+)
+from app.services import reference_cache, sla_calendar
+from pydantic import UUID4
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+def _require_admin(user: User):
+    if user.role != UserRole.ADMIN:
+        raise HTTPException(status_code=403, detail="Not enough permissions")
+
+def _recompute(priorities):
+    """Runs after the response: moves the deadlines of open incidents to the new rules."""
+    db = SessionLocal()
+    try:
+        moved = sla_calendar.recompute_deadlines(db, priorities)
+        logger.info(f"Recomputed SLA deadlines for {[p.value for p in priorities]}: {moved} moved")
+    except Exception as e:
+        logger.error(f"SLA deadline recomputation failed: {e}")
+    finally:
+        db.close()
+
+def _priorities_on_calendar(db: Session, calendar_id) -> list:
+    return [p for (p,) in db.query(SLAPolicy.priority).filter(SLAPolicy.calendar_id == calendar_id).all()]
+
+def _get_calendar(db: Session, id) -> BusinessCalendar:
+    calendar = db.query(BusinessCalendar).options(selectinload(BusinessCalendar.holidays)) \
+        .filter(BusinessCalendar.id == id).first()
+    if not calendar:
+        raise HTTPException(status_code=404, detail="Calendar not found")
+    return calendar
+
+def _apply_update(db: Session, obj, update_data: dict, conflict: str):
+    """Sets the fields in a savepoint, so a unique clash is a 400 and leaves the transaction usable."""
+    try:
+        with db.begin_nested():
+            for field, value in update_data.items():
+                setattr(obj, field, value)
+    except IntegrityError:
+        raise HTTPException(status_code=400, detail=conflict)
+
+def _changed_calendar(db: Session, calendar: BusinessCalendar, background_tasks: BackgroundTasks):
+    reference_cache.bump(db, reference_cache.SLA_CALENDARS)
+    db.commit()
+    priorities = _priorities_on_calendar(db, calendar.id)
+    if priorities:
+        background_tasks.add_task(_recompute, priorities)
+
+@router.get("/policies", response_model=List[SLAPolicySchema])
+def read_policies(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    return db.query(SLAPolicy).order_by(SLAPolicy.resolution_time_minutes).all()
+
+@router.patch("/policies/{id}", response_model=SLAPolicySchema)
+def update_policy(
+    id: UUID4,
+    policy_in: SLAPolicyUpdate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    """Updates a policy; open incidents of the affected priorities get new deadlines in the background."""
+    _require_admin(current_user)
+    policy = db.query(SLAPolicy).filter(SLAPolicy.id == id).first()
+    if not policy:
+        raise HTTPException(status_code=404, detail="SLA policy not found")
+
+    update_data = policy_in.dict(exclude_unset=True)
+    if update_data.get("calendar_id") and not db.query(BusinessCalendar).filter(BusinessCalendar.id == update_data["calendar_id"]).first():
+        raise HTTPException(status_code=404, detail="Calendar not found")
+    affected = {policy.priority}
+    _apply_update(db, policy, update_data, "An SLA policy for this priority already exists")
+    affected.add(policy.priority)
+
+    reference_cache.bump(db, reference_cache.SLA_POLICIES)
+    db.commit()
+    db.refresh(policy)
+    background_tasks.add_task(_recompute, sorted(affected))
+    return policy
+
+@router.get("/calendars", response_model=List[BusinessCalendarSchema])
+def read_calendars(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    return db.query(BusinessCalendar).options(selectinload(BusinessCalendar.holidays)).order_by(BusinessCalendar.name).all()
+
+@router.post("/calendars", response_model=BusinessCalendarSchema)
+def create_calendar(
+    calendar_in: BusinessCalendarCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    _require_admin(current_user)
+    calendar_data = calendar_in.dict()
+    try:
+        sla_calendar.parse_hours(calendar_data["timezone"], calendar_data["working_hours"])
+    except sla_calendar.CalendarError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if db.query(BusinessCalendar).filter(BusinessCalendar.name == calendar_in.name).first():
+        raise HTTPException(status_code=400, detail="A calendar with this name already exists")
+
+    calendar = BusinessCalendar(**calendar_data)
+    db.add(calendar)
+    reference_cache.bump(db, reference_cache.SLA_CALENDARS)
+    db.commit()
+    return _get_calendar(db, calendar.id)
+
+@router.patch("/calendars/{id}", response_model=BusinessCalendarSchema)
+def update_calendar(
+    id: UUID4,
+    calendar_in: BusinessCalendarUpdate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    _require_admin(current_user)
+    calendar = _get_calendar(db, id)
+    update_data = calendar_in.dict(exclude_unset=True)
+    try:
+        sla_calendar.parse_hours(update_data.get("timezone", calendar.timezone),
+                                 update_data.get("working_hours", calendar.working_hours))
+    except sla_calendar.CalendarError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    _apply_update(db, calendar, update_data, "A calendar with this name already exists")
+
+    _changed_calendar(db, calendar, background_tasks)
+    return _get_calendar(db, id)
+
+@router.post("/calendars/{id}/holidays", response_model=CalendarHolidaySchema)
+def create_holiday(
+    id: UUID4,
+    holiday_in: CalendarHolidayCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    _require_admin(current_user)
+    calendar = _get_calendar(db, id)
+    if any(h.day == holiday_in.day for h in calendar.holidays):
+        raise HTTPException(status_code=400, detail="This day is already a holiday")
+
+    holiday = CalendarHoliday(calendar_id=calendar.id, day=holiday_in.day, name=holiday_in.name)
+    db.add(holiday)
+    _changed_calendar(db, calendar, background_tasks)
+    db.refresh(holiday)
+    return holiday
+
+@router.delete("/calendars/{id}/holidays/{holiday_id}", response_model=CalendarHolidaySchema)
+def delete_holiday(
+    id: UUID4,
+    holiday_id: UUID4,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(deps.get_current_active_user),
+):
+    _require_admin(current_user)
+    calendar = _get_calendar(db, id)
+    holiday = next((h for h in calendar.holidays if h.id == holiday_id), None)
+    if not holiday:
+        raise HTTPException(status_code=404, detail="Holiday not found")
+
+    deleted = CalendarHolidaySchema.model_validate(holiday)
+    db.delete(holiday)
+    _changed_calendar(db, calendar, background_tasks)
+    return deleted
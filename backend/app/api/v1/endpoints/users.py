@@ -6,6 +6,7 @@ from app.core.database import get_db
 from app.models.models import User, UserRole, Department
 from app.schemas.user import UserInDB, UserUpdate, UserCreate
 from app.core import security
+from app.services import reference_cache
 from pydantic import UUID4
 
 router = APIRouter()
@@ -31,6 +32,7 @@ def create_user(
         department_id=user_in.department_id,
     )
     db.add(db_obj)
+    reference_cache.bump(db, reference_cache.ASSIGNEES)
     db.commit()
     db.refresh(db_obj)
     return db_obj
@@ -67,6 +69,7 @@ def update_user_me(
         current_user.hashed_password = security.get_password_hash(user_update.password)
 
     db.add(current_user)
+    reference_cache.bump(db, reference_cache.ASSIGNEES)
     db.commit()
     db.refresh(current_user)
     return current_user
@@ -98,18 +101,22 @@ def update_user_role_dept(
     if user_update.full_name:
         user.full_name = user_update.full_name
 
+    reference_cache.bump(db, reference_cache.ASSIGNEES)
     db.commit()
     db.refresh(user)
     return user
 
+def _load_assignees(db: Session) -> List[UserInDB]:
+    # Potential assignees are users with role STAFF, MANAGER, or ADMIN
+    users = db.query(User).filter(
+        User.role.in_([UserRole.STAFF, UserRole.MANAGER, UserRole.ADMIN]),
+        User.is_active == True
+    ).order_by(User.full_name).all()
+    return [UserInDB.model_validate(u) for u in users]
+
 @router.get("/assignees", response_model=List[UserInDB])
 def read_assignees(
     db: Session = Depends(get_db),
     current_user: User = Depends(deps.get_current_active_user),
 ):
-    # Potential assignees are users with role STAFF, MANAGER, or ADMIN
-    users = db.query(User).filter(
-        User.role.in_([UserRole.STAFF, UserRole.MANAGER, UserRole.ADMIN]),
-        User.is_active == True
-    ).all()
-    return users
+    return reference_cache.cache.get(db, reference_cache.ASSIGNEES, _load_assignees)
@@ -1,20 +1,59 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from app.core.websockets import manager
+from typing import Optional, Tuple
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from jose import jwt
+from sqlalchemy.orm import Session
+from app.core import security
+from app.core.database import get_db
+from app.core.websockets import manager, decode_frame, token_from_subprotocols, TOPIC_BY_PREFIX
+from app.models.models import User
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+def _identify(db: Session, token: Optional[str]) -> Tuple[Optional[str], str]:
+    """Resolves the optional bearer token to (user_id, role). Anonymous sockets are still allowed."""
+    if not token:
+        return None, "anonymous"
+    try:
+        payload = jwt.decode(token, security.SECRET_KEY, algorithms=[security.ALGORITHM])
+    except jwt.JWTError:
+        return None, "anonymous"
+    try:
+        user = db.query(User).filter(User.id == payload.get("sub")).first()
+    finally:
+        # Don't hold a pooled DB connection for the lifetime of the socket
+        db.close()
+    if not user or not user.is_active:
+        return None, "anonymous"
+    return str(user.id), user.role.value if user.role else "REPORTER"
+
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await manager.connect(websocket)
+async def websocket_endpoint(
+    websocket: WebSocket,
+    topics: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    # Clients may request the "msgpack" subprotocol for binary frames; JSON text otherwise.
+    # They identify themselves with a "bearer.<jwt>" subprotocol, never in the URL.
+    # ?topics=incidents,comments limits which events are pushed (default: everything).
+    user_id, role = await run_in_threadpool(_identify, db, token_from_subprotocols(websocket))
+    known_topics = set(TOPIC_BY_PREFIX.values()) | {"general"}
+    topic_set = {t.strip() for t in topics.split(",") if t.strip() in known_topics} if topics else None
+    if not await manager.connect(websocket, user_id=user_id, role=role, topics=topic_set):
+        return
     try:
         while True:
-            # Wait for any data (keeps connection alive)
-            data = await websocket.receive_json()
+            # Any inbound frame counts as a heartbeat
+            event = await websocket.receive()
+            if event["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(event.get("code", 1000))
+            manager.touch(websocket)
+            data = decode_frame(event)
             if data.get("type") == "PING":
-                await websocket.send_json({"type": "PONG"})
+                await manager.send(websocket, {"type": "PONG"})
     except WebSocketDisconnect:
         logger.info("WebSocket disconnected by client")
     except Exception as e:
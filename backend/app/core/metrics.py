@@ -0,0 +1,59 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# --- WebSockets ---
+WS_CONNECTIONS = Gauge(
+    "ws_connections",
+    "Open websocket connections",
+    ["role", "topic"],
+)
+WS_BROADCAST_SECONDS = Histogram(
+    "ws_broadcast_seconds",
+    "Time to fan one event out to every subscribed socket",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+WS_SEND_FAILURES = Counter(
+    "ws_send_failures_total",
+    "Websocket sends that failed and dropped the connection",
+)
+WS_REJECTED = Counter(
+    "ws_rejected_total",
+    "Websocket connections refused at handshake",
+    ["reason"],
+)
+WS_REAPED = Counter(
+    "ws_reaped_total",
+    "Websocket connections closed by the server for being idle",
+)
+
+# --- Caches ---
+PROBLEM_IMPACT_CACHE = Counter(
+    "problem_impact_cache_total",
+    "Problem impact lookups by cache outcome",
+    ["result"],
+)
+REFERENCE_CACHE = Counter(
+    "reference_cache_total",
+    "Reference data lookups by kind and cache outcome",
+    ["kind", "result"],
+)
+REFERENCE_CACHE_INVALIDATIONS = Counter(
+    "reference_cache_invalidations_total",
+    "Cached reference data dropped, by kind and what reported the change",
+    ["kind", "source"],
+)
+STATS_CACHE = Counter(
+    "stats_cache_total",
+    "Dashboard stats lookups by scope and outcome (hit, stale, miss, wait)",
+    ["scope", "result"],
+)
+STATS_CACHE_COMPUTE_SECONDS = Histogram(
+    "stats_cache_compute_seconds",
+    "Time to compute the dashboard stats of one scope",
+    ["scope"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+STATS_CACHE_INVALIDATIONS = Counter(
+    "stats_cache_invalidations_total",
+    "Cached dashboard stats marked stale, by what reported the change",
+    ["source"],
+)
@@ -0,0 +1,90 @@
+"""Postgres LISTEN/NOTIFY fan-out between workers.
+
+One autocommit connection per worker LISTENs on every subscribed channel and
+hands payloads to callbacks on the event loop; the socket is watched with
+``add_reader`` so nothing polls. ``NOTIFY`` (``pg_notify`` in SQL) is
+transactional: a notification sent inside a transaction is delivered on
+commit and dropped on rollback. Notifications sent while the connection is
+down are lost, so subscribers that keep state can register an ``on_reconnect``
+callback to resynchronise.
+"""
+import asyncio
+import logging
+from typing import Callable, Dict, List
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from app.core.database import engine
+
+logger = logging.getLogger(__name__)
+
+RECONNECT_DELAY = 5
+
+
+def notify(db: Session, channel: str, payload: str):
+    """Queues a notification in the caller's transaction; sent when it commits."""
+    db.execute(select(func.pg_notify(channel, payload)))
+
+
+class PgListener:
+    def __init__(self):
+        self._handlers: Dict[str, List[Callable[[str], None]]] = {}
+        self._reconnect_handlers: List[Callable[[], None]] = []
+
+    def subscribe(self, channel: str, handler: Callable[[str], None]):
+        self._handlers.setdefault(channel, []).append(handler)
+
+    def on_reconnect(self, handler: Callable[[], None]):
+        self._reconnect_handlers.append(handler)
+
+    def _dispatch(self, connection, lost: asyncio.Future):
+        try:
+            connection.poll()
+        except Exception as e:
+            if not lost.done():
+                lost.set_exception(e)
+            return
+        while connection.notifies:
+            message = connection.notifies.pop(0)
+            for handler in self._handlers.get(message.channel, []):
+                try:
+                    handler(message.payload)
+                except Exception as e:
+                    logger.error(f"Handler for {message.channel} failed: {e}")
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        first = True
+        while True:
+            raw = None
+            try:
+                raw = await loop.run_in_executor(None, engine.raw_connection)
+                connection = raw.driver_connection
+                connection.autocommit = True
+                with connection.cursor() as cursor:
+                    for channel in self._handlers:
+                        cursor.execute(f'LISTEN "{channel}"')
+                if not first:
+                    for handler in self._reconnect_handlers:
+                        handler()
+                first = False
+                lost = loop.create_future()
+                loop.add_reader(connection.fileno(), self._dispatch, connection, lost)
+                try:
+                    await lost
+                finally:
+                    loop.remove_reader(connection.fileno())
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Postgres listener connection lost: {e}")
+                first = False
+            finally:
+                if raw is not None:
+                    try:
+                        raw.invalidate()
+                    except Exception:
+                        pass
+            await asyncio.sleep(RECONNECT_DELAY)
+
+
+listener = PgListener()
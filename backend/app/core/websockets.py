@@ -1,34 +1,247 @@
-from typing import List
+from typing import Dict, List, Optional, Set, Union
 from fastapi import WebSocket
+from app.core.metrics import WS_CONNECTIONS, WS_BROADCAST_SECONDS, WS_SEND_FAILURES, WS_REJECTED, WS_REAPED
+import asyncio
+import json
 import logging
+import msgpack
+import os
+import time
 
 logger = logging.getLogger(__name__)
 
+# Wire formats. JSON goes out as text frames, MessagePack as binary frames.
+# Compression (permessage-deflate) is negotiated by the ASGI server
+# (uvicorn --ws-per-message-deflate, on by default) per connection.
+JSON_FORMAT = "json"
+MSGPACK_FORMAT = "msgpack"
+MSGPACK_SUBPROTOCOL = "msgpack"
+JSON_SUBPROTOCOL = "json"
+# Browsers cannot set headers on a websocket, so the client offers its JWT as an
+# extra subprotocol ("bearer.<token>") next to its format. Unlike ?token=, the
+# Sec-WebSocket-Protocol header stays out of access logs; it is never echoed back.
+TOKEN_SUBPROTOCOL_PREFIX = "bearer."
+
+WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "25"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "75"))
+WS_MAX_CONNECTIONS_PER_IP = int(os.getenv("WS_MAX_CONNECTIONS_PER_IP", "20"))
+WS_MAX_CONNECTIONS_PER_USER = int(os.getenv("WS_MAX_CONNECTIONS_PER_USER", "10"))
+WS_MAX_CONNECTIONS = int(os.getenv("WS_MAX_CONNECTIONS", "10000"))
+WS_DRAIN_TIMEOUT = float(os.getenv("WS_DRAIN_TIMEOUT", "5"))
+
+# Close codes
+CLOSE_POLICY_VIOLATION = 1008
+CLOSE_SERVICE_RESTART = 1012
+CLOSE_TRY_AGAIN_LATER = 1013
+
+ALL_TOPICS = "all"
+TOPIC_BY_PREFIX = {
+    "INCIDENT": "incidents",
+    "COMMENT": "comments",
+    "ACTION": "actions",
+}
+
+def topic_for(message: dict) -> str:
+    return TOPIC_BY_PREFIX.get(str(message.get("type", "")).split("_", 1)[0], "general")
+
+def negotiate_format(websocket: WebSocket) -> str:
+    requested = websocket.scope.get("subprotocols") or []
+    if MSGPACK_SUBPROTOCOL in requested:
+        return MSGPACK_FORMAT
+    return JSON_FORMAT
+
+def accepted_subprotocol(websocket: WebSocket, fmt: str) -> Optional[str]:
+    """The subprotocol to answer with: one the client offered, never the token."""
+    if fmt == MSGPACK_FORMAT:
+        return MSGPACK_SUBPROTOCOL
+    if JSON_SUBPROTOCOL in (websocket.scope.get("subprotocols") or []):
+        return JSON_SUBPROTOCOL
+    return None
+
+def token_from_subprotocols(websocket: WebSocket) -> Optional[str]:
+    for protocol in websocket.scope.get("subprotocols") or []:
+        if protocol.startswith(TOKEN_SUBPROTOCOL_PREFIX):
+            return protocol[len(TOKEN_SUBPROTOCOL_PREFIX):]
+    return None
+
+def encode_frame(message: dict, fmt: str) -> Union[str, bytes]:
+    if fmt == MSGPACK_FORMAT:
+        return msgpack.packb(message, use_bin_type=True)
+    return json.dumps(message, separators=(",", ":"))
+
+def decode_frame(data: dict) -> dict:
+    """Decodes a raw ``websocket.receive()`` event in either format."""
+    if data.get("bytes") is not None:
+        return msgpack.unpackb(data["bytes"], raw=False)
+    if data.get("text") is not None:
+        return json.loads(data["text"])
+    return {}
+
+class ConnectionInfo:
+    def __init__(self, fmt: str, client_ip: str, user_id: Optional[str], role: str, topics: Set[str]):
+        self.fmt = fmt
+        self.client_ip = client_ip
+        self.user_id = user_id
+        self.role = role
+        self.topics = topics
+        self.last_seen = time.monotonic()
+
+    def wants(self, topic: str) -> bool:
+        return ALL_TOPICS in self.topics or topic in self.topics
+
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        self.connections: Dict[WebSocket, ConnectionInfo] = {}
+        self.per_ip: Dict[str, int] = {}
+        self.per_user: Dict[str, int] = {}
+        self.draining = False
+        self._heartbeat_task: Optional[asyncio.Task] = None
+
+    def _rejection_reason(self, client_ip: str, user_id: Optional[str]) -> Optional[str]:
+        if self.draining:
+            return "draining"
+        if len(self.active_connections) >= WS_MAX_CONNECTIONS:
+            return "global_limit"
+        if self.per_ip.get(client_ip, 0) >= WS_MAX_CONNECTIONS_PER_IP:
+            return "ip_limit"
+        if user_id and self.per_user.get(user_id, 0) >= WS_MAX_CONNECTIONS_PER_USER:
+            return "user_limit"
+        return None
 
-    async def connect(self, websocket: WebSocket):
-        await websocket.accept()
+    async def connect(self, websocket: WebSocket, user_id: Optional[str] = None, role: str = "anonymous",
+                      topics: Optional[Set[str]] = None) -> bool:
+        client_ip = websocket.client.host if websocket.client else "unknown"
+        reason = self._rejection_reason(client_ip, user_id)
+        if reason:
+            WS_REJECTED.labels(reason=reason).inc()
+            logger.warning(f"WebSocket rejected ({reason}) for ip={client_ip} user={user_id}")
+            # Per-client caps are the client's doing; a full or draining worker is worth retrying
+            await websocket.close(code=CLOSE_POLICY_VIOLATION if reason in ("ip_limit", "user_limit")
+                                  else CLOSE_TRY_AGAIN_LATER)
+            return False
+
+        fmt = negotiate_format(websocket)
+        await websocket.accept(subprotocol=accepted_subprotocol(websocket, fmt))
+        info = ConnectionInfo(fmt, client_ip, user_id, role, topics or {ALL_TOPICS})
         self.active_connections.append(websocket)
-        logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
+        self.connections[websocket] = info
+        self.per_ip[client_ip] = self.per_ip.get(client_ip, 0) + 1
+        if user_id:
+            self.per_user[user_id] = self.per_user.get(user_id, 0) + 1
+        for topic in info.topics:
+            WS_CONNECTIONS.labels(role=role, topic=topic).inc()
+        logger.info(f"WebSocket connected ({fmt}, role={role}). Total connections: {len(self.active_connections)}")
+        return True
 
     def disconnect(self, websocket: WebSocket):
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+            info = self.connections.pop(websocket)
+            self.per_ip[info.client_ip] -= 1
+            if not self.per_ip[info.client_ip]:
+                del self.per_ip[info.client_ip]
+            if info.user_id:
+                self.per_user[info.user_id] -= 1
+                if not self.per_user[info.user_id]:
+                    del self.per_user[info.user_id]
+            for topic in info.topics:
+                WS_CONNECTIONS.labels(role=info.role, topic=topic).dec()
             logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
 
+    def touch(self, websocket: WebSocket):
+        info = self.connections.get(websocket)
+        if info:
+            info.last_seen = time.monotonic()
+
+    async def send_frame(self, websocket: WebSocket, frame: Union[str, bytes]):
+        if isinstance(frame, bytes):
+            await websocket.send_bytes(frame)
+        else:
+            await websocket.send_text(frame)
+
+    async def send(self, websocket: WebSocket, message: dict):
+        info = self.connections.get(websocket)
+        await self.send_frame(websocket, encode_frame(message, info.fmt if info else JSON_FORMAT))
+
     async def broadcast(self, message: dict):
         disconnected = []
+        topic = topic_for(message)
+        # Pre-encoded frame cache: each event is serialized once per wire format, not once per socket
+        frames: Dict[str, Union[str, bytes]] = {}
         logger.info(f"Broadcasting to {len(self.active_connections)} connections: {message.get('type')}")
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.error(f"Broadcast error: {e}")
-                disconnected.append(connection)
-        
+        with WS_BROADCAST_SECONDS.time():
+            for connection in list(self.active_connections):
+                info = self.connections.get(connection)
+                if info is None or not info.wants(topic):
+                    continue
+                if info.fmt not in frames:
+                    frames[info.fmt] = encode_frame(message, info.fmt)
+                try:
+                    await self.send_frame(connection, frames[info.fmt])
+                except Exception as e:
+                    logger.error(f"Broadcast error: {e}")
+                    WS_SEND_FAILURES.inc()
+                    disconnected.append(connection)
+
         for connection in disconnected:
             self.disconnect(connection)
 
+    async def _close(self, websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+        self.disconnect(websocket)
+
+    async def heartbeat(self):
+        """Pings every socket and reaps the ones that have gone quiet for too long.
+
+        Any inbound frame (including the client's PONG) counts as a sign of life.
+        """
+        while True:
+            await asyncio.sleep(WS_HEARTBEAT_INTERVAL)
+            await self.sweep()
+
+    async def sweep(self):
+        """One heartbeat round: closes idle sockets and pings the rest."""
+        now = time.monotonic()
+        frames: Dict[str, Union[str, bytes]] = {}
+        for connection in list(self.active_connections):
+            info = self.connections.get(connection)
+            if info is None:
+                continue
+            if now - info.last_seen > WS_IDLE_TIMEOUT:
+                logger.info(f"Reaping idle websocket from {info.client_ip}")
+                WS_REAPED.inc()
+                await self._close(connection, CLOSE_POLICY_VIOLATION)
+                continue
+            if info.fmt not in frames:
+                frames[info.fmt] = encode_frame({"type": "PING"}, info.fmt)
+            try:
+                await self.send_frame(connection, frames[info.fmt])
+            except Exception:
+                WS_SEND_FAILURES.inc()
+                self.disconnect(connection)
+
+    def start(self):
+        self.draining = False
+        if self._heartbeat_task is None:
+            self._heartbeat_task = asyncio.create_task(self.heartbeat())
+
+    async def drain(self):
+        """Stops accepting sockets and closes the open ones with 1012 so clients reconnect elsewhere."""
+        self.draining = True
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        connections = list(self.active_connections)
+        if not connections:
+            return
+        logger.info(f"Draining {len(connections)} websocket connections")
+        await asyncio.wait(
+            [asyncio.create_task(self._close(c, CLOSE_SERVICE_RESTART)) for c in connections],
+            timeout=WS_DRAIN_TIMEOUT,
+        )
+
 manager = ConnectionManager()
@@ -1,9 +1,19 @@
-from fastapi import FastAPI, Depends
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from app.api.v1.api import api_router
 from app.core.database import get_db
+from app.core.websockets import manager
+from app.services.resumable_uploads import run_cleanup_loop
+from app.services.previews import shutdown_pool
+from app.services.similarity import run_similarity_loop
+from app.services.action_scheduler import run_action_scheduler
+from app.services.sla_monitor import run_sla_monitor
+from app.core.pg_listen import listener
 from sqlalchemy.orm import Session
 from sqlalchemy import text
+import asyncio
 import logging
 
 # Configure logging
@@ -13,7 +23,31 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="ServiceNow Incident Management API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    manager.start()
+    # Cross-worker notifications (SLA changes and breach events)
+    pg_listener = asyncio.create_task(listener.run())
+    # Expires abandoned resumable upload sessions
+    upload_cleanup = asyncio.create_task(run_cleanup_loop())
+    # Builds the near-duplicate index in the background, then keeps it current
+    similarity_refresh = asyncio.create_task(run_similarity_loop())
+    # Due-soon reminders and overdue events for problem actions
+    action_scheduler = asyncio.create_task(run_action_scheduler())
+    # Only the worker holding the lease watches deadlines; the others stand by
+    sla_monitor = asyncio.create_task(run_sla_monitor())
+    yield
+    sla_monitor.cancel()
+    await asyncio.gather(sla_monitor, return_exceptions=True)
+    pg_listener.cancel()
+    action_scheduler.cancel()
+    upload_cleanup.cancel()
+    similarity_refresh.cancel()
+    shutdown_pool()
+    # Graceful shutdown: tell websocket clients to reconnect to another worker
+    await manager.drain()
+
+app = FastAPI(title="ServiceNow Incident Management API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -40,4 +74,8 @@ async def health_check(db: Session = Depends(get_db)):
     except Exception as e:
         return {"status": "unhealthy", "db": str(e)}
 
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 app.include_router(api_router, prefix="/api/v1")
@@ -2,8 +2,8 @@ import enum
 import uuid
 from datetime import datetime
 from typing import List, Optional
-from sqlalchemy import Column, String, Boolean, Enum, ForeignKey, DateTime, Text, Integer
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Column, String, Boolean, Enum, ForeignKey, DateTime, Date, Text, Integer, BigInteger, Index, Computed, text
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSRANGE
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
@@ -26,6 +26,11 @@ class IncidentPriority(str, enum.Enum):
     HIGH = "HIGH"
     CRITICAL = "CRITICAL"
 
+class OutboxStatus(str, enum.Enum):
+    PENDING = "PENDING"
+    SENT = "SENT"
+    FAILED = "FAILED"
+
 class User(Base):
     __tablename__ = "users"
 
@@ -112,6 +117,33 @@ class Incident(Base):
     service_item = relationship("ServiceItem", back_populates="incidents")
 
     sla_breach_at = Column(DateTime, nullable=True)
+    # Set once by the SLA monitor when the deadline passes while the incident is open
+    sla_breached_at = Column(DateTime, nullable=True)
+    # The SLA clock stops while the incident waits on the reporter; sla_breach_at is NULL meanwhile
+    sla_paused_at = Column(DateTime, nullable=True)
+    # Business minutes spent paused so far, added to the policy's resolution time
+    sla_paused_minutes = Column(Integer, default=0, server_default="0", nullable=False)
+
+    __table_args__ = (
+        # Linked-incident counts and the paginated incident list of a problem
+        Index("ix_incidents_problem_created", "problem_id", "created_at", "id",
+              postgresql_where=text("problem_id IS NOT NULL")),
+        # Catch-up scans of the similarity index
+        Index("ix_incidents_updated_at", "updated_at"),
+        # Deadlines the SLA monitor still has to watch
+        Index("ix_incidents_sla_pending", "sla_breach_at",
+              postgresql_where=text("status IN ('OPEN', 'IN_PROGRESS') AND sla_breach_at IS NOT NULL "
+                                    "AND sla_breached_at IS NULL")),
+        # SLA compliance report: every column it reads, so a period is an index-only scan
+        Index("ix_incidents_sla_report", "created_at",
+              postgresql_include=["status", "priority", "department_id", "category_id", "assignee_id",
+                                  "sla_breach_at", "resolved_at"],
+              postgresql_where=text("sla_breach_at IS NOT NULL")),
+        # The same for a manager's department
+        Index("ix_incidents_sla_report_department", "department_id", "created_at",
+              postgresql_include=["status", "priority", "category_id", "assignee_id", "sla_breach_at", "resolved_at"],
+              postgresql_where=text("sla_breach_at IS NOT NULL")),
+    )
 
 
 class Problem(Base):
@@ -131,12 +163,20 @@ class Problem(Base):
     creator_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     resolved_at = Column(DateTime, nullable=True)
+    # Bumped whenever a linked incident is added, removed or changes status (see services.problem_impact)
+    impact_version = Column(Integer, default=0, nullable=False)
 
     creator = relationship("User", foreign_keys=[creator_id])
     incidents = relationship("Incident", back_populates="problem")
     change_requests = relationship("ChangeRequest", back_populates="problem")
     actions = relationship("ProblemAction", back_populates="problem")
 
+    __table_args__ = (
+        # Keyset pagination of the problem list, optionally filtered by status
+        Index("ix_problems_created", "created_at", "id"),
+        Index("ix_problems_status_created", "status", "created_at", "id"),
+    )
+
 
 class ProblemAction(Base):
     __tablename__ = "problem_actions"
@@ -148,10 +188,21 @@ class ProblemAction(Base):
     due_date = Column(DateTime, nullable=True)
     status = Column(String, default="PENDING") # PENDING, IN_PROGRESS, COMPLETED, CANCELLED
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Set once by the scheduler that sent the event; cleared when the due date moves
+    reminder_sent_at = Column(DateTime, nullable=True)
+    overdue_notified_at = Column(DateTime, nullable=True)
 
     problem = relationship("Problem", back_populates="actions")
     assignee = relationship("User")
 
+    __table_args__ = (
+        # Only open actions with a due date are scheduled or reported as overdue / due soon
+        Index("ix_problem_actions_open_due", "due_date", "id",
+              postgresql_where=text("status IN ('PENDING', 'IN_PROGRESS') AND due_date IS NOT NULL")),
+        Index("ix_problem_actions_assignee_open_due", "assignee_id", "due_date", "id",
+              postgresql_where=text("status IN ('PENDING', 'IN_PROGRESS') AND due_date IS NOT NULL")),
+    )
+
 
 class ChangeRequest(Base):
     __tablename__ = "change_requests"
@@ -168,10 +219,21 @@ class ChangeRequest(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     scheduled_start = Column(DateTime, nullable=True)
     scheduled_end = Column(DateTime, nullable=True)
+    # [scheduled_start, scheduled_end) for overlap queries (see services.change_calendar)
+    schedule = Column(TSRANGE, Computed(
+        "CASE WHEN scheduled_start IS NOT NULL AND scheduled_end IS NOT NULL "
+        "THEN tsrange(scheduled_start, scheduled_end, '[)') END",
+        persisted=True,
+    ))
 
     problem = relationship("Problem", back_populates="change_requests")
     requester = relationship("User")
 
+    __table_args__ = (
+        Index("ix_change_requests_schedule", "schedule", postgresql_using="gist",
+              postgresql_where=text("schedule IS NOT NULL")),
+    )
+
 
 class ServiceItem(Base):
     __tablename__ = "service_items"
@@ -197,6 +259,40 @@ class SLAPolicy(Base):
     priority = Column(Enum(IncidentPriority), unique=True, nullable=False)
     response_time_minutes = Column(Integer, default=60)
     resolution_time_minutes = Column(Integer, default=1440)  # 24 hours
+    # Business minutes are counted on this calendar; wall-clock minutes when unset
+    calendar_id = Column(UUID(as_uuid=True), ForeignKey("business_calendars.id"), nullable=True)
+
+    calendar = relationship("BusinessCalendar")
+
+
+class BusinessCalendar(Base):
+    """Working hours SLA time is counted in; see services/sla_calendar.py."""
+    __tablename__ = "business_calendars"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    name = Column(String, unique=True, nullable=False)
+    timezone = Column(String, default="UTC", nullable=False)
+    # [{"weekday": 0-6 (Monday is 0), "start": "09:00", "end": "17:30"}, ...] in local time
+    working_hours = Column(JSONB, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    holidays = relationship("CalendarHoliday", back_populates="calendar", cascade="all, delete-orphan",
+                            order_by="CalendarHoliday.day")
+
+
+class CalendarHoliday(Base):
+    __tablename__ = "calendar_holidays"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    calendar_id = Column(UUID(as_uuid=True), ForeignKey("business_calendars.id", ondelete="CASCADE"), nullable=False)
+    day = Column(Date, nullable=False)
+    name = Column(String)
+
+    calendar = relationship("BusinessCalendar", back_populates="holidays")
+
+    __table_args__ = (
+        Index("ix_calendar_holidays_calendar_day", "calendar_id", "day", unique=True),
+    )
 
 
 class Comment(Base):
@@ -212,12 +308,18 @@ class Comment(Base):
     incident = relationship("Incident", back_populates="comments")
     author = relationship("User", foreign_keys=[author_id])
 
+    __table_args__ = (
+        # Incremental analytics exports read in (created_at, id) order
+        Index("ix_comments_created_id", "created_at", "id"),
+    )
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     incident_id = Column(UUID(as_uuid=True), ForeignKey("incidents.id"), nullable=False)
-    actor_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    # None for events recorded by the system itself (e.g. SLA_BREACH)
+    actor_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
     action = Column(String, nullable=False)
     old_value = Column(String, nullable=True)
     new_value = Column(String, nullable=True)
@@ -225,6 +327,11 @@ class AuditLog(Base):
 
     incident = relationship("Incident", back_populates="audit_logs")
 
+    __table_args__ = (
+        # Incremental analytics exports read in (created_at, id) order
+        Index("ix_audit_logs_created_id", "created_at", "id"),
+    )
+
 class Attachment(Base):
     __tablename__ = "attachments"
 
@@ -234,8 +341,195 @@ class Attachment(Base):
     file_name = Column(String, nullable=False)
     file_path = Column(String, nullable=False)
     content_type = Column(String, nullable=False)
-    file_size = Column(String, nullable=True)
+    file_size = Column(BigInteger, nullable=False, default=0)
+    sha256 = Column(String(64), ForeignKey("attachment_blobs.sha256"), nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     incident = relationship("Incident", back_populates="attachments")
     uploader = relationship("User")
+    blob = relationship("AttachmentBlob", back_populates="attachments")
+
+class AttachmentBlob(Base):
+    """Content-addressed file shared by every attachment with the same SHA-256."""
+    __tablename__ = "attachment_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    content_type = Column(String, nullable=True)
+    storage_path = Column(String, nullable=False)
+    ref_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    attachments = relationship("Attachment", back_populates="blob")
+
+class StorageUsage(Base):
+    """Attachment bytes per incident and per department, maintained on upload and delete."""
+    __tablename__ = "storage_usage"
+
+    scope = Column(String(16), primary_key=True)  # "incident" or "department"
+    scope_id = Column(UUID(as_uuid=True), primary_key=True)
+    total_bytes = Column(BigInteger, default=0, nullable=False)
+    attachment_count = Column(Integer, default=0, nullable=False)
+
+class UploadSession(Base):
+    """Resumable upload in progress; chunks are written straight into one staged file."""
+    __tablename__ = "upload_sessions"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    incident_id = Column(UUID(as_uuid=True), ForeignKey("incidents.id"), nullable=False)
+    uploader_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    file_name = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    total_size = Column(BigInteger, nullable=False)
+    chunk_size = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    chunks = relationship("UploadChunk", cascade="all, delete-orphan", passive_deletes=True)
+
+class UploadChunk(Base):
+    __tablename__ = "upload_chunks"
+
+    session_id = Column(UUID(as_uuid=True), ForeignKey("upload_sessions.id", ondelete="CASCADE"), primary_key=True)
+    chunk_index = Column(Integer, primary_key=True)
+    size = Column(Integer, nullable=False)
+    sha256 = Column(String(64), nullable=False)
+    received_at = Column(DateTime, default=datetime.utcnow)
+
+class NotificationOutbox(Base):
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        # The worker only ever scans due, pending rows
+        Index("ix_notification_outbox_pending", "next_attempt_at", postgresql_where=text("status = 'PENDING'")),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    template = Column(String, nullable=False)  # e.g. incident_created, assignment, new_comment
+    recipient_email = Column(String, nullable=False)
+    context = Column(JSONB, nullable=False, default=dict)  # plain data used to render the message
+    status = Column(Enum(OutboxStatus), default=OutboxStatus.PENDING, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+
+
+class Notification(Base):
+    __tablename__ = "notifications"
+    __table_args__ = (
+        Index("ix_notifications_user_created", "user_id", "created_at", "id"),
+        Index("ix_notifications_user_unread", "user_id", "created_at", postgresql_where=text("is_read = false")),
+    )
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    type = Column(String, nullable=False)  # ASSIGNMENT, COMMENT, STATUS_CHANGE
+    title = Column(String, nullable=False)
+    message = Column(Text)
+    incident_id = Column(UUID(as_uuid=True), ForeignKey("incidents.id"), nullable=True)
+    is_read = Column(Boolean, default=False, nullable=False)
+    read_at = Column(DateTime, nullable=True)
+
+
+class NotificationCounter(Base):
+    """Unread notification count per user, maintained on write."""
+    __tablename__ = "notification_counters"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    unread_count = Column(Integer, default=0, nullable=False)
+
+
+class Lease(Base):
+    """Named lease held by one worker at a time (e.g. the SLA monitor leader)."""
+    __tablename__ = "leases"
+
+    name = Column(String, primary_key=True)
+    holder = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+
+class ReferenceVersion(Base):
+    """Change counter for one kind of cached reference data (see services/reference_cache.py)."""
+    __tablename__ = "reference_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(BigInteger, default=0, nullable=False)
+
+
+class _IncidentRollup:
+    """Columns shared by the hourly and daily rollups (see services/rollups.py).
+
+    One row per (bucket, department, category, priority); an incident counts as
+    created in the bucket of ``created_at``, as resolved in the bucket of
+    ``resolved_at`` and as reopened in the bucket of each reopen.
+    """
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    bucket_start = Column(DateTime, nullable=False)
+    department_id = Column(UUID(as_uuid=True), ForeignKey("departments.id", ondelete="CASCADE"), nullable=True)
+    category_id = Column(UUID(as_uuid=True), ForeignKey("categories.id", ondelete="CASCADE"), nullable=True)
+    priority = Column(Enum(IncidentPriority), nullable=True)
+    created_count = Column(Integer, default=0, server_default="0", nullable=False)
+    resolved_count = Column(Integer, default=0, server_default="0", nullable=False)
+    reopened_count = Column(Integer, default=0, server_default="0", nullable=False)
+    # Whole seconds from creation to resolution, summed over the resolved incidents
+    resolve_seconds_sum = Column(BigInteger, default=0, server_default="0", nullable=False)
+
+
+class IncidentRollupHourly(_IncidentRollup, Base):
+    __tablename__ = "incident_rollups_hourly"
+
+    __table_args__ = (
+        Index("ix_incident_rollups_hourly_key", "bucket_start", "department_id", "category_id", "priority",
+              unique=True, postgresql_nulls_not_distinct=True),
+    )
+
+
+class IncidentRollupDaily(_IncidentRollup, Base):
+    __tablename__ = "incident_rollups_daily"
+
+    __table_args__ = (
+        Index("ix_incident_rollups_daily_key", "bucket_start", "department_id", "category_id", "priority",
+              unique=True, postgresql_nulls_not_distinct=True),
+    )
+
+
+class IncidentStatusTotal(Base):
+    """Current number of incidents per (department, priority, status), kept with the rollups."""
+    __tablename__ = "incident_status_totals"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    department_id = Column(UUID(as_uuid=True), ForeignKey("departments.id", ondelete="CASCADE"), nullable=True)
+    priority = Column(Enum(IncidentPriority), nullable=True)
+    status = Column(Enum(IncidentStatus), nullable=True)
+    incident_count = Column(Integer, default=0, server_default="0", nullable=False)
+    # Resolved or closed incidents that have a resolved_at, and their time to resolve
+    resolved_count = Column(Integer, default=0, server_default="0", nullable=False)
+    resolve_seconds_sum = Column(BigInteger, default=0, server_default="0", nullable=False)
+
+    __table_args__ = (
+        Index("ix_incident_status_totals_key", "department_id", "priority", "status",
+              unique=True, postgresql_nulls_not_distinct=True),
+    )
+
+
+class IncidentResolveSketch(Base):
+    """Time-to-resolve histogram per day and (department, priority): a DDSketch kept as rows.
+
+    ``bin`` is services/resolution_sketch.bin_of(seconds); a range of days is
+    answered by summing the counts per bin. Maintained with the rollups.
+    """
+    __tablename__ = "incident_resolve_sketches"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    bucket_start = Column(DateTime, nullable=False)
+    department_id = Column(UUID(as_uuid=True), ForeignKey("departments.id", ondelete="CASCADE"), nullable=True)
+    priority = Column(Enum(IncidentPriority), nullable=True)
+    bin = Column(Integer, nullable=False)
+    incident_count = Column(Integer, default=0, server_default="0", nullable=False)
+
+    __table_args__ = (
+        Index("ix_incident_resolve_sketches_key", "bucket_start", "department_id", "priority", "bin",
+              unique=True, postgresql_nulls_not_distinct=True),
+    )
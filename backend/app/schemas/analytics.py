@@ -0,0 +1,21 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel
+
+class ResolutionPercentileGroup(BaseModel):
+    key: Optional[str] = None
+    label: str
+    count: int
+    p50_hours: Optional[float] = None
+    p90_hours: Optional[float] = None
+    p99_hours: Optional[float] = None
+
+class ResolutionPercentiles(BaseModel):
+    start: datetime
+    end: datetime
+    mode: str
+    # Bound on the relative error of every sketch percentile; None for exact results
+    relative_accuracy: Optional[float] = None
+    overall: ResolutionPercentileGroup
+    by_priority: List[ResolutionPercentileGroup]
+    by_department: List[ResolutionPercentileGroup]
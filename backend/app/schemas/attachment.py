@@ -5,7 +5,8 @@ from typing import Optional
 class AttachmentBase(BaseModel):
     file_name: str
     content_type: str
-    file_size: Optional[str] = None
+    # Bytes
+    file_size: Optional[int] = None
 
 class AttachmentCreate(AttachmentBase):
     incident_id: UUID4
@@ -15,8 +16,11 @@ class AttachmentInDB(AttachmentBase):
     id: UUID4
     incident_id: UUID4
     uploader_id: UUID4
+    sha256: Optional[str] = None
     created_at: datetime
     uploader_name: Optional[str] = None
+    # "thumbnail" or "text" when GET /incidents/preview/{id} can serve one
+    preview_kind: Optional[str] = None
 
     class Config:
         from_attributes = True
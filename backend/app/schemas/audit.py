@@ -10,7 +10,7 @@ class AuditLogBase(BaseModel):
 class AuditLog(AuditLogBase):
     id: UUID4
     incident_id: UUID4
-    actor_id: UUID4
+    actor_id: Optional[UUID4] = None
     actor_name: Optional[str] = None
     created_at: datetime
 
@@ -0,0 +1,30 @@
+from pydantic import BaseModel, UUID4
+from datetime import datetime
+from typing import Optional, List
+
+class Notification(BaseModel):
+    id: UUID4
+    type: str
+    title: str
+    message: Optional[str] = None
+    incident_id: Optional[UUID4] = None
+    is_read: bool
+    read_at: Optional[datetime] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class NotificationPage(BaseModel):
+    items: List[Notification]
+    unread_count: int
+    next_before_created_at: Optional[datetime] = None
+    next_before_id: Optional[UUID4] = None
+
+class UnreadCount(BaseModel):
+    unread_count: int
+
+class MarkRead(BaseModel):
+    ids: Optional[List[UUID4]] = None
+    up_to: Optional[datetime] = None
+    all: bool = False
@@ -52,6 +52,12 @@ class ProblemAction(ProblemActionBase):
     class Config:
         from_attributes = True
 
+class ProblemActionPage(BaseModel):
+    # Ordered by due date, earliest first
+    items: List[ProblemAction]
+    next_after_due_date: Optional[datetime] = None
+    next_after_id: Optional[UUID] = None
+
 class ChangeRequestBase(BaseModel):
     title: str
     description: Optional[str] = None
@@ -80,6 +86,12 @@ class ChangeRequest(ChangeRequestBase):
     class Config:
         from_attributes = True
 
+class ChangeCalendar(BaseModel):
+    year: int
+    month: int
+    # Ordered by scheduled_start
+    changes: List[ChangeRequest]
+
 class IncidentSummary(BaseModel):
     id: UUID
     incident_key: str
@@ -89,14 +101,58 @@ class IncidentSummary(BaseModel):
     class Config:
         from_attributes = True
 
+class SimilarIncident(IncidentSummary):
+    # Estimated Jaccard similarity of the title and description shingles
+    similarity: float
+
+class ProblemCandidate(BaseModel):
+    size: int
+    suggested_title: str
+    incidents: List[IncidentSummary]
+
+class IncidentSummaryPage(BaseModel):
+    items: List[IncidentSummary]
+    next_before_created_at: Optional[datetime] = None
+    next_before_id: Optional[UUID] = None
+
 class Problem(ProblemBase):
     id: UUID
     creator_id: Optional[UUID] = None
     created_at: datetime
     resolved_at: Optional[datetime] = None
     change_requests: List[ChangeRequest] = []
-    incidents: List[IncidentSummary] = []
+    # Linked incidents are listed by GET /problems/{id}/incidents
+    incident_count: int = 0
     actions: List[ProblemAction] = []
 
     class Config:
         from_attributes = True
+
+class DepartmentImpact(BaseModel):
+    department_id: Optional[UUID] = None
+    department_name: Optional[str] = None
+    incident_count: int
+
+class ImpactPeriod(BaseModel):
+    period_start: datetime
+    incident_count: int
+
+class ProblemImpact(BaseModel):
+    problem_id: UUID
+    incident_count: int
+    open_count: int
+    resolved_count: int
+    total_resolution_hours: float
+    mean_resolution_hours: Optional[float] = None
+    first_incident_at: Optional[datetime] = None
+    last_incident_at: Optional[datetime] = None
+    departments: List[DepartmentImpact]
+    bucket: str
+    # Linked incidents created per bucket, oldest first
+    rate: List[ImpactPeriod]
+    computed_at: datetime
+
+class ProblemPage(BaseModel):
+    items: List[Problem]
+    next_before_created_at: Optional[datetime] = None
+    next_before_id: Optional[UUID] = None
@@ -1,4 +1,5 @@
-from typing import Optional
+from datetime import date, datetime
+from typing import List, Optional
 from uuid import UUID
 from pydantic import BaseModel
 from app.models.models import IncidentPriority
@@ -8,6 +9,7 @@ class SLAPolicyBase(BaseModel):
     priority: IncidentPriority
     response_time_minutes: int
     resolution_time_minutes: int
+    calendar_id: Optional[UUID] = None
 
 class SLAPolicyCreate(SLAPolicyBase):
     pass
@@ -17,9 +19,83 @@ class SLAPolicyUpdate(BaseModel):
     priority: Optional[IncidentPriority] = None
     response_time_minutes: Optional[int] = None
     resolution_time_minutes: Optional[int] = None
+    calendar_id: Optional[UUID] = None
 
 class SLAPolicy(SLAPolicyBase):
     id: UUID
 
     class Config:
         from_attributes = True
+
+class WorkingPeriod(BaseModel):
+    weekday: int  # Monday is 0
+    start: str    # "HH:MM" local time
+    end: str
+
+class CalendarHolidayCreate(BaseModel):
+    day: date
+    name: Optional[str] = None
+
+class CalendarHoliday(CalendarHolidayCreate):
+    id: UUID
+    calendar_id: UUID
+
+    class Config:
+        from_attributes = True
+
+class BusinessCalendarBase(BaseModel):
+    name: str
+    timezone: str = "UTC"
+    working_hours: List[WorkingPeriod]
+
+class BusinessCalendarCreate(BusinessCalendarBase):
+    pass
+
+class BusinessCalendarUpdate(BaseModel):
+    name: Optional[str] = None
+    timezone: Optional[str] = None
+    working_hours: Optional[List[WorkingPeriod]] = None
+
+class BusinessCalendar(BusinessCalendarBase):
+    id: UUID
+    holidays: List[CalendarHoliday] = []
+
+    class Config:
+        from_attributes = True
+
+class SLAOutcomeCounts(BaseModel):
+    total: int
+    met: int
+    breached: int
+    at_risk: int
+    on_track: int
+
+class SLAComplianceSummary(SLAOutcomeCounts):
+    # met / (met + breached); open incidents are not decided yet
+    compliance_pct: Optional[float] = None
+
+class SLAComplianceGroup(SLAOutcomeCounts):
+    key: Optional[str] = None
+    label: str
+    met_pct: Optional[float] = None
+    breached_pct: Optional[float] = None
+    at_risk_pct: Optional[float] = None
+    compliance_pct: Optional[float] = None
+    share_of_breaches_pct: Optional[float] = None
+    breach_rank: int
+
+class SLACompliancePeriod(SLAOutcomeCounts):
+    period_start: datetime
+    compliance_pct: Optional[float] = None
+    rolling_compliance_pct: Optional[float] = None
+
+class SLAComplianceReport(BaseModel):
+    start: datetime
+    end: datetime
+    group_by: str
+    bucket: str
+    at_risk_hours: float
+    summary: SLAComplianceSummary
+    groups: List[SLAComplianceGroup]
+    periods: List[SLACompliancePeriod]
+    computed_at: datetime
@@ -0,0 +1,28 @@
+from pydantic import BaseModel, Field, UUID4
+from datetime import datetime
+from typing import List, Optional
+
+class UploadSessionCreate(BaseModel):
+    file_name: str
+    content_type: str = "application/octet-stream"
+    total_size: int = Field(gt=0)
+    chunk_size: Optional[int] = None
+
+class UploadSessionStatus(BaseModel):
+    id: UUID4
+    incident_id: UUID4
+    file_name: str
+    content_type: str
+    total_size: int
+    chunk_size: int
+    total_chunks: int
+    received_chunks: List[int]
+    received_bytes: int
+    # Received byte ranges as [start, end)
+    received_ranges: List[List[int]]
+    expires_at: datetime
+
+class UploadChunkReceipt(BaseModel):
+    index: int
+    size: int
+    sha256: str
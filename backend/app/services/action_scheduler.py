@@ -0,0 +1,206 @@
+"""Due-date reminders and overdue events for problem actions.
+
+Each worker keeps the open actions in a min-heap of (fire time, event) pairs,
+loaded from the partial index on open actions with a due date. A reminder
+fires ACTION_REMINDER_LEAD_HOURS before the due date and an overdue event at
+the due date. The loop sleeps until the earliest entry is due or until an
+action is created or changed on this worker.
+
+Every worker may hold the same entries. An event is emitted by whoever wins a
+conditional UPDATE that stamps ``reminder_sent_at`` / ``overdue_notified_at``,
+and the email and inbox notifications are written in that same transaction,
+so each event is delivered exactly once however many workers run. Entries
+are never removed from the heap when an action changes. Instead the UPDATE
+also matches the due date and open status the entry was scheduled with, so
+stale entries simply do nothing.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.core.websockets import manager
+from app.models.models import Problem, ProblemAction, User
+from app.services.notifications import NotificationService
+
+logger = logging.getLogger(__name__)
+
+ACTION_REMINDER_LEAD = timedelta(hours=float(os.getenv("ACTION_REMINDER_LEAD_HOURS", "24")))
+# Picks up actions created or changed on other workers
+ACTION_SCHEDULER_RELOAD_INTERVAL = float(os.getenv("ACTION_SCHEDULER_RELOAD_INTERVAL", "300"))
+
+OPEN_ACTION_STATUSES = ("PENDING", "IN_PROGRESS")
+REMINDER = "reminder"
+OVERDUE = "overdue"
+
+# (fire_at, action id, kind, due_date); the id keeps ties comparable
+Entry = Tuple[datetime, str, str, datetime]
+
+
+def open_actions(query):
+    """Restricts ``query`` to the rows covered by the open-action partial indexes."""
+    return query.filter(ProblemAction.status.in_(OPEN_ACTION_STATUSES), ProblemAction.due_date.isnot(None))
+
+
+def entries_for(action_id, due_date: Optional[datetime], reminder_sent_at: Optional[datetime],
+                overdue_notified_at: Optional[datetime], now: datetime) -> List[Entry]:
+    if due_date is None or overdue_notified_at is not None:
+        return []
+    entries = [(due_date, str(action_id), OVERDUE, due_date)]
+    # No "due soon" for an action that is already late; the overdue event covers it
+    if reminder_sent_at is None and due_date > now:
+        entries.append((due_date - ACTION_REMINDER_LEAD, str(action_id), REMINDER, due_date))
+    return entries
+
+
+class ActionScheduler:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._heap: List[Entry] = []
+        self._loading = False
+        self._scheduled_while_loading: List[Entry] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def load(self, db: Session, now: Optional[datetime] = None):
+        now = now or datetime.utcnow()
+        with self.lock:
+            self._loading = True
+            self._scheduled_while_loading = []
+        try:
+            rows = open_actions(db.query(
+                ProblemAction.id, ProblemAction.due_date, ProblemAction.reminder_sent_at, ProblemAction.overdue_notified_at,
+            )).filter(ProblemAction.overdue_notified_at.is_(None)).yield_per(10000)
+            heap = [entry for row in rows for entry in entries_for(*row, now)]
+        finally:
+            with self.lock:
+                self._loading = False
+        heapq.heapify(heap)
+        with self.lock:
+            # Entries scheduled during the scan may have been committed after it started
+            for entry in self._scheduled_while_loading:
+                heapq.heappush(heap, entry)
+            self._heap = heap
+            self._scheduled_while_loading = []
+
+    def schedule(self, action: ProblemAction, now: Optional[datetime] = None):
+        """Called after an action is committed with a new due date or status."""
+        if action.status not in OPEN_ACTION_STATUSES:
+            return
+        entries = entries_for(action.id, action.due_date, action.reminder_sent_at, action.overdue_notified_at,
+                              now or datetime.utcnow())
+        if not entries:
+            return
+        with self.lock:
+            for entry in entries:
+                heapq.heappush(self._heap, entry)
+            if self._loading:
+                self._scheduled_while_loading.extend(entries)
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def pop_due(self, now: datetime) -> List[Entry]:
+        due = []
+        with self.lock:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap))
+        return due
+
+    def next_fire_at(self) -> Optional[datetime]:
+        with self.lock:
+            return self._heap[0][0] if self._heap else None
+
+
+scheduler = ActionScheduler()
+
+
+def fire(db: Session, entry: Entry, now: Optional[datetime] = None) -> Optional[dict]:
+    """Claims and emits one event; returns the websocket event, or None if it was stale
+    or another worker already sent it."""
+    _, action_id, kind, due_date = entry
+    now = now or datetime.utcnow()
+    values = {"overdue_notified_at": now, "reminder_sent_at": func.coalesce(ProblemAction.reminder_sent_at, now)} \
+        if kind == OVERDUE else {"reminder_sent_at": now}
+    marker = ProblemAction.overdue_notified_at if kind == OVERDUE else ProblemAction.reminder_sent_at
+    claimed = db.execute(
+        update(ProblemAction).where(
+            ProblemAction.id == action_id,
+            ProblemAction.due_date == due_date,
+            ProblemAction.status.in_(OPEN_ACTION_STATUSES),
+            marker.is_(None),
+        ).values(**values).returning(ProblemAction.id)
+    ).first()
+    # The conditional UPDATE matched nothing, so there is nothing to undo
+    if claimed is None:
+        return None
+
+    action = db.get(ProblemAction, claimed.id)
+    db.refresh(action)
+    problem = db.get(Problem, action.problem_id)
+    assignee = db.get(User, action.assignee_id)
+    NotificationService.send_action_due_notification(db, action, problem, assignee, overdue=kind == OVERDUE)
+    db.commit()
+    return {
+        "type": "ACTION_OVERDUE" if kind == OVERDUE else "ACTION_DUE_SOON",
+        "id": str(action.id),
+        "problem_id": str(action.problem_id),
+        "assignee_id": str(action.assignee_id),
+        "due_date": action.due_date.isoformat(),
+    }
+
+
+def _load_once():
+    db = SessionLocal()
+    try:
+        scheduler.load(db)
+    finally:
+        db.close()
+
+
+def _fire_once(entry: Entry) -> Optional[dict]:
+    db = SessionLocal()
+    try:
+        return fire(db, entry)
+    finally:
+        db.close()
+
+
+async def run_action_scheduler():
+    scheduler._loop = asyncio.get_running_loop()
+    scheduler._wake = asyncio.Event()
+    loaded_at = None
+    while True:
+        try:
+            now = datetime.utcnow()
+            if loaded_at is None or (now - loaded_at).total_seconds() >= ACTION_SCHEDULER_RELOAD_INTERVAL:
+                await run_in_threadpool(_load_once)
+                loaded_at = now
+            # Cleared before popping so a schedule() from here on wakes the wait below
+            scheduler._wake.clear()
+            for entry in scheduler.pop_due(now):
+                event = await run_in_threadpool(_fire_once, entry)
+                if event:
+                    await manager.broadcast(event)
+        except Exception as e:
+            logger.error(f"Problem action scheduler failed: {e}")
+            loaded_at = None
+            await asyncio.sleep(5)
+            continue
+
+        timeout = ACTION_SCHEDULER_RELOAD_INTERVAL - (datetime.utcnow() - loaded_at).total_seconds()
+        next_fire_at = scheduler.next_fire_at()
+        if next_fire_at is not None:
+            timeout = min(timeout, (next_fire_at - datetime.utcnow()).total_seconds())
+        try:
+            await asyncio.wait_for(scheduler._wake.wait(), timeout=max(timeout, 0))
+        except asyncio.TimeoutError:
+            pass
@@ -0,0 +1,311 @@
+"""Columnar exports of incidents, comment metadata and audit logs for analytics.
+
+    python -m app.services.analytics_export [--dest DIR] [--full] [--dataset NAME ...]
+
+Each dataset is read through a server-side cursor, EXPORT_BATCH_ROWS rows at
+a time, and every batch becomes an Arrow record batch. They are written as
+Parquet partitioned by month (hive layout, readable by pandas, pyarrow and
+DuckDB's ``hive_partitioning``)::
+
+    DIR/incidents/month=2026-10/part-20261020T101500.parquet
+
+A run only exports the rows changed since the previous one. Rows are read in
+(watermark column, id) order: ``updated_at`` for incidents, ``created_at``
+for the append-only comments and audit logs. The last (timestamp, id)
+written is saved in ``DIR/<dataset>/_watermark.json`` once all of the run's
+files are in place, so an interrupted run is simply redone. Rows newer than
+EXPORT_SETTLE_SECONDS are left for the next run, so transactions still in
+flight when the run starts are not skipped. ``updated_at`` is stamped when a
+row is flushed, not when its transaction commits, so a transaction open for
+longer than that commits rows behind the watermark and they are missed until
+a ``--full`` run; the export logs a warning when it sees one. An incident changed again after
+an export appears once more in a later file: readers keep the row with the
+latest ``updated_at`` per ``id``. ``--full`` discards the
+dataset's files and watermark and exports everything.
+
+``stream_ipc`` produces the same record batches as an Arrow IPC stream, for
+the /exports endpoint.
+"""
+import argparse
+import io
+import json
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from sqlalchemy import String, cast, func, select, text, tuple_
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.models.models import AuditLog, Comment, Incident
+
+logger = logging.getLogger(__name__)
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EXPORT_DIR = os.path.abspath(os.getenv("EXPORT_DIR", os.path.join(BACKEND_DIR, "exports")))
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "50000"))
+# Must exceed the longest write transaction: rows it stamped earlier commit behind the watermark
+EXPORT_SETTLE_SECONDS = int(os.getenv("EXPORT_SETTLE_SECONDS", "60"))
+# Rows buffered per month before they are written out as one row group
+ROW_GROUP_ROWS = 128 * 1024
+# Across all months; past it the largest buffer is written out early
+MAX_BUFFERED_ROWS = 4 * ROW_GROUP_ROWS
+
+IPC_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+UUID_TYPE = pa.string()
+TIMESTAMP_TYPE = pa.timestamp("us", tz="UTC")
+
+
+class Dataset(NamedTuple):
+    name: str
+    model: type
+    # Rows are exported in (watermark, id) order, and again whenever the watermark moves
+    watermark: object
+    # Month partitions follow this column
+    partition: object
+    columns: List[Tuple[str, object, pa.DataType]]
+
+    @property
+    def schema(self) -> pa.Schema:
+        return pa.schema([(name, arrow_type) for name, _, arrow_type in self.columns])
+
+
+def _uuid(column):
+    return cast(column, String)
+
+
+DATASETS: Dict[str, Dataset] = {d.name: d for d in [
+    Dataset("incidents", Incident, Incident.updated_at, Incident.created_at, [
+        ("id", _uuid(Incident.id), UUID_TYPE),
+        ("incident_key", Incident.incident_key, pa.string()),
+        ("title", Incident.title, pa.string()),
+        ("description", Incident.description, pa.string()),
+        ("status", cast(Incident.status, String), pa.string()),
+        ("priority", cast(Incident.priority, String), pa.string()),
+        ("reporter_id", _uuid(Incident.reporter_id), UUID_TYPE),
+        ("assignee_id", _uuid(Incident.assignee_id), UUID_TYPE),
+        ("department_id", _uuid(Incident.department_id), UUID_TYPE),
+        ("category_id", _uuid(Incident.category_id), UUID_TYPE),
+        ("subcategory_id", _uuid(Incident.subcategory_id), UUID_TYPE),
+        ("problem_id", _uuid(Incident.problem_id), UUID_TYPE),
+        ("service_item_id", _uuid(Incident.service_item_id), UUID_TYPE),
+        ("created_at", Incident.created_at, TIMESTAMP_TYPE),
+        ("updated_at", Incident.updated_at, TIMESTAMP_TYPE),
+        ("resolved_at", Incident.resolved_at, TIMESTAMP_TYPE),
+        ("sla_breach_at", Incident.sla_breach_at, TIMESTAMP_TYPE),
+        ("sla_breached_at", Incident.sla_breached_at, TIMESTAMP_TYPE),
+        ("sla_paused_minutes", Incident.sla_paused_minutes, pa.int32()),
+    ]),
+    # Metadata only: the text of comments stays in the database
+    Dataset("comments", Comment, Comment.created_at, Comment.created_at, [
+        ("id", _uuid(Comment.id), UUID_TYPE),
+        ("incident_id", _uuid(Comment.incident_id), UUID_TYPE),
+        ("author_id", _uuid(Comment.author_id), UUID_TYPE),
+        ("is_internal", Comment.is_internal, pa.bool_()),
+        ("content_length", func.length(Comment.content), pa.int32()),
+        ("created_at", Comment.created_at, TIMESTAMP_TYPE),
+    ]),
+    Dataset("audit_logs", AuditLog, AuditLog.created_at, AuditLog.created_at, [
+        ("id", _uuid(AuditLog.id), UUID_TYPE),
+        ("incident_id", _uuid(AuditLog.incident_id), UUID_TYPE),
+        ("actor_id", _uuid(AuditLog.actor_id), UUID_TYPE),
+        ("action", AuditLog.action, pa.string()),
+        ("old_value", AuditLog.old_value, pa.string()),
+        ("new_value", AuditLog.new_value, pa.string()),
+        ("created_at", AuditLog.created_at, TIMESTAMP_TYPE),
+    ]),
+]}
+
+
+class Watermark(NamedTuple):
+    at: datetime
+    id: str
+
+
+def _warn_on_long_transactions(db: Session):
+    """Logs when another open transaction is older than EXPORT_SETTLE_SECONDS."""
+    oldest = db.execute(text(
+        "SELECT EXTRACT(EPOCH FROM now() - min(xact_start)) FROM pg_stat_activity "
+        "WHERE datname = current_database() AND pid <> pg_backend_pid()"
+    )).scalar()
+    if oldest is not None and oldest > EXPORT_SETTLE_SECONDS:
+        logger.warning(f"A transaction has been open for {int(oldest)}s, longer than EXPORT_SETTLE_SECONDS "
+                       f"({EXPORT_SETTLE_SECONDS}s); rows it commits may be missing from incremental exports")
+
+
+def _query(dataset: Dataset, after: Optional[Watermark], until: datetime, since: Optional[datetime] = None):
+    model = dataset.model
+    month = func.coalesce(func.to_char(dataset.partition, "YYYY-MM"), "unknown")
+    query = select(*[expression for _, expression, _ in dataset.columns], month,
+                   dataset.watermark, model.id) \
+        .where(dataset.watermark.isnot(None), dataset.watermark < until) \
+        .order_by(dataset.watermark, model.id)
+    if after is not None:
+        query = query.where(tuple_(dataset.watermark, model.id) > (after.at, uuid.UUID(after.id)))
+    if since is not None:
+        query = query.where(dataset.watermark > since)
+    return query
+
+
+def read_batches(db: Session, dataset: Dataset, after: Optional[Watermark], until: datetime,
+                 since: Optional[datetime] = None) -> Iterator[Tuple[pa.RecordBatch, pa.Array, Watermark]]:
+    """(record batch, month of each row, watermark of its last row) per EXPORT_BATCH_ROWS rows.
+
+    The rows come from a server-side cursor, so memory holds one batch at a time.
+    """
+    schema = dataset.schema
+    width = len(dataset.columns)
+    result = db.execute(_query(dataset, after, until, since).execution_options(
+        stream_results=True, max_row_buffer=EXPORT_BATCH_ROWS,
+    ))
+    for rows in result.partitions(EXPORT_BATCH_ROWS):
+        columns = list(zip(*rows))
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(columns[i], type=schema.field(i).type) for i in range(width)], schema=schema,
+        )
+        last = rows[-1]
+        yield batch, pa.array(columns[width], type=pa.string()), Watermark(last[-2], str(last[-1]))
+
+
+class PartitionedWriter:
+    """Parquet files per month, written in row groups of about ROW_GROUP_ROWS rows.
+
+    Files are written under a temporary name and only renamed by ``close``.
+    """
+
+    def __init__(self, directory: str, schema: pa.Schema, part: str):
+        self.directory = directory
+        self.schema = schema
+        self.part = part
+        self._writers: Dict[str, pq.ParquetWriter] = {}
+        self._buffers: Dict[str, List[pa.RecordBatch]] = {}
+        self._buffered = 0
+        self.rows = 0
+
+    def _path(self, month: str) -> str:
+        return os.path.join(self.directory, f"month={month}", f"part-{self.part}.parquet")
+
+    def _flush(self, month: str):
+        batches = self._buffers.pop(month, [])
+        if not batches:
+            return
+        writer = self._writers.get(month)
+        if writer is None:
+            path = self._path(month)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            writer = self._writers[month] = pq.ParquetWriter(path + ".tmp", self.schema, compression="zstd")
+        table = pa.Table.from_batches(batches, schema=self.schema)
+        writer.write_table(table, row_group_size=ROW_GROUP_ROWS)
+        self._buffered -= table.num_rows
+
+    def write(self, batch: pa.RecordBatch, months: pa.Array):
+        for month in pc.unique(months).to_pylist():
+            part = batch.filter(pc.equal(months, month))
+            self._buffers.setdefault(month, []).append(part)
+            self._buffered += part.num_rows
+            self.rows += part.num_rows
+            if sum(b.num_rows for b in self._buffers[month]) >= ROW_GROUP_ROWS:
+                self._flush(month)
+        while self._buffered > MAX_BUFFERED_ROWS:
+            self._flush(max(self._buffers, key=lambda m: sum(b.num_rows for b in self._buffers[m])))
+
+    def close(self) -> List[str]:
+        for month in list(self._buffers):
+            self._flush(month)
+        paths = []
+        for month, writer in self._writers.items():
+            writer.close()
+            os.replace(self._path(month) + ".tmp", self._path(month))
+            paths.append(self._path(month))
+        return paths
+
+    def abort(self):
+        for month, writer in self._writers.items():
+            writer.close()
+            os.remove(self._path(month) + ".tmp")
+
+
+def _watermark_path(directory: str) -> str:
+    return os.path.join(directory, "_watermark.json")
+
+
+def load_watermark(directory: str) -> Optional[Watermark]:
+    try:
+        with open(_watermark_path(directory)) as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    return Watermark(datetime.fromisoformat(data["at"]), data["id"])
+
+
+def save_watermark(directory: str, watermark: Watermark, rows: int):
+    path = _watermark_path(directory)
+    with open(path + ".tmp", "w") as f:
+        json.dump({"at": watermark.at.isoformat(), "id": watermark.id, "rows": rows,
+                   "exported_at": datetime.utcnow().isoformat()}, f)
+    os.replace(path + ".tmp", path)
+
+
+def export_dataset(db: Session, dataset: Dataset, dest: str = EXPORT_DIR, full: bool = False,
+                   now: Optional[datetime] = None) -> int:
+    """Writes the rows changed since the dataset's watermark; returns how many."""
+    directory = os.path.join(dest, dataset.name)
+    if full:
+        shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory, exist_ok=True)
+    until = (now or datetime.utcnow()) - timedelta(seconds=EXPORT_SETTLE_SECONDS)
+    after = load_watermark(directory)
+    _warn_on_long_transactions(db)
+
+    writer = PartitionedWriter(directory, dataset.schema, until.strftime("%Y%m%dT%H%M%S"))
+    watermark = after
+    try:
+        for batch, months, watermark in read_batches(db, dataset, after, until):
+            writer.write(batch, months)
+    except BaseException:
+        writer.abort()
+        raise
+    paths = writer.close()
+    if watermark is not None and watermark != after:
+        save_watermark(directory, watermark, writer.rows)
+    logger.info(f"Exported {writer.rows} {dataset.name} rows into {len(paths)} files")
+    return writer.rows
+
+
+def stream_ipc(db: Session, dataset: Dataset, since: Optional[datetime] = None,
+               until: Optional[datetime] = None) -> Iterator[bytes]:
+    """The dataset's rows with a watermark in (since, until) as an Arrow IPC stream, batch by batch."""
+    until = until or datetime.utcnow() - timedelta(seconds=EXPORT_SETTLE_SECONDS)
+    _warn_on_long_transactions(db)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, dataset.schema) as stream:
+        for batch, _, _ in read_batches(db, dataset, None, until, since=since):
+            stream.write_batch(batch)
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+    yield sink.getvalue()
+
+
+def run(dest: str = EXPORT_DIR, full: bool = False, names: Optional[List[str]] = None) -> Dict[str, int]:
+    db = SessionLocal()
+    try:
+        return {name: export_dataset(db, DATASETS[name], dest, full) for name in names or DATASETS}
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Export incidents, comments and audit logs to Parquet")
+    parser.add_argument("--dest", default=EXPORT_DIR, help="Directory of the Parquet datasets")
+    parser.add_argument("--full", action="store_true", help="Discard earlier exports and export everything")
+    parser.add_argument("--dataset", action="append", choices=sorted(DATASETS), help="Only these datasets")
+    args = parser.parse_args()
+    run(dest=args.dest, full=args.full, names=args.dataset)
@@ -0,0 +1,113 @@
+"""Streams many attachments as one ZIP without buffering or temporary files.
+
+``zipfile`` writes to an unseekable sink here, so every entry is written with a
+data descriptor (sizes and CRC after the data) and the archive is produced as
+a sequence of byte chunks that can be sent as soon as they exist. Memory use
+is bounded by the copy block size regardless of the archive size.
+"""
+import io
+import os
+import zipfile
+from datetime import datetime
+from typing import Iterator, List, Optional
+from app.services.storage import StorageBackend
+
+ARCHIVE_BLOCK_SIZE = 256 * 1024
+
+# Already compressed formats gain nothing from deflate, so they are STORED
+COMPRESSED_TYPES = (
+    "image/jpeg", "image/png", "image/gif", "image/webp", "image/heic", "image/avif",
+    "video/", "audio/",
+    "application/zip", "application/gzip", "application/x-gzip", "application/x-7z-compressed",
+    "application/x-bzip2", "application/x-xz", "application/zstd", "application/pdf",
+    "application/vnd.openxmlformats-officedocument.",
+)
+COMPRESSED_EXTENSIONS = {
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".mp4", ".mov", ".mkv", ".mp3",
+    ".zip", ".gz", ".tgz", ".7z", ".bz2", ".xz", ".zst", ".pdf", ".docx", ".xlsx", ".pptx",
+}
+
+
+class ArchiveEntry:
+    def __init__(self, name: str, content_type: str, created_at: Optional[datetime],
+                 key: Optional[str] = None, path: Optional[str] = None):
+        self.name = name
+        self.content_type = content_type
+        self.created_at = created_at
+        # Either a storage key (content-addressed) or a plain local path (legacy uploads)
+        self.key = key
+        self.path = path
+
+
+def is_compressed(name: str, content_type: Optional[str]) -> bool:
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if any(content_type.startswith(t) for t in COMPRESSED_TYPES):
+        return True
+    return os.path.splitext(name)[1].lower() in COMPRESSED_EXTENSIONS
+
+
+def unique_names(names: List[str]) -> List[str]:
+    """Keeps duplicate file names apart: report.log, report (1).log, ..."""
+    seen = set()
+    result = []
+    for name in names:
+        name = name.replace("\\", "/").split("/")[-1] or "attachment"
+        candidate, n = name, 1
+        while candidate.lower() in seen:
+            stem, ext = os.path.splitext(name)
+            candidate = f"{stem} ({n}){ext}"
+            n += 1
+        seen.add(candidate.lower())
+        result.append(candidate)
+    return result
+
+
+class _ChunkSink(io.RawIOBase):
+    """Unseekable write target that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _open_entry(storage: StorageBackend, entry: ArchiveEntry):
+    if entry.key is not None:
+        return storage.open(entry.key)
+    return open(entry.path, "rb")
+
+
+def stream_zip(storage: StorageBackend, entries: List[ArchiveEntry]) -> Iterator[bytes]:
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", allowZip64=True) as archive:
+        for entry in entries:
+            info = zipfile.ZipInfo(entry.name, date_time=(entry.created_at or datetime.utcnow()).timetuple()[:6])
+            info.external_attr = 0o644 << 16
+            if is_compressed(entry.name, entry.content_type):
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            with _open_entry(storage, entry) as source, archive.open(info, "w", force_zip64=True) as dest:
+                while True:
+                    block = source.read(ARCHIVE_BLOCK_SIZE)
+                    if not block:
+                        break
+                    dest.write(block)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    # Central directory
+    yield sink.drain()
@@ -0,0 +1,107 @@
+"""Content-addressed, reference-counted attachment storage.
+
+Files are stored once per SHA-256 in the configured StorageBackend; every
+Attachment row with the same content points at the same AttachmentBlob. The
+blob row is the lock that serializes concurrent uploads and deletes of the
+same content.
+
+A new file is only moved into storage once the transaction that created its
+blob row has committed, so a rolled back upload leaves no object behind that
+no row references.
+"""
+import logging
+import os
+from typing import Optional
+from sqlalchemy import event, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models.models import AttachmentBlob
+from app.services.storage import StorageBackend, shard_key
+from app.services.uploads import StreamedUpload
+
+logger = logging.getLogger(__name__)
+
+# (promote, discard) callbacks of the blobs staged by the session's current transaction
+PENDING_BLOBS = "pending_blobs"
+
+@event.listens_for(Session, "after_commit")
+def _promote_pending(session: Session):
+    for promote, _ in session.info.pop(PENDING_BLOBS, []):
+        promote()
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_pending(session: Session, transaction):
+    # Still pending once the outermost transaction is over: it did not commit
+    if transaction.parent is None:
+        for _, discard in session.info.pop(PENDING_BLOBS, []):
+            discard()
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def acquire_blob(db: Session, upload: StreamedUpload, storage: StorageBackend) -> AttachmentBlob:
+    """Adds a reference to the blob for ``upload``, storing the file if the content is new.
+
+    The staged file is moved into storage after the caller commits, or removed.
+    """
+    stmt = insert(AttachmentBlob).values(
+        sha256=upload.sha256,
+        size=upload.size,
+        content_type=upload.content_type,
+        storage_path=shard_key(upload.sha256),
+        ref_count=1,
+    ).on_conflict_do_update(
+        index_elements=[AttachmentBlob.sha256],
+        set_={"ref_count": AttachmentBlob.ref_count + 1},
+    ).returning(AttachmentBlob.storage_path, literal_column("xmax = 0").label("inserted"))
+    # Blocks on a concurrent upload/delete of the same content until it commits
+    storage_path, inserted = db.execute(stmt).one()
+
+    # Duplicate content is normally stored already; a copy whose first upload failed
+    # to reach storage after its commit is replaced by this one
+    if inserted or not storage.exists(storage_path):
+        def promote():
+            # Runs inside the caller's commit, which has succeeded: an error here must not
+            # fail the request, the next upload of this content stores the file instead
+            try:
+                storage.put(upload.path, storage_path, upload.content_type)
+            except Exception as e:
+                logger.error(f"Storing blob {upload.sha256} failed after commit: {e}")
+                _discard(upload.path)
+        db.info.setdefault(PENDING_BLOBS, []).append((promote, lambda: _discard(upload.path)))
+    else:
+        os.remove(upload.path)
+    return db.get(AttachmentBlob, upload.sha256, populate_existing=True)
+
+def release_blob(db: Session, sha256: str, storage: StorageBackend) -> Optional[str]:
+    """Drops one reference. When it was the last one the stored object is released and
+    the backend's token returned: the caller commits, then calls ``purge_blob`` (or
+    ``storage.restore`` on rollback). Until then the row stays, with no references."""
+    blob = db.query(AttachmentBlob).filter(AttachmentBlob.sha256 == sha256).with_for_update().first()
+    if not blob:
+        return None
+    blob.ref_count -= 1
+    if blob.ref_count > 0:
+        return None
+    return storage.release(blob.storage_path)
+
+def purge_blob(db: Session, sha256: str, storage: StorageBackend, token: str) -> bool:
+    """Second half of dropping the last reference, after its commit; commits itself.
+
+    Checked again under the row lock: the same content may have been uploaded in
+    between, in which case the stored object is kept. Returns whether it was purged.
+    """
+    blob = db.query(AttachmentBlob).filter(AttachmentBlob.sha256 == sha256).with_for_update().first()
+    if blob is not None and blob.ref_count > 0:
+        storage.restore(token)
+        db.commit()
+        return False
+    # The row lock keeps new uploads of this content waiting until the object is gone
+    storage.purge(token)
+    if blob is not None:
+        db.delete(blob)
+    db.commit()
+    return True
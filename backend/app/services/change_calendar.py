@@ -0,0 +1,72 @@
+"""Scheduling windows of change requests.
+
+``change_requests.schedule`` is a generated ``tsrange`` over
+``[scheduled_start, scheduled_end)`` with a GiST index, so "changes overlapping
+this window" is a single ``&&`` index scan. That query serves the month
+calendar, the conflict check on create and the conflicts lookup. Columns hold
+naive UTC timestamps, which is why the range is a tsrange and not a tstzrange.
+"""
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+from app.models.models import ChangeRequest
+
+# Changes that still hold their window; implemented or closed ones no longer conflict
+ACTIVE_CHANGE_STATUSES = ("DRAFT", "SUBMITTED", "APPROVED")
+
+# pg_advisory_xact_lock key serializing "check for conflicts, then insert"
+SCHEDULE_LOCK_KEY = 0x43484E47
+
+
+class ScheduleError(Exception):
+    def __init__(self, status_code: int, detail):
+        super().__init__(str(detail))
+        self.status_code = status_code
+        self.detail = detail
+
+
+def to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Aware datetimes from the API are stored as naive UTC like every other column."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def validate_window(start: Optional[datetime], end: Optional[datetime]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    start, end = to_utc(start), to_utc(end)
+    if (start is None) != (end is None):
+        raise ScheduleError(400, "scheduled_start and scheduled_end must be given together")
+    if start is not None and end <= start:
+        raise ScheduleError(400, "scheduled_end must be after scheduled_start")
+    return start, end
+
+
+def month_window(year: int, month: int) -> Tuple[datetime, datetime]:
+    return datetime(year, month, 1), datetime(year + month // 12, month % 12 + 1, 1)
+
+
+def overlapping(db: Session, start: datetime, end: datetime, active_only: bool = False,
+                exclude_id=None) -> List[ChangeRequest]:
+    """Changes whose window overlaps ``[start, end)``, earliest first."""
+    query = db.query(ChangeRequest).filter(
+        ChangeRequest.schedule.overlaps(func.tsrange(start, end, "[)"))
+    )
+    if active_only:
+        query = query.filter(ChangeRequest.status.in_(ACTIVE_CHANGE_STATUSES))
+    if exclude_id is not None:
+        query = query.filter(ChangeRequest.id != exclude_id)
+    return query.order_by(ChangeRequest.scheduled_start, ChangeRequest.id).all()
+
+
+def lock_schedule(db: Session):
+    """Held until the transaction ends, so two overlapping creates cannot both pass the check."""
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": SCHEDULE_LOCK_KEY})
+
+
+def check_conflicts(db: Session, start: Optional[datetime], end: Optional[datetime]) -> List[ChangeRequest]:
+    """Locks the schedule and returns the active changes overlapping the window."""
+    if start is None:
+        return []
+    lock_schedule(db)
+    return overlapping(db, start, end, active_only=True)
@@ -0,0 +1,80 @@
+from datetime import datetime
+from typing import List, Optional
+from uuid import UUID
+from sqlalchemy import select, update, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models.models import Notification, NotificationCounter
+
+class InboxService:
+    """In-app notifications with an unread counter kept in step on every write,
+    so the bell badge never has to COUNT(*) the user's history."""
+
+    @staticmethod
+    def _adjust_counter(db: Session, user_id: UUID, delta: int):
+        stmt = insert(NotificationCounter).values(user_id=user_id, unread_count=max(delta, 0))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[NotificationCounter.user_id],
+            set_={"unread_count": func.greatest(NotificationCounter.unread_count + delta, 0)},
+        )
+        db.execute(stmt)
+
+    @classmethod
+    def push(cls, db: Session, user_id: UUID, type: str, title: str, message: Optional[str] = None, incident_id: Optional[UUID] = None) -> Notification:
+        notification = Notification(
+            user_id=user_id,
+            type=type,
+            title=title,
+            message=message,
+            incident_id=incident_id,
+            created_at=datetime.utcnow(),
+        )
+        db.add(notification)
+        cls._adjust_counter(db, user_id, 1)
+        return notification
+
+    @staticmethod
+    def unread_count(db: Session, user_id: UUID) -> int:
+        # Primary-key lookup; bypasses the identity map so a counter adjusted earlier in this session is not stale
+        count = db.execute(
+            select(NotificationCounter.unread_count).where(NotificationCounter.user_id == user_id)
+        ).scalar()
+        return count or 0
+
+    @staticmethod
+    def list_for_user(db: Session, user_id: UUID, limit: int = 20, before_created_at: Optional[datetime] = None,
+                      before_id: Optional[UUID] = None, unread_only: bool = False) -> List[Notification]:
+        query = db.query(Notification).filter(Notification.user_id == user_id)
+        if unread_only:
+            query = query.filter(Notification.is_read == False)
+        if before_created_at:
+            # Keyset pagination on (created_at, id) - served straight from ix_notifications_user_created
+            if before_id:
+                query = query.filter(
+                    (Notification.created_at < before_created_at) |
+                    ((Notification.created_at == before_created_at) & (Notification.id < before_id))
+                )
+            else:
+                query = query.filter(Notification.created_at < before_created_at)
+        return query.order_by(Notification.created_at.desc(), Notification.id.desc()).limit(limit).all()
+
+    @classmethod
+    def mark_read(cls, db: Session, user_id: UUID, ids: Optional[List[UUID]] = None, up_to: Optional[datetime] = None) -> int:
+        """Marks the given notifications (or everything up to a timestamp) as read.
+
+        Only rows that flip from unread to read are counted, so repeated calls never
+        push the counter below the real number of unread notifications.
+        """
+        stmt = update(Notification).where(
+            Notification.user_id == user_id,
+            Notification.is_read == False,
+        )
+        if ids is not None:
+            stmt = stmt.where(Notification.id.in_(ids))
+        if up_to is not None:
+            stmt = stmt.where(Notification.created_at <= up_to)
+        result = db.execute(stmt.values(is_read=True, read_at=datetime.utcnow()).execution_options(synchronize_session=False))
+        changed = result.rowcount or 0
+        if changed:
+            cls._adjust_counter(db, user_id, -changed)
+        return changed
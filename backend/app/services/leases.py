@@ -0,0 +1,40 @@
+"""Leader election through expiring leases stored in the database.
+
+A worker holds lease ``name`` while its row's ``expires_at`` is in the future
+and renews it well before then. Acquiring is one upsert that only takes over
+a row that has expired (or is already ours), so at most one worker holds a
+live lease. Times come from the database clock, not the workers'.
+"""
+import os
+import socket
+import uuid
+from datetime import timedelta
+from sqlalchemy import delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models.models import Lease
+
+# Identifies this process as a lease holder
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _db_now():
+    return func.timezone("utc", func.now())
+
+
+def acquire(db: Session, name: str, ttl: timedelta, holder: str = WORKER_ID) -> bool:
+    """Takes or renews the lease; commits. Returns whether ``holder`` now holds it."""
+    stmt = insert(Lease).values(name=name, holder=holder, expires_at=_db_now() + ttl)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Lease.name],
+        set_={"holder": holder, "expires_at": _db_now() + ttl},
+        where=(Lease.expires_at < _db_now()) | (Lease.holder == holder),
+    ).returning(Lease.holder)
+    acquired = db.execute(stmt).first() is not None
+    db.commit()
+    return acquired
+
+
+def release(db: Session, name: str, holder: str = WORKER_ID):
+    db.execute(delete(Lease).where(Lease.name == name, Lease.holder == holder))
+    db.commit()
@@ -1,72 +1,160 @@
-import os
-from app.models.models import User, Incident, Comment, IncidentStatus
-from typing import List
+from sqlalchemy.orm import Session
+from app.models.models import User, Incident, Comment, IncidentStatus, NotificationOutbox, Problem, ProblemAction
+from typing import Dict, Tuple
+from app.services.inbox import InboxService
+
+# Subject / body templates, rendered by the outbox worker from the plain
+# context stored on each outbox row (never from live ORM objects).
+TEMPLATES: Dict[str, Tuple[str, str]] = {
+    "welcome": (
+        "Welcome to ServiceNow Incident Management",
+        """Hello {recipient_name},
+
+Your account has been successfully created. You can now log in and report incidents.""",
+    ),
+    "incident_created": (
+        "Incident Created: {incident_key}",
+        """Hello {recipient_name},
+
+Your incident '{title}' has been created with key {incident_key}. We will update you as it progresses.""",
+    ),
+    "status_change": (
+        "Incident Status Updated: {incident_key}",
+        """Hello {recipient_name},
+
+The status of your incident '{title}' ({incident_key}) has changed from {old_status} to {new_status}.""",
+    ),
+    "assignment": (
+        "New Incident Assigned: {incident_key}",
+        """Hello {recipient_name},
+
+You have been assigned to incident '{title}' ({incident_key}). Please review it at your earliest convenience.""",
+    ),
+    "internal_note": (
+        "New Internal Note on {incident_key}",
+        "A new internal note has been added to {incident_key} by {author_name}.",
+    ),
+    "comment_reporter": (
+        "New Comment on {incident_key}",
+        """Hello {recipient_name},
+
+A new comment has been added to your incident '{title}' ({incident_key}) by {author_name}.""",
+    ),
+    "comment_assignee": (
+        "New Public Comment on {incident_key}",
+        "A new comment has been added to {incident_key} by {author_name}.",
+    ),
+    "action_due_soon": (
+        "Problem Action Due Soon: {problem_title}",
+        """Hello {recipient_name},
+
+Your action '{description}' on problem '{problem_title}' is due on {due_date}.""",
+    ),
+    "action_overdue": (
+        "Problem Action Overdue: {problem_title}",
+        """Hello {recipient_name},
+
+Your action '{description}' on problem '{problem_title}' was due on {due_date} and is now overdue.""",
+    ),
+}
+
+def render_message(template: str, context: dict) -> Tuple[str, str]:
+    subject, body = TEMPLATES[template]
+    return subject.format(**context), body.format(**context)
+
+def _display_name(user: User) -> str:
+    return user.full_name or user.email
+
+def _value(status) -> str:
+    return status.value if isinstance(status, IncidentStatus) else str(status)
 
 class NotificationService:
+    """Writes outgoing emails to the notification outbox.
+
+    Rows are only added to the session; they are committed in the same transaction
+    as the change that triggered them and delivered by app.services.outbox_worker.
+    """
+
     @staticmethod
-    def send_email(to_email: str, subject: str, body: str):
-        # MOCK: In production, integrate with SendGrid, Resend, or SMTP
-        print(f"--- EMAIL SENT ---")
-        print(f"To: {to_email}")
-        print(f"Subject: {subject}")
-        print(f"Body: {body}")
-        print(f"------------------")
+    def enqueue(db: Session, template: str, to_email: str, **context) -> NotificationOutbox:
+        # Render once up front so a broken template fails the request, not the worker
+        render_message(template, context)
+        entry = NotificationOutbox(template=template, recipient_email=to_email, context=context)
+        db.add(entry)
+        return entry
 
     @classmethod
-    def send_welcome_email(cls, user: User):
-        subject = "Welcome to ServiceNow Incident Management"
-        body = f"""Hello {user.full_name or user.email},
+    def notify_user(cls, db: Session, template: str, user: User, incident: Incident, type: str, **context):
+        """Queues the email and drops the same message into the user's in-app inbox."""
+        context = {"recipient_name": _display_name(user), **context}
+        cls.enqueue(db, template, user.email, **context)
+        subject, body = render_message(template, context)
+        InboxService.push(db, user.id, type, subject, body, incident_id=incident.id)
 
-Your account has been successfully created. You can now log in and report incidents."""
-        cls.send_email(user.email, subject, body)
+    @classmethod
+    def send_welcome_email(cls, db: Session, user: User):
+        cls.enqueue(db, "welcome", user.email, recipient_name=_display_name(user))
 
     @classmethod
-    def send_incident_creation_notification(cls, incident: Incident, reporter: User):
+    def send_incident_creation_notification(cls, db: Session, incident: Incident, reporter: User):
         # Notify Reporter
-        subject = f"Incident Created: {incident.incident_key}"
-        body = f"""Hello {reporter.full_name or reporter.email},
-
-Your incident '{incident.title}' has been created with key {incident.incident_key}. We will update you as it progresses."""
-        cls.send_email(reporter.email, subject, body)
+        cls.enqueue(
+            db, "incident_created", reporter.email,
+            recipient_name=_display_name(reporter),
+            incident_key=incident.incident_key,
+            title=incident.title,
+        )
 
     @classmethod
-    def send_status_change_notification(cls, incident: Incident, old_status: IncidentStatus, new_status: IncidentStatus):
+    def send_status_change_notification(cls, db: Session, incident: Incident, old_status: IncidentStatus, new_status: IncidentStatus):
         # Notify Reporter
-        subject = f"Incident Status Updated: {incident.incident_key}"
-        body = f"""Hello {incident.reporter.full_name or incident.reporter.email},
-
-The status of your incident '{incident.title}' ({incident.incident_key}) has changed from {old_status} to {new_status}."""
-        NotificationService.send_email(incident.reporter.email, subject, body)
+        cls.notify_user(
+            db, "status_change", incident.reporter, incident, "STATUS_CHANGE",
+            incident_key=incident.incident_key,
+            title=incident.title,
+            old_status=_value(old_status),
+            new_status=_value(new_status),
+        )
 
     @classmethod
-    def send_assignment_notification(cls, incident: Incident, assignee: User):
+    def send_assignment_notification(cls, db: Session, incident: Incident, assignee: User):
         # Notify Assignee
-        subject = f"New Incident Assigned: {incident.incident_key}"
-        body = f"""Hello {assignee.full_name or assignee.email},
-
-You have been assigned to incident '{incident.title}' ({incident.incident_key}). Please review it at your earliest convenience."""
-        cls.send_email(assignee.email, subject, body)
+        cls.notify_user(
+            db, "assignment", assignee, incident, "ASSIGNMENT",
+            incident_key=incident.incident_key,
+            title=incident.title,
+        )
 
     @classmethod
-    def send_new_comment_notification(cls, incident: Incident, comment: Comment, author: User):
+    def send_new_comment_notification(cls, db: Session, incident: Incident, comment: Comment, author: User):
+        context = {
+            "incident_key": incident.incident_key,
+            "title": incident.title,
+            "author_name": _display_name(author),
+        }
         # Notify relevant parties (if internal, only staff/assignee, if public, reporter)
         if comment.is_internal:
             # Notify Assignee if it's not the author
             if incident.assignee and incident.assignee_id != author.id:
-                subject = f"New Internal Note on {incident.incident_key}"
-                body = f"A new internal note has been added to {incident.incident_key} by {author.full_name or author.email}."
-                cls.send_email(incident.assignee.email, subject, body)
+                cls.notify_user(db, "internal_note", incident.assignee, incident, "COMMENT", **context)
         else:
             # Public comment - Notify Reporter if it's not the author
             if incident.reporter_id != author.id:
-                subject = f"New Comment on {incident.incident_key}"
-                body = f"""Hello {incident.reporter.full_name or incident.reporter.email},
+                cls.notify_user(db, "comment_reporter", incident.reporter, incident, "COMMENT", **context)
 
-A new comment has been added to your incident '{incident.title}' ({incident.incident_key}) by {author.full_name or author.email}."""
-                cls.send_email(incident.reporter.email, subject, body)
-            
             # Also notify Assignee if it's not the author
             if incident.assignee and incident.assignee_id != author.id:
-                subject = f"New Public Comment on {incident.incident_key}"
-                body = f"A new comment has been added to {incident.incident_key} by {author.full_name or author.email}."
-                cls.send_email(incident.assignee.email, subject, body)
+                cls.notify_user(db, "comment_assignee", incident.assignee, incident, "COMMENT", **context)
+
+    @classmethod
+    def send_action_due_notification(cls, db: Session, action: ProblemAction, problem: Problem, assignee: User, overdue: bool):
+        template = "action_overdue" if overdue else "action_due_soon"
+        context = {
+            "recipient_name": _display_name(assignee),
+            "description": action.description,
+            "problem_title": problem.title,
+            "due_date": action.due_date.strftime("%Y-%m-%d %H:%M UTC"),
+        }
+        cls.enqueue(db, template, assignee.email, **context)
+        subject, body = render_message(template, context)
+        InboxService.push(db, assignee.id, "ACTION_OVERDUE" if overdue else "ACTION_DUE_SOON", subject, body)
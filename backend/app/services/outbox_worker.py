@@ -0,0 +1,251 @@
+"""Notification outbox worker.
+
+Run with ``python -m app.services.outbox_worker``. Several workers can run side by
+side: rows are claimed with ``FOR UPDATE SKIP LOCKED`` so each is sent once.
+"""
+import os
+import smtplib
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import List, Optional
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.models.models import NotificationOutbox, OutboxStatus
+from app.services.notifications import render_message
+
+logger = logging.getLogger(__name__)
+
+SMTP_HOST = os.getenv("SMTP_HOST")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "25"))
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+SMTP_USE_TLS = os.getenv("SMTP_USE_TLS", "false").lower() == "true"
+SMTP_FROM = os.getenv("SMTP_FROM", "no-reply@service-now.wordlyte.com")
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "2"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_BACKOFF_BASE = 30  # seconds
+OUTBOX_BACKOFF_MAX = 3600  # seconds
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """True when the connection itself is unusable (as opposed to a rejected message).
+
+    smtplib.SMTPException subclasses OSError, so plain socket errors are told apart explicitly.
+    """
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class ConsoleConnection:
+    """Stand-in used when no SMTP_HOST is configured (local development)."""
+
+    def send_message(self, msg: EmailMessage):
+        print(f"--- EMAIL SENT ---")
+        print(f"To: {msg['To']}")
+        print(f"Subject: {msg['Subject']}")
+        print(f"Body: {msg.get_content()}")
+        print(f"------------------")
+
+    def noop(self):
+        return (250, b"OK")
+
+    def quit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SMTPConnectionPool:
+    """A small pool of persistent SMTP connections.
+
+    Connections are reused across batches and only re-established when the server
+    drops them, so a batch of N emails costs one handshake instead of N.
+    """
+
+    def __init__(self, host: Optional[str], port: int = 25, size: int = 2, username: Optional[str] = None,
+                 password: Optional[str] = None, use_tls: bool = False, timeout: float = 30, idle_check: float = 60):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.idle_check = idle_check
+        self._idle: List[tuple] = []  # (connection, last_used)
+        self._lock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        if not self.host:
+            return ConsoleConnection()
+        conn = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        conn.ehlo()
+        if self.use_tls:
+            conn.starttls()
+            conn.ehlo()
+        if self.username:
+            conn.login(self.username, self.password)
+        return conn
+
+    def _checkout(self):
+        with self._lock:
+            while self._idle:
+                conn, last_used = self._idle.pop()
+                if time.monotonic() - last_used < self.idle_check:
+                    return conn
+                # Idle for a while: make sure the server has not hung up on us
+                try:
+                    if conn.noop()[0] == 250:
+                        return conn
+                except Exception:
+                    pass
+                self._discard(conn)
+        return self._connect()
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        self._semaphore.acquire()
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except BaseException as e:
+            if conn is not None and is_connection_error(e):
+                self._discard(conn)
+                conn = None
+            raise
+        finally:
+            if conn is not None:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+            self._semaphore.release()
+
+    def close(self):
+        with self._lock:
+            for conn, _ in self._idle:
+                try:
+                    conn.quit()
+                except Exception:
+                    self._discard(conn)
+            self._idle = []
+
+
+def build_message(entry: NotificationOutbox) -> EmailMessage:
+    subject, body = render_message(entry.template, entry.context or {})
+    msg = EmailMessage()
+    msg["From"] = SMTP_FROM
+    msg["To"] = entry.recipient_email
+    msg["Subject"] = subject
+    msg.set_content(body)
+    return msg
+
+
+def backoff_seconds(attempts: int) -> int:
+    return min(OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX)
+
+
+def claim_batch(db: Session, limit: int = OUTBOX_BATCH_SIZE) -> List[NotificationOutbox]:
+    # Locks are held until the caller commits; concurrent workers skip these rows
+    return db.query(NotificationOutbox).filter(
+        NotificationOutbox.status == OutboxStatus.PENDING,
+        NotificationOutbox.next_attempt_at <= datetime.utcnow()
+    ).order_by(NotificationOutbox.next_attempt_at.asc()).limit(limit).with_for_update(skip_locked=True).all()
+
+
+def _record_failure(entry: NotificationOutbox, error: Exception):
+    entry.attempts += 1
+    entry.last_error = str(error)[:1000]
+    if entry.attempts >= OUTBOX_MAX_ATTEMPTS:
+        entry.status = OutboxStatus.FAILED
+        logger.error(f"Giving up on outbox entry {entry.id} after {entry.attempts} attempts: {error}")
+    else:
+        entry.next_attempt_at = datetime.utcnow() + timedelta(seconds=backoff_seconds(entry.attempts))
+        logger.warning(f"Outbox entry {entry.id} failed (attempt {entry.attempts}), retrying at {entry.next_attempt_at}: {error}")
+
+
+def process_batch(db: Session, pool: SMTPConnectionPool, limit: int = OUTBOX_BATCH_SIZE) -> int:
+    """Claims and sends one batch over a single pooled connection. Returns the number of rows claimed.
+
+    The caller is responsible for committing.
+    """
+    entries = claim_batch(db, limit)
+    if not entries:
+        return 0
+
+    remaining = list(entries)
+    try:
+        with pool.connection() as conn:
+            while remaining:
+                entry = remaining[0]
+                try:
+                    msg = build_message(entry)
+                    conn.send_message(msg)
+                except Exception as e:
+                    if is_connection_error(e):
+                        raise
+                    # Rejected recipient, bad template, etc. - only this entry is affected
+                    _record_failure(entry, e)
+                else:
+                    entry.status = OutboxStatus.SENT
+                    entry.sent_at = datetime.utcnow()
+                    entry.last_error = None
+                remaining.pop(0)
+    except Exception as e:
+        if not is_connection_error(e):
+            raise
+        # The entry in flight counts as an attempt; the rest are simply retried later
+        if remaining:
+            _record_failure(remaining[0], e)
+            for entry in remaining[1:]:
+                entry.next_attempt_at = datetime.utcnow() + timedelta(seconds=OUTBOX_BACKOFF_BASE)
+
+    return len(entries)
+
+
+def run_worker(stop_event: Optional[threading.Event] = None):
+    pool = SMTPConnectionPool(
+        SMTP_HOST, SMTP_PORT, size=SMTP_POOL_SIZE, username=SMTP_USER,
+        password=SMTP_PASSWORD, use_tls=SMTP_USE_TLS
+    )
+    stop_event = stop_event or threading.Event()
+    logger.info(f"Outbox worker started (smtp={SMTP_HOST or 'console'}, batch={OUTBOX_BATCH_SIZE})")
+    try:
+        while not stop_event.is_set():
+            db = SessionLocal()
+            try:
+                claimed = process_batch(db, pool)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Outbox batch failed: {e}")
+                claimed = 0
+            finally:
+                db.close()
+            if claimed < OUTBOX_BATCH_SIZE:
+                stop_event.wait(OUTBOX_POLL_INTERVAL)
+    finally:
+        pool.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    run_worker()
@@ -0,0 +1,188 @@
+"""Thumbnails for images and head-of-file excerpts for text/log attachments.
+
+Previews are derived from a blob, so they share its lifetime and are stored
+under the blob's key with a suffix (``ab/cd/<sha256>.thumb.jpg``). Rendering
+runs in a process pool so decoding large screenshots never blocks the API
+workers; it is kicked off after upload and repeated lazily whenever a preview
+is requested but missing.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+from PIL import Image, ImageOps
+from app.services.storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_THUMBNAIL_SIZE = int(os.getenv("PREVIEW_THUMBNAIL_SIZE", "320"))
+PREVIEW_TEXT_LINES = int(os.getenv("PREVIEW_TEXT_LINES", "40"))
+PREVIEW_TEXT_MAX_BYTES = int(os.getenv("PREVIEW_TEXT_MAX_BYTES", str(16 * 1024)))
+# Decompression-bomb guard: larger images are not thumbnailed
+PREVIEW_MAX_PIXELS = int(os.getenv("PREVIEW_MAX_PIXELS", str(64 * 1024 * 1024)))
+PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", "2"))
+# Corrupt or unsupported files are not re-rendered on every request
+PREVIEW_RETRY_AFTER = float(os.getenv("PREVIEW_RETRY_AFTER", "600"))
+
+THUMBNAIL = "thumbnail"
+TEXT = "text"
+
+PREVIEW_SUFFIX = {THUMBNAIL: ".thumb.jpg", TEXT: ".head.txt"}
+PREVIEW_MEDIA_TYPE = {THUMBNAIL: "image/jpeg", TEXT: "text/plain; charset=utf-8"}
+
+TEXT_TYPES = ("application/json", "application/xml", "application/x-ndjson", "application/x-yaml")
+
+
+def preview_kind(content_type: Optional[str]) -> Optional[str]:
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type.startswith("image/") and content_type != "image/svg+xml":
+        return THUMBNAIL
+    if content_type.startswith("text/") or content_type in TEXT_TYPES:
+        return TEXT
+    return None
+
+
+def preview_key(blob_key: str, kind: str) -> str:
+    return f"{blob_key}{PREVIEW_SUFFIX[kind]}"
+
+
+def render_thumbnail(source_path: str, dest_path: str):
+    Image.MAX_IMAGE_PIXELS = PREVIEW_MAX_PIXELS
+    with Image.open(source_path) as image:
+        # draft() lets JPEG decode at a reduced scale instead of full resolution
+        image.draft("RGB", (PREVIEW_THUMBNAIL_SIZE, PREVIEW_THUMBNAIL_SIZE))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((PREVIEW_THUMBNAIL_SIZE, PREVIEW_THUMBNAIL_SIZE))
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.save(dest_path, "JPEG", quality=80, optimize=True)
+
+
+def render_text(source_path: str, dest_path: str):
+    lines = []
+    remaining = PREVIEW_TEXT_MAX_BYTES
+    with open(source_path, "rb") as f:
+        for line in f:
+            if len(lines) >= PREVIEW_TEXT_LINES or remaining <= 0:
+                break
+            line = line[:remaining]
+            remaining -= len(line)
+            lines.append(line)
+    with open(dest_path, "w", encoding="utf-8") as out:
+        out.write(b"".join(lines).decode("utf-8", "replace"))
+
+
+RENDERERS = {THUMBNAIL: render_thumbnail, TEXT: render_text}
+
+
+def render_preview(kind: str, source_path: str, dest_path: str):
+    """Runs in a pool process; must only touch the two paths it is given."""
+    RENDERERS[kind](source_path, dest_path)
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+# One render per preview key at a time; concurrent misses wait for the same result
+_inflight: Dict[str, asyncio.Task] = {}
+_failed: Dict[str, float] = {}
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PREVIEW_WORKERS)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _remove(path: Optional[str]):
+    if path:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+async def _render(storage: StorageBackend, blob_key: str, kind: str, key: str) -> Optional[str]:
+    loop = asyncio.get_running_loop()
+    os.makedirs(storage.staging_dir, exist_ok=True)
+    dest_path = os.path.join(storage.staging_dir, f"{uuid.uuid4()}.preview")
+    fetched_path = None
+    source_path = storage.local_path(blob_key)
+    try:
+        if source_path is None:
+            # Object storage: render from a local copy
+            fetched_path = os.path.join(storage.staging_dir, f"{uuid.uuid4()}.source")
+            await loop.run_in_executor(None, _fetch, storage, blob_key, fetched_path)
+            source_path = fetched_path
+        await loop.run_in_executor(get_pool(), render_preview, kind, source_path, dest_path)
+        await loop.run_in_executor(None, storage.put, dest_path, key, PREVIEW_MEDIA_TYPE[kind])
+        # Checked after storing: a blob deleted before this point has had its previews
+        # deleted already, one deleted after it will delete this one too
+        if not await loop.run_in_executor(None, storage.exists, blob_key):
+            await loop.run_in_executor(None, storage.delete, key)
+            return None
+        return key
+    finally:
+        _remove(dest_path)
+        _remove(fetched_path)
+
+
+def _fetch(storage: StorageBackend, key: str, dest_path: str):
+    with storage.open(key) as source, open(dest_path, "wb") as dest:
+        while True:
+            block = source.read(1024 * 1024)
+            if not block:
+                break
+            dest.write(block)
+
+
+async def ensure_preview(storage: StorageBackend, blob_key: str, content_type: Optional[str]) -> Optional[str]:
+    """Returns the storage key of the preview for ``blob_key``, rendering it if it is missing.
+
+    Returns None when the type has no preview or rendering fails (e.g. a corrupt image).
+    """
+    kind = preview_kind(content_type)
+    if kind is None:
+        return None
+    key = preview_key(blob_key, kind)
+    loop = asyncio.get_running_loop()
+    if await loop.run_in_executor(None, storage.exists, key):
+        return key
+
+    if time.monotonic() - _failed.get(key, float("-inf")) < PREVIEW_RETRY_AFTER:
+        return None
+
+    task = _inflight.get(key)
+    if task is None:
+        # A task of its own, so a caller that goes away (client disconnect) does not
+        # cancel the render for the others waiting on it
+        task = _inflight[key] = asyncio.ensure_future(_render_once(storage, blob_key, kind, key))
+    return await asyncio.shield(task)
+
+
+async def _render_once(storage: StorageBackend, blob_key: str, kind: str, key: str) -> Optional[str]:
+    try:
+        return await _render(storage, blob_key, kind, key)
+    except Exception as e:
+        logger.warning(f"Preview rendering failed for {blob_key}: {e}")
+        if len(_failed) > 10000:
+            _failed.clear()
+        _failed[key] = time.monotonic()
+        return None
+    finally:
+        del _inflight[key]
+
+
+def delete_previews(storage: StorageBackend, blob_key: str):
+    """Called once the blob itself is gone."""
+    for kind in PREVIEW_SUFFIX:
+        storage.delete(preview_key(blob_key, kind))
@@ -0,0 +1,102 @@
+"""Impact of a problem, aggregated from its linked incidents in the database.
+
+The figures come from three grouped queries over ``incidents.problem_id``
+(summary, per department, per period), so nothing is loaded row by row.
+Results are cached per worker. Each problem has an ``impact_version`` counter,
+bumped in the same transaction as any change to its inputs (an incident
+being linked, moved or changing status). A cached entry is only served while
+its version matches the problem row the endpoint loads anyway, so every worker
+sees a change as soon as it is committed.
+"""
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import Tuple
+from sqlalchemy import extract, func, update
+from sqlalchemy.orm import Session
+from app.core.metrics import PROBLEM_IMPACT_CACHE
+from app.models.models import Department, Incident, IncidentStatus, Problem
+
+PROBLEM_IMPACT_CACHE_SIZE = int(os.getenv("PROBLEM_IMPACT_CACHE_SIZE", "1000"))
+
+BUCKETS = ("day", "week", "month")
+OPEN_STATUSES = (IncidentStatus.OPEN, IncidentStatus.IN_PROGRESS)
+RESOLVED_STATUSES = (IncidentStatus.RESOLVED, IncidentStatus.CLOSED)
+
+_cache: "OrderedDict[Tuple[str, str], Tuple[int, dict]]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def touch(db: Session, *problem_ids):
+    """Marks the impact of these problems as changed; the caller commits."""
+    ids = {i for i in problem_ids if i}
+    if ids:
+        db.execute(
+            update(Problem).where(Problem.id.in_(ids)).values(impact_version=Problem.impact_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def compute_impact(db: Session, problem_id, bucket: str) -> dict:
+    linked = Incident.problem_id == problem_id
+    hours_to_resolve = extract("epoch", Incident.resolved_at - Incident.created_at) / 3600
+    resolved = Incident.status.in_(RESOLVED_STATUSES) & Incident.resolved_at.isnot(None)
+
+    summary = db.query(
+        func.count(Incident.id),
+        func.count(Incident.id).filter(Incident.status.in_(OPEN_STATUSES)),
+        func.count(Incident.id).filter(resolved),
+        func.coalesce(func.sum(hours_to_resolve).filter(resolved), 0),
+        func.avg(hours_to_resolve).filter(resolved),
+        func.min(Incident.created_at),
+        func.max(Incident.created_at),
+    ).filter(linked).one()
+
+    departments = db.query(
+        Incident.department_id, Department.name, func.count(Incident.id)
+    ).outerjoin(Department, Department.id == Incident.department_id).filter(linked).group_by(
+        Incident.department_id, Department.name
+    ).order_by(func.count(Incident.id).desc()).all()
+
+    period = func.date_trunc(bucket, Incident.created_at)
+    rate = db.query(period, func.count(Incident.id)).filter(linked).group_by(period).order_by(period).all()
+
+    incident_count, open_count, resolved_count, total_hours, mean_hours, first_at, last_at = summary
+    return {
+        "problem_id": problem_id,
+        "incident_count": incident_count,
+        "open_count": open_count,
+        "resolved_count": resolved_count,
+        "total_resolution_hours": round(float(total_hours), 2),
+        "mean_resolution_hours": round(float(mean_hours), 2) if mean_hours is not None else None,
+        "first_incident_at": first_at,
+        "last_incident_at": last_at,
+        "departments": [
+            {"department_id": d, "department_name": name, "incident_count": count}
+            for d, name, count in departments
+        ],
+        "bucket": bucket,
+        "rate": [{"period_start": start, "incident_count": count} for start, count in rate],
+        "computed_at": datetime.utcnow(),
+    }
+
+
+def get_impact(db: Session, problem: Problem, bucket: str = "week") -> dict:
+    key = (str(problem.id), bucket)
+    version = problem.impact_version
+    with _lock:
+        cached = _cache.get(key)
+        if cached is not None and cached[0] == version:
+            _cache.move_to_end(key)
+            PROBLEM_IMPACT_CACHE.labels("hit").inc()
+            return cached[1]
+    PROBLEM_IMPACT_CACHE.labels("miss").inc()
+    impact = compute_impact(db, problem.id, bucket)
+    with _lock:
+        _cache[key] = (version, impact)
+        _cache.move_to_end(key)
+        while len(_cache) > PROBLEM_IMPACT_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return impact
+
@@ -0,0 +1,116 @@
+"""Per-worker cache of small, rarely changing reference tables.
+
+SLA policies and calendars, categories, departments, service items and the
+assignee list are read on most page loads but only change through a few
+admin endpoints.
+Each kind has a row in ``reference_versions``. Writers call ``bump`` inside
+their transaction, which increments that row and sends a
+``reference_changes`` notification, so every worker drops its copy as soon
+as the write commits. Notifications are lost while a worker's listener is
+reconnecting, so each worker also compares its versions with the table at
+most every REFERENCE_CACHE_VERIFY_SECONDS; that is one query over a handful
+of rows for all kinds together.
+
+Loaders must return plain data or pydantic schemas, never ORM objects, so the
+cached value can be shared by concurrent requests without a session.
+"""
+import os
+import threading
+import time
+from typing import Callable, Dict, Tuple, TypeVar
+from sqlalchemy import event, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.core.metrics import REFERENCE_CACHE, REFERENCE_CACHE_INVALIDATIONS
+from app.core.pg_listen import listener, notify
+from app.models.models import ReferenceVersion
+
+REFERENCE_CACHE_VERIFY_SECONDS = float(os.getenv("REFERENCE_CACHE_VERIFY_SECONDS", "30"))
+
+CHANGES_CHANNEL = "reference_changes"
+
+SLA_POLICIES = "sla_policies"
+SLA_CALENDARS = "sla_calendars"
+CATEGORIES = "categories"
+DEPARTMENTS = "departments"
+SERVICE_ITEMS = "service_items"
+ASSIGNEES = "assignees"
+KINDS = (SLA_POLICIES, SLA_CALENDARS, CATEGORIES, DEPARTMENTS, SERVICE_ITEMS, ASSIGNEES)
+
+T = TypeVar("T")
+
+
+def current_versions(db: Session) -> Dict[str, int]:
+    return dict(db.execute(select(ReferenceVersion.name, ReferenceVersion.version)).all())
+
+
+class ReferenceCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # kind -> (version it was loaded at, value)
+        self._entries: Dict[str, Tuple[int, object]] = {}
+        # Bumped on every invalidation, so a load that raced one is not stored
+        self._generations: Dict[str, int] = {kind: 0 for kind in KINDS}
+        self._verified_at = float("-inf")
+
+    def invalidate(self, *kinds: str, source: str = "local"):
+        with self.lock:
+            for kind in kinds:
+                self._generations[kind] = self._generations.get(kind, 0) + 1
+                if self._entries.pop(kind, None) is not None:
+                    REFERENCE_CACHE_INVALIDATIONS.labels(kind, source).inc()
+
+    def clear(self):
+        self.invalidate(*KINDS, source="reset")
+        self._verified_at = float("-inf")
+
+    def verify(self, db: Session):
+        """Drops entries whose version no longer matches the table."""
+        versions = current_versions(db)
+        with self.lock:
+            self._verified_at = time.monotonic()
+            stale = [kind for kind, (version, _) in self._entries.items() if versions.get(kind, 0) != version]
+        if stale:
+            self.invalidate(*stale, source="verify")
+
+    def get(self, db: Session, kind: str, loader: Callable[[Session], T]) -> T:
+        if time.monotonic() - self._verified_at >= REFERENCE_CACHE_VERIFY_SECONDS:
+            self.verify(db)
+        with self.lock:
+            entry = self._entries.get(kind)
+            generation = self._generations.get(kind, 0)
+        if entry is not None:
+            REFERENCE_CACHE.labels(kind, "hit").inc()
+            return entry[1]
+
+        REFERENCE_CACHE.labels(kind, "miss").inc()
+        # Version first: a write landing between the two reads leaves a newer
+        # value under an older version, which the next check simply reloads
+        version = current_versions(db).get(kind, 0)
+        value = loader(db)
+        with self.lock:
+            if self._generations.get(kind, 0) == generation:
+                self._entries[kind] = (version, value)
+        return value
+
+
+cache = ReferenceCache()
+
+
+def bump(db: Session, *kinds: str):
+    """Marks ``kinds`` as changed by the caller's transaction.
+
+    Other workers hear about it once the transaction commits; this worker drops
+    its copy on commit as well, without waiting for its own notification.
+    """
+    for kind in kinds:
+        db.execute(insert(ReferenceVersion).values(name=kind, version=1).on_conflict_do_update(
+            index_elements=[ReferenceVersion.name],
+            set_={"version": ReferenceVersion.version + 1},
+        ))
+        notify(db, CHANGES_CHANNEL, kind)
+    event.listen(db, "after_commit", lambda session: cache.invalidate(*kinds), once=True)
+
+
+listener.subscribe(CHANGES_CHANNEL, lambda kind: cache.invalidate(kind, source="notify"))
+listener.on_reconnect(cache.clear)
@@ -0,0 +1,188 @@
+"""Time-to-resolve percentiles from mergeable sketches, or exactly in SQL.
+
+Durations are kept as a DDSketch: logarithmic bins whose boundaries are the
+powers of GAMMA, so any value read back from a bin is within
+RELATIVE_ACCURACY of the true duration. Each resolved incident adds one to
+a bin of ``incident_resolve_sketches`` for the day it was resolved and its
+(department, priority); the rows are maintained with the rollups (see
+services/rollups.py). A sketch over any range of days is the per-bin sum of
+its daily sketches, so a percentile over a year reads at most a few
+thousand rows whatever the number of incidents. Changing RELATIVE_ACCURACY
+changes the bins: rebuild with ``python -m app.services.rollups`` after.
+
+``mode="exact"`` computes the same figures with ``percentile_cont`` over
+the incidents themselves, to validate the sketch.
+"""
+import math
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import BigInteger, Float, cast, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY, array
+from sqlalchemy.orm import Session
+from app.models.models import Department, Incident, IncidentResolveSketch, IncidentStatus
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+# Bin i > 0 holds [GAMMA ** (i - 1), GAMMA ** i) seconds, bin 0 durations under a second;
+# the bounds reach ten years, longer durations share the last bin
+MAX_SECONDS = 10 * 365 * 86400
+BOUNDS = [GAMMA ** i for i in range(math.ceil(math.log(MAX_SECONDS, GAMMA)) + 1)]
+
+QUANTILES = (0.5, 0.9, 0.99)
+MODES = ("sketch", "exact")
+
+DONE_STATUSES = (IncidentStatus.RESOLVED, IncidentStatus.CLOSED)
+
+
+def bin_of(seconds: int) -> int:
+    """Same as Postgres ``width_bucket(seconds, BOUNDS)``, which the rebuild uses."""
+    return bisect_right(BOUNDS, seconds)
+
+
+def resolve_seconds():
+    """Whole seconds from creation to resolution, as in rollups.Snapshot.resolve_seconds."""
+    return cast(func.floor(func.extract("epoch", Incident.resolved_at - Incident.created_at)), BigInteger)
+
+
+def bin_sql(seconds):
+    return func.width_bucket(cast(seconds, Float), literal(BOUNDS, ARRAY(Float)))
+
+
+def value_of(bin: int) -> float:
+    """The duration a bin stands for: within RELATIVE_ACCURACY of all its values."""
+    if bin <= 0:
+        return 0.0
+    if bin >= len(BOUNDS):
+        return BOUNDS[-1]
+    return 2 * BOUNDS[bin] / (GAMMA + 1)
+
+
+def quantiles(bins: Dict[int, int], qs: Iterable[float] = QUANTILES) -> List[Optional[float]]:
+    """Durations (seconds) at each quantile of a merged sketch, None when it is empty."""
+    total = sum(bins.values())
+    ordered = sorted((b, c) for b, c in bins.items() if c > 0)
+    results = []
+    for q in qs:
+        if not total:
+            results.append(None)
+            continue
+        rank = q * (total - 1)
+        seen = 0
+        for b, count in ordered:
+            seen += count
+            if seen > rank:
+                results.append(value_of(b))
+                break
+    return results
+
+
+def day_range(start: datetime, end: datetime) -> Tuple[datetime, datetime]:
+    """The whole days covering [start, end): the granularity of the sketches."""
+    first = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    last = end.replace(hour=0, minute=0, second=0, microsecond=0)
+    if last < end:
+        last += timedelta(days=1)
+    return first, last
+
+
+def _row(key, label: str, count: int, values: List[Optional[float]]) -> dict:
+    return {
+        "key": str(getattr(key, "value", key)) if key is not None else None,
+        "label": label,
+        "count": count,
+        **{f"p{round(q * 100)}_hours": round(v / 3600, 2) if v is not None else None for q, v in zip(QUANTILES, values)},
+    }
+
+
+def _department_names(db: Session, ids) -> Dict[object, str]:
+    ids = [i for i in ids if i is not None]
+    if not ids:
+        return {}
+    return dict(db.execute(select(Department.id, Department.name).where(Department.id.in_(ids))).all())
+
+
+def _sketch(db: Session, start: datetime, end: datetime, filters: list) -> dict:
+    sketch = IncidentResolveSketch
+    rows = db.execute(
+        select(sketch.priority, sketch.department_id, sketch.bin, func.sum(sketch.incident_count))
+        .where(sketch.bucket_start >= start, sketch.bucket_start < end, *filters)
+        .group_by(sketch.priority, sketch.department_id, sketch.bin)
+    ).all()
+    overall: Dict[int, int] = defaultdict(int)
+    by_priority: Dict[object, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    by_department: Dict[object, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+    for priority, department_id, b, count in rows:
+        overall[b] += count
+        by_priority[priority][b] += count
+        by_department[department_id][b] += count
+
+    def merged(bins: Dict[int, int]) -> Tuple[int, List[Optional[float]]]:
+        return sum(bins.values()), quantiles(bins)
+
+    return {
+        "overall": merged(overall),
+        "by_priority": {k: merged(v) for k, v in by_priority.items()},
+        "by_department": {k: merged(v) for k, v in by_department.items()},
+    }
+
+
+def _exact(db: Session, start: datetime, end: datetime, filters: list) -> dict:
+    percentiles = func.percentile_cont(array(QUANTILES)).within_group(resolve_seconds())
+    population = [
+        Incident.status.in_(DONE_STATUSES),
+        Incident.created_at.isnot(None),
+        Incident.resolved_at >= start,
+        Incident.resolved_at < end,
+        *filters,
+    ]
+
+    def grouped(column=None) -> dict:
+        columns = [column] if column is not None else []
+        query = select(*columns, func.count(), percentiles).where(*population)
+        if column is not None:
+            query = query.group_by(column)
+        return {
+            (row[0] if column is not None else None): (row[-2], list(row[-1] or [None] * len(QUANTILES)))
+            for row in db.execute(query).all()
+        }
+
+    return {
+        "overall": grouped().get(None, (0, [None] * len(QUANTILES))),
+        "by_priority": grouped(Incident.priority),
+        "by_department": grouped(Incident.department_id),
+    }
+
+
+def compute_percentiles(db: Session, start: datetime, end: datetime, mode: str = "sketch",
+                        scoped: bool = False, department_id=None) -> dict:
+    """p50/p90/p99 time to resolve of the incidents resolved in the days covering [start, end).
+
+    With ``scoped`` only incidents of ``department_id`` count.
+    """
+    start, end = day_range(start, end)
+    if mode == "exact":
+        filters = [Incident.department_id == department_id] if scoped else []
+        result = _exact(db, start, end, filters)
+    else:
+        filters = [IncidentResolveSketch.department_id == department_id] if scoped else []
+        result = _sketch(db, start, end, filters)
+
+    names = _department_names(db, result["by_department"].keys())
+    count, values = result["overall"]
+    return {
+        "start": start,
+        "end": end,
+        "mode": mode,
+        "relative_accuracy": RELATIVE_ACCURACY if mode == "sketch" else None,
+        "overall": _row(None, "All", count, values),
+        "by_priority": sorted(
+            (_row(p, str(getattr(p, "value", p)), c, v) for p, (c, v) in result["by_priority"].items()),
+            key=lambda r: r["label"],
+        ),
+        "by_department": sorted(
+            (_row(d, names.get(d, "Unassigned"), c, v) for d, (c, v) in result["by_department"].items()),
+            key=lambda r: r["label"],
+        ),
+    }
@@ -0,0 +1,361 @@
+"""Resumable, chunked attachment uploads.
+
+A session preallocates one staged file; every numbered chunk is written straight
+to its offset with ``pwrite`` so chunks can arrive in any order (and in
+parallel) and there is no assembly pass at the end. The SHA-256 needed for
+content addressing is computed as chunks arrive: a chunk that extends the
+contiguous hashed prefix is hashed while it streams in. Finalizing only reads
+back chunks that arrived out of order or on another worker, so a sequential
+upload is never read twice.
+
+A chunk streams to its offset before any lock or transaction is taken, so a
+slow client holds no database connection. Recording it is then serialized
+per chunk by a transaction-scoped advisory lock: a re-send that finds the
+chunk received is compared against its hash, and a write that may have
+overwritten a chunk recorded meanwhile with other content drops that record,
+so the chunk is sent again.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.models.models import UploadChunk, UploadSession
+from app.services.storage import StorageBackend, get_storage
+from app.services.uploads import UploadError, StreamedUpload, is_allowed_type
+
+logger = logging.getLogger(__name__)
+
+RESUMABLE_UPLOAD_MAX_BYTES = int(os.getenv("RESUMABLE_UPLOAD_MAX_BYTES", str(20 * 1024 ** 3)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+UPLOAD_CHUNK_MIN_BYTES = int(os.getenv("UPLOAD_CHUNK_MIN_BYTES", str(64 * 1024)))
+UPLOAD_CHUNK_MAX_BYTES = int(os.getenv("UPLOAD_CHUNK_MAX_BYTES", str(64 * 1024 * 1024)))
+UPLOAD_SESSION_TTL = timedelta(hours=float(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24")))
+UPLOAD_CLEANUP_INTERVAL = float(os.getenv("UPLOAD_CLEANUP_INTERVAL", "600"))
+
+READ_BLOCK_SIZE = 1024 * 1024
+
+
+def session_dir(storage: StorageBackend) -> str:
+    return os.path.join(storage.staging_dir, "sessions")
+
+
+def session_path(storage: StorageBackend, session_id) -> str:
+    return os.path.join(session_dir(storage), f"{session_id}.part")
+
+
+def total_chunks(session: UploadSession) -> int:
+    return math.ceil(session.total_size / session.chunk_size)
+
+
+def expected_chunk_size(session: UploadSession, index: int) -> int:
+    return min(session.chunk_size, session.total_size - index * session.chunk_size)
+
+
+def received_ranges(session: UploadSession, indices: List[int]) -> List[List[int]]:
+    """Merges received chunk indices into ``[start, end)`` byte ranges."""
+    ranges: List[List[int]] = []
+    for index in sorted(indices):
+        start = index * session.chunk_size
+        end = start + expected_chunk_size(session, index)
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
+
+
+class _HashCursor:
+    """Running SHA-256 over the contiguous prefix of chunks seen by this process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hasher = hashlib.sha256()
+        self.next_index = 0
+        self.chunk_hashes: List[str] = []
+
+
+_cursors: Dict[str, _HashCursor] = {}
+_cursors_lock = threading.Lock()
+
+
+def _cursor(session_id) -> _HashCursor:
+    with _cursors_lock:
+        return _cursors.setdefault(str(session_id), _HashCursor())
+
+
+def _drop_cursor(session_id):
+    with _cursors_lock:
+        _cursors.pop(str(session_id), None)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def create_session(
+    db: Session,
+    storage: StorageBackend,
+    incident_id,
+    uploader_id,
+    file_name: str,
+    content_type: str,
+    total_size: int,
+    chunk_size: Optional[int] = None,
+) -> UploadSession:
+    """Registers a session and preallocates its staged file; the caller commits."""
+    if total_size > RESUMABLE_UPLOAD_MAX_BYTES:
+        raise UploadError(413, f"File exceeds the {RESUMABLE_UPLOAD_MAX_BYTES} byte limit")
+    if not is_allowed_type(content_type):
+        raise UploadError(415, f"File type {content_type} is not allowed")
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+    if not UPLOAD_CHUNK_MIN_BYTES <= chunk_size <= UPLOAD_CHUNK_MAX_BYTES:
+        raise UploadError(400, f"chunk_size must be between {UPLOAD_CHUNK_MIN_BYTES} and {UPLOAD_CHUNK_MAX_BYTES}")
+
+    session = UploadSession(
+        incident_id=incident_id,
+        uploader_id=uploader_id,
+        file_name=os.path.basename(file_name) or "upload",
+        content_type=content_type,
+        total_size=total_size,
+        chunk_size=chunk_size,
+        expires_at=datetime.utcnow() + UPLOAD_SESSION_TTL,
+    )
+    db.add(session)
+    db.flush()
+
+    os.makedirs(session_dir(storage), exist_ok=True)
+    with open(session_path(storage, session.id), "wb") as f:
+        # Sparse on most filesystems; reserves the offsets every chunk is written to
+        f.truncate(total_size)
+    return session
+
+
+def _lock_chunk(db: Session, session_id, index: int):
+    """Held until the caller's transaction ends; other chunks still arrive in parallel."""
+    db.execute(select(func.pg_advisory_xact_lock(func.hashtext(str(session_id)), index)))
+
+
+def _open_for_write(path: str) -> int:
+    try:
+        return os.open(path, os.O_WRONLY)
+    except FileNotFoundError:
+        raise UploadError(404, "Upload session has expired")
+
+
+def _record_chunk(db: Session, session_id, index: int, size: int, digest: str, wrote: bool) -> UploadChunk:
+    _lock_chunk(db, session_id, index)
+    existing = db.get(UploadChunk, (session_id, index), populate_existing=True)
+    if existing:
+        if existing.sha256 == digest:
+            return existing
+        if wrote:
+            # Another request recorded the chunk while this one was writing over it:
+            # the bytes on disk match neither record, so the chunk has to be sent again
+            db.delete(existing)
+            db.commit()
+            raise UploadError(409, f"Chunk {index} was received twice with different content; send it again")
+        raise UploadError(409, f"Chunk {index} was already received with different content")
+
+    db.execute(insert(UploadChunk).values(
+        session_id=session_id, chunk_index=index, size=size, sha256=digest, received_at=datetime.utcnow()
+    ))
+    db.execute(update(UploadSession).where(UploadSession.id == session_id)
+               .values(expires_at=datetime.utcnow() + UPLOAD_SESSION_TTL))
+    return db.get(UploadChunk, (session_id, index))
+
+
+def _forget_chunk(db: Session, session_id, index: int):
+    """After a failed write: a copy recorded meanwhile may have been partly overwritten."""
+    _lock_chunk(db, session_id, index)
+    db.execute(delete(UploadChunk).where(UploadChunk.session_id == session_id, UploadChunk.chunk_index == index))
+    db.commit()
+
+
+async def write_chunk(request: Request, db: Session, storage: StorageBackend, session: UploadSession, index: int) -> UploadChunk:
+    """Streams one chunk from the request body to its offset and records it; the caller commits.
+
+    The caller's transaction is committed before the body is read, so a slow
+    client holds no connection; the chunk is recorded afterwards in a short
+    transaction under the chunk's lock. Re-sending a chunk that was already
+    received is a no-op as long as the content is identical.
+    """
+    if not 0 <= index < total_chunks(session):
+        raise UploadError(400, f"Chunk index must be between 0 and {total_chunks(session) - 1}")
+    expected = expected_chunk_size(session, index)
+    session_id, offset, path = session.id, index * session.chunk_size, session_path(storage, session.id)
+    received = await run_in_threadpool(db.get, UploadChunk, (session_id, index)) is not None
+    await run_in_threadpool(db.commit)
+
+    cursor = _cursor(session_id)
+    with cursor.lock:
+        # Extends the hashed prefix: hash it in-flight instead of reading it back later
+        speculative = cursor.hasher.copy() if cursor.next_index == index and not received else None
+
+    chunk_hasher = hashlib.sha256()
+    size = 0
+    # A received chunk is only compared, never rewritten
+    fd = None if received else await run_in_threadpool(_open_for_write, path)
+    try:
+        async for data in request.stream():
+            if not data:
+                continue
+            size += len(data)
+            if size > expected:
+                raise UploadError(413, f"Chunk {index} must be {expected} bytes")
+            chunk_hasher.update(data)
+            if speculative is not None:
+                speculative.update(data)
+            if fd is not None:
+                await run_in_threadpool(os.pwrite, fd, data, offset + size - len(data))
+        if size != expected:
+            raise UploadError(400, f"Chunk {index} must be {expected} bytes, got {size}")
+    except BaseException:
+        if fd is not None:
+            await run_in_threadpool(_forget_chunk, db, session_id, index)
+        raise
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+    digest = chunk_hasher.hexdigest()
+    chunk = await run_in_threadpool(_record_chunk, db, session_id, index, size, digest, fd is not None)
+
+    if speculative is not None:
+        with cursor.lock:
+            if cursor.next_index == index:
+                cursor.hasher = speculative
+                cursor.chunk_hashes.append(digest)
+                cursor.next_index += 1
+    return chunk
+
+
+def _read_range(fd: int, offset: int, length: int, *hashers):
+    while length > 0:
+        block = os.pread(fd, min(READ_BLOCK_SIZE, length), offset)
+        if not block:
+            raise UploadError(409, "Staged upload is shorter than expected")
+        for hasher in hashers:
+            hasher.update(block)
+        offset += len(block)
+        length -= len(block)
+
+
+def finish_hash(storage: StorageBackend, session: UploadSession, chunks: List[UploadChunk]) -> str:
+    """Completes the running hash, reading back only the chunks that were not hashed in-flight."""
+    by_index = {c.chunk_index: c.sha256 for c in chunks}
+    cursor = _cursor(session.id)
+    with cursor.lock:
+        # A chunk rewritten after it was hashed (e.g. its request was rolled back) invalidates the prefix
+        if any(by_index.get(i) != h for i, h in enumerate(cursor.chunk_hashes)):
+            cursor.hasher, cursor.next_index, cursor.chunk_hashes = hashlib.sha256(), 0, []
+        fd = os.open(session_path(storage, session.id), os.O_RDONLY)
+        try:
+            for index in range(cursor.next_index, total_chunks(session)):
+                chunk_hasher = hashlib.sha256()
+                hasher = cursor.hasher.copy()
+                _read_range(fd, index * session.chunk_size, expected_chunk_size(session, index), chunk_hasher, hasher)
+                if chunk_hasher.hexdigest() != by_index[index]:
+                    raise UploadError(409, f"Chunk {index} on disk does not match what was received")
+                cursor.hasher = hasher
+                cursor.chunk_hashes.append(by_index[index])
+                cursor.next_index = index + 1
+        finally:
+            os.close(fd)
+        return cursor.hasher.hexdigest()
+
+
+def finalize_session(db: Session, storage: StorageBackend, session_id) -> Tuple[UploadSession, StreamedUpload]:
+    """Checks every chunk is present and hands the staged file over as a StreamedUpload.
+
+    The session is locked but kept; ``consume_session`` deletes it once the
+    upload is accepted, and the caller stores the blob and commits.
+    """
+    session = db.query(UploadSession).filter(UploadSession.id == session_id).with_for_update().first()
+    if not session:
+        raise UploadError(404, "Upload session not found")
+    chunks = db.query(UploadChunk).filter(UploadChunk.session_id == session.id).all()
+    received = {c.chunk_index for c in chunks}
+    missing = [i for i in range(total_chunks(session)) if i not in received]
+    if missing:
+        raise UploadError(409, f"Missing chunks: {missing[:50]}")
+
+    sha256 = finish_hash(storage, session, chunks)
+    upload = StreamedUpload(
+        session_path(storage, session.id), session.file_name, session.content_type, session.total_size, sha256
+    )
+    return session, upload
+
+
+def consume_session(db: Session, session: UploadSession):
+    db.delete(session)
+    _drop_cursor(session.id)
+
+
+def abort_session(db: Session, storage: StorageBackend, session: UploadSession):
+    session_id = session.id
+    db.delete(session)
+    db.commit()
+    _drop_cursor(session_id)
+    _remove(session_path(storage, session_id))
+
+
+def expire_sessions(db: Session, storage: StorageBackend, now: Optional[datetime] = None) -> int:
+    """Deletes sessions past their expiry and their staged files, plus staged files
+    that no session owns any more (e.g. from a create whose commit failed)."""
+    now = now or datetime.utcnow()
+    expired = db.query(UploadSession.id).filter(
+        UploadSession.expires_at < now
+    ).with_for_update(skip_locked=True).all()
+    expired_ids = [session_id for (session_id,) in expired]
+    if expired_ids:
+        db.query(UploadSession).filter(UploadSession.id.in_(expired_ids)).delete(synchronize_session=False)
+    db.commit()
+    for session_id in expired_ids:
+        _drop_cursor(session_id)
+        _remove(session_path(storage, session_id))
+
+    directory = session_dir(storage)
+    if os.path.isdir(directory):
+        cutoff = time.time() - UPLOAD_SESSION_TTL.total_seconds()
+        stale = {
+            name[:-len(".part")] for name in os.listdir(directory)
+            if name.endswith(".part") and os.path.getmtime(os.path.join(directory, name)) < cutoff
+        }
+        if stale:
+            live = {str(i) for (i,) in db.query(UploadSession.id).filter(UploadSession.id.in_(stale)).all()}
+            for session_id in stale - live:
+                _remove(session_path(storage, session_id))
+    if expired_ids:
+        logger.info(f"Expired {len(expired_ids)} upload sessions")
+    return len(expired_ids)
+
+
+def _cleanup_once():
+    db = SessionLocal()
+    try:
+        expire_sessions(db, get_storage())
+    finally:
+        db.close()
+
+
+async def run_cleanup_loop():
+    while True:
+        await asyncio.sleep(UPLOAD_CLEANUP_INTERVAL)
+        try:
+            await run_in_threadpool(_cleanup_once)
+        except Exception as e:
+            logger.error(f"Upload session cleanup failed: {e}")
@@ -0,0 +1,319 @@
+"""Incident counts kept up to date by the write paths, for the dashboard.
+
+    python -m app.services.rollups [--verify [--repair]]
+
+Four tables are maintained incrementally, in the same transaction as the
+incident write:
+
+- ``incident_rollups_hourly`` / ``incident_rollups_daily``: per bucket and
+  (department, category, priority), the incidents created, resolved and
+  reopened in that bucket and the summed time to resolve of those resolved.
+- ``incident_status_totals``: the current number of incidents per
+  (department, priority, status), with the resolved ones' time to resolve.
+- ``incident_resolve_sketches``: per day of resolution and (department,
+  priority), a histogram of times to resolve (see resolution_sketch.py).
+
+A write takes a ``snapshot`` of the incident before changing it and calls
+``record_update`` afterwards, which applies the difference of the two
+snapshots' ``contributions`` as increments (``record_created`` is the same
+with nothing before). Both also mark the cached dashboard stats of the
+incident's department as changed (see stats_cache.py). Reopens are events
+rather than state, so they are passed in explicitly; when a reopened
+incident moves to another department, category or priority its earlier
+reopens (from the audit log) move with it.
+Rows are upserted in key order so concurrent writers cannot deadlock.
+
+Without arguments the command rebuilds all four tables from ``incidents``
+and ``audit_logs`` and then verifies the result; the migrations fill them for
+existing incidents, so it is only needed after bulk edits made outside the
+API. ``--verify`` only compares the stored rows with a fresh aggregate and
+exits non-zero on a mismatch;
+with ``--repair`` a mismatch is followed by a rebuild. Both hold a lock that
+makes incident writers wait at their rollup update, so the comparison sees
+a consistent state.
+"""
+import argparse
+import logging
+import sys
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from sqlalchemy import BigInteger, and_, delete, func, literal, or_, select, text, union_all
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.models.models import (
+    AuditLog, Incident, IncidentResolveSketch, IncidentRollupDaily, IncidentRollupHourly, IncidentStatus,
+    IncidentStatusTotal,
+)
+from app.services import stats_cache
+from app.services.resolution_sketch import bin_of, bin_sql, resolve_seconds
+
+logger = logging.getLogger(__name__)
+
+DONE_STATUSES = (IncidentStatus.RESOLVED, IncidentStatus.CLOSED)
+
+# Rollup table -> date_trunc unit of its buckets
+ROLLUPS = ((IncidentRollupHourly, "hour"), (IncidentRollupDaily, "day"))
+TABLES = (IncidentRollupHourly, IncidentRollupDaily, IncidentStatusTotal, IncidentResolveSketch)
+
+ROLLUP_KEY = ("bucket_start", "department_id", "category_id", "priority")
+ROLLUP_MEASURES = ("created_count", "resolved_count", "reopened_count", "resolve_seconds_sum")
+TOTALS_KEY = ("department_id", "priority", "status")
+TOTALS_MEASURES = ("incident_count", "resolved_count", "resolve_seconds_sum")
+SKETCH_KEY = ("bucket_start", "department_id", "priority", "bin")
+SKETCH_MEASURES = ("incident_count",)
+
+KEYS = {IncidentRollupHourly: ROLLUP_KEY, IncidentRollupDaily: ROLLUP_KEY, IncidentStatusTotal: TOTALS_KEY,
+        IncidentResolveSketch: SKETCH_KEY}
+MEASURES = {IncidentRollupHourly: ROLLUP_MEASURES, IncidentRollupDaily: ROLLUP_MEASURES,
+            IncidentStatusTotal: TOTALS_MEASURES, IncidentResolveSketch: SKETCH_MEASURES}
+
+# (table, key) -> measure -> increment
+Delta = Dict[Tuple[type, tuple], Dict[str, int]]
+
+
+class Snapshot(NamedTuple):
+    created_at: Optional[datetime]
+    department_id: object
+    category_id: object
+    priority: object
+    status: object
+    resolved_at: Optional[datetime]
+
+    @property
+    def dimensions(self) -> tuple:
+        return self.department_id, self.category_id, self.priority
+
+    @property
+    def resolve_seconds(self) -> Optional[int]:
+        """Whole seconds to resolve, or None while the incident is not resolved."""
+        if self.status not in DONE_STATUSES or self.resolved_at is None or self.created_at is None:
+            return None
+        elapsed = self.resolved_at - self.created_at
+        return elapsed.days * 86400 + elapsed.seconds
+
+
+def snapshot(incident: Incident) -> Snapshot:
+    return Snapshot(incident.created_at, incident.department_id, incident.category_id,
+                    incident.priority, incident.status, incident.resolved_at)
+
+
+def bucket(moment: datetime, unit: str) -> datetime:
+    """Python's date_trunc for the two rollup units."""
+    if unit == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add(delta: Delta, table: type, key: tuple, sign: int = 1, **measures: int):
+    entry = delta.setdefault((table, key), defaultdict(int))
+    for measure, value in measures.items():
+        entry[measure] += sign * value
+
+
+def contributions(state: Snapshot, sign: int = 1, delta: Optional[Delta] = None) -> Delta:
+    """What one incident in ``state`` adds to every table (everything except its reopens)."""
+    delta = {} if delta is None else delta
+    seconds = state.resolve_seconds
+    for table, unit in ROLLUPS:
+        if state.created_at is not None:
+            _add(delta, table, (bucket(state.created_at, unit), *state.dimensions), sign, created_count=1)
+        if seconds is not None:
+            _add(delta, table, (bucket(state.resolved_at, unit), *state.dimensions), sign,
+                 resolved_count=1, resolve_seconds_sum=seconds)
+    _add(delta, IncidentStatusTotal, (state.department_id, state.priority, state.status), sign,
+         incident_count=1, resolved_count=int(seconds is not None), resolve_seconds_sum=seconds or 0)
+    if seconds is not None:
+        _add(delta, IncidentResolveSketch,
+             (bucket(state.resolved_at, "day"), state.department_id, state.priority, bin_of(seconds)), sign,
+             incident_count=1)
+    return delta
+
+
+def reopens(dimensions: tuple, moments: Iterable[datetime], sign: int = 1, delta: Optional[Delta] = None) -> Delta:
+    delta = {} if delta is None else delta
+    for moment in moments:
+        for table, unit in ROLLUPS:
+            _add(delta, table, (bucket(moment, unit), *dimensions), sign, reopened_count=1)
+    return delta
+
+
+def _sort_key(row: dict, key: Tuple[str, ...]) -> tuple:
+    return tuple((row[k] is None, str(row[k])) for k in key)
+
+
+def apply(db: Session, delta: Delta):
+    """Adds ``delta`` to the stored rows, one upsert per table, in a fixed row order."""
+    for table in TABLES:
+        key, measures = KEYS[table], MEASURES[table]
+        rows = [
+            {**dict(zip(key, row_key)), **{m: values.get(m, 0) for m in measures}}
+            for (t, row_key), values in delta.items()
+            if t is table and any(values.values())
+        ]
+        if not rows:
+            continue
+        rows.sort(key=lambda row: _sort_key(row, key))
+        stmt = insert(table).values(rows)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=list(key),
+            set_={m: getattr(table, m) + stmt.excluded[m] for m in measures},
+        ))
+
+
+def _is_reopen():
+    return and_(AuditLog.action == "STATUS_CHANGE",
+                AuditLog.old_value == IncidentStatus.RESOLVED.value,
+                AuditLog.new_value == IncidentStatus.IN_PROGRESS.value)
+
+
+def _reopen_times(db: Session, incident_id) -> List[datetime]:
+    return [t for (t,) in db.execute(select(AuditLog.created_at).where(
+        AuditLog.incident_id == incident_id, _is_reopen(), AuditLog.created_at.isnot(None)
+    )).all()]
+
+
+def record_created(db: Session, incident: Incident):
+    apply(db, contributions(snapshot(incident)))
+    stats_cache.changed(db, incident.department_id)
+
+
+def record_update(db: Session, before: Snapshot, incident: Incident, reopened_at: Optional[datetime] = None):
+    """Applies what changed since ``before``; ``reopened_at`` is the reopen this update made, if any.
+
+    The reopen's STATUS_CHANGE audit entry must carry ``reopened_at`` as its
+    ``created_at``, so a rebuild puts it in the same bucket.
+    """
+    after = snapshot(incident)
+    delta = contributions(before, sign=-1)
+    contributions(after, delta=delta)
+    if after.dimensions != before.dimensions:
+        db.flush()
+        earlier = _reopen_times(db, incident.id)
+        if reopened_at is not None and reopened_at in earlier:
+            earlier.remove(reopened_at)
+        reopens(before.dimensions, earlier, sign=-1, delta=delta)
+        reopens(after.dimensions, earlier, delta=delta)
+    if reopened_at is not None:
+        reopens(after.dimensions, [reopened_at], delta=delta)
+    apply(db, delta)
+    # Even without a rollup change, e.g. a new assignee moves the team workload
+    stats_cache.changed(db, before.department_id, after.department_id)
+
+
+# --- Rebuild and verify ---
+
+def _expected_rollup(unit: str):
+    dimensions = (Incident.department_id, Incident.category_id, Incident.priority)
+    resolved = and_(Incident.status.in_(DONE_STATUSES), Incident.resolved_at.isnot(None))
+    seconds = resolve_seconds()
+    zero = literal(0, BigInteger)
+    one = literal(1, BigInteger)
+
+    def event(moment, created, resolved_count, reopened, resolve_seconds):
+        return select(func.date_trunc(unit, moment).label("bucket_start"), *dimensions,
+                      created.label("created_count"), resolved_count.label("resolved_count"),
+                      reopened.label("reopened_count"), resolve_seconds.label("resolve_seconds_sum"))
+
+    events = union_all(
+        event(Incident.created_at, one, zero, zero, zero).where(Incident.created_at.isnot(None)),
+        event(Incident.resolved_at, zero, one, zero, seconds).where(resolved, Incident.created_at.isnot(None)),
+        event(AuditLog.created_at, zero, zero, one, zero).join(AuditLog, AuditLog.incident_id == Incident.id)
+        .where(_is_reopen(), AuditLog.created_at.isnot(None)),
+    ).subquery()
+    key = [events.c[k] for k in ROLLUP_KEY]
+    return select(*key, *[func.sum(events.c[m]).label(m) for m in ROLLUP_MEASURES]).group_by(*key)
+
+
+def _expected_totals():
+    resolved = and_(Incident.status.in_(DONE_STATUSES), Incident.resolved_at.isnot(None),
+                    Incident.created_at.isnot(None))
+    seconds = resolve_seconds()
+    key = [getattr(Incident, k) for k in TOTALS_KEY]
+    return select(
+        *key,
+        func.count().label("incident_count"),
+        func.count().filter(resolved).label("resolved_count"),
+        func.coalesce(func.sum(seconds).filter(resolved), 0).label("resolve_seconds_sum"),
+    ).group_by(*key)
+
+
+def _expected_sketch():
+    seconds = resolve_seconds()
+    key = [func.date_trunc("day", Incident.resolved_at).label("bucket_start"), Incident.department_id,
+           Incident.priority, bin_sql(seconds).label("bin")]
+    return select(*key, func.count().label("incident_count")).where(
+        Incident.status.in_(DONE_STATUSES), Incident.resolved_at.isnot(None), Incident.created_at.isnot(None)
+    ).group_by(*key)
+
+
+def _expected(table: type):
+    if table is IncidentStatusTotal:
+        return _expected_totals()
+    if table is IncidentResolveSketch:
+        return _expected_sketch()
+    return _expected_rollup(dict(ROLLUPS)[table])
+
+
+def lock(db: Session):
+    """Makes incident writers wait at their rollup update until the caller's transaction ends."""
+    names = ", ".join(table.__tablename__ for table in TABLES)
+    db.execute(text(f"LOCK TABLE {names} IN SHARE ROW EXCLUSIVE MODE"))
+
+
+def rebuild(db: Session) -> Dict[str, int]:
+    """Replaces every rollup row with a fresh aggregate. Call with ``lock`` held."""
+    counts = {}
+    for table in TABLES:
+        db.execute(delete(table))
+        columns = list(KEYS[table] + MEASURES[table])
+        counts[table.__tablename__] = db.execute(insert(table).from_select(columns, _expected(table))).rowcount
+    return counts
+
+
+def verify(db: Session, sample: int = 10) -> Dict[str, int]:
+    """Rows that differ between each table and a fresh aggregate (rows of zeros count as absent)."""
+    mismatches = {}
+    for table in TABLES:
+        columns = KEYS[table] + MEASURES[table]
+        stored = select(*[getattr(table, c) for c in columns]) \
+            .where(or_(*[getattr(table, m) != 0 for m in MEASURES[table]]))
+        expected = _expected(table)
+        diff = union_all(
+            select(literal("missing").label("problem"), expected.except_(stored).subquery()),
+            select(literal("extra").label("problem"), stored.except_(expected).subquery()),
+        ).subquery()
+        mismatches[table.__tablename__] = db.execute(select(func.count()).select_from(diff)).scalar()
+        for row in db.execute(select(diff).limit(sample)).mappings():
+            logger.warning(f"{table.__tablename__}: {dict(row)}")
+    return mismatches
+
+
+def run(verify_only: bool = False, repair: bool = False) -> int:
+    db = SessionLocal()
+    try:
+        lock(db)
+        if verify_only:
+            mismatches = verify(db)
+            logger.info(f"Rows that differ from the incidents: {mismatches}")
+            if not any(mismatches.values()) or not repair:
+                db.rollback()
+                return sum(mismatches.values())
+        counts = rebuild(db)
+        logger.info(f"Rebuilt rollups: {counts}")
+        mismatches = verify(db)
+        db.commit()
+    finally:
+        db.close()
+    logger.info(f"Rows that differ after the rebuild: {mismatches}")
+    return sum(mismatches.values())
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Rebuild or verify the incident rollup tables")
+    parser.add_argument("--verify", action="store_true", help="Only compare the stored rows with the incidents")
+    parser.add_argument("--repair", action="store_true", help="With --verify, rebuild when they differ")
+    args = parser.parse_args()
+    sys.exit(1 if run(verify_only=args.verify, repair=args.repair) else 0)
@@ -0,0 +1,451 @@
+"""Near-duplicate incident detection with MinHash signatures and an LSH index.
+
+Every incident's title and description are reduced to a set of word and
+word-bigram shingles and then to a MinHash signature of SIMILARITY_NUM_PERM
+values. The signature is split into SIMILARITY_BANDS bands; incidents that
+agree on every value of at least one band are candidates, so a lookup only
+touches the few rows in a handful of buckets instead of the whole table.
+Candidates are then ranked by the Jaccard similarity estimated from the
+signatures.
+
+The index lives in this process and is built at startup from the database. It is
+laid out for a million rows rather than a thousand:
+
+* per-row data lives in flat numpy arrays (ids, 8-bit signatures, flags), not
+  Python objects;
+* each band is a sorted key array plus the row order, so a bucket lookup is
+  a binary search;
+* rows added since the last build go to a small dict-based delta that is
+  merged into the arrays in the background.
+
+Incidents created here are added straight away. Changes made by other
+workers are picked up by a periodic catch-up on ``incidents.updated_at``.
+"""
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.models.models import Incident, IncidentStatus
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_NUM_PERM = int(os.getenv("SIMILARITY_NUM_PERM", "32"))
+SIMILARITY_BANDS = int(os.getenv("SIMILARITY_BANDS", "8"))
+# Estimated Jaccard similarity a candidate needs to be reported
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.5"))
+SIMILARITY_REFRESH_INTERVAL = float(os.getenv("SIMILARITY_REFRESH_INTERVAL", "30"))
+# Very common buckets (e.g. "password reset") are only sampled up to this many rows
+SIMILARITY_MAX_BUCKET = int(os.getenv("SIMILARITY_MAX_BUCKET", "500"))
+SIMILARITY_TEXT_CHARS = 2000
+
+MERSENNE_PRIME = (1 << 31) - 1
+FLAG_OPEN = 1
+FLAG_LINKED = 2
+FLAG_DELETED = 4
+OPEN_STATUSES = {IncidentStatus.OPEN, IncidentStatus.IN_PROGRESS}
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "the", "and", "for", "with", "from", "this", "that", "not", "are", "was", "has", "have",
+    "but", "our", "you", "your", "can", "cannot", "when", "after", "into", "been", "its", "all",
+}
+
+
+def incident_text(title: Optional[str], description: Optional[str]) -> str:
+    return f"{title or ''}\n{(description or '')[:SIMILARITY_TEXT_CHARS]}"
+
+
+def shingles(text: str) -> np.ndarray:
+    """32-bit hashes of the distinct word and word-bigram shingles of ``text``."""
+    tokens = [t for t in TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+    features = set(tokens)
+    features.update(f"{a} {b}" for a, b in zip(tokens, tokens[1:]))
+    return np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.uint64, count=len(features))
+
+
+def _flags(status, problem_id) -> int:
+    flags = FLAG_OPEN if status in OPEN_STATUSES else 0
+    return flags | (FLAG_LINKED if problem_id else 0)
+
+
+def _uuid(raw: bytes) -> uuid.UUID:
+    # numpy strips trailing NUL bytes from fixed-width byte strings
+    return uuid.UUID(bytes=raw.ljust(16, b"\0"))
+
+
+class SimilarityIndex:
+    def __init__(self, num_perm: int = SIMILARITY_NUM_PERM, bands: int = SIMILARITY_BANDS, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows_per_band = num_perm // bands
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)[:, None]
+        self._b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)[:, None]
+        self._band_mix = rng.integers(1, 1 << 32, self.rows_per_band, dtype=np.uint64) | np.uint64(1)
+
+        self.lock = threading.RLock()
+        self.ready = False
+        self.watermark: Optional[datetime] = None
+        # Merged rows, sorted by id
+        self._ids = np.empty(0, dtype="S16")
+        self._sig8 = np.empty((0, num_perm), dtype=np.uint8)
+        self._text_hash = np.empty(0, dtype=np.uint32)
+        self._flags = np.empty(0, dtype=np.uint8)
+        self._band_keys: List[np.ndarray] = [np.empty(0, dtype=np.uint32) for _ in range(bands)]
+        self._band_rows: List[np.ndarray] = [np.empty(0, dtype=np.int32) for _ in range(bands)]
+        # Rows added since the last merge; their row numbers continue after the merged ones
+        self._delta_ids: List[bytes] = []
+        self._delta_sig8: List[np.ndarray] = []
+        self._delta_keys: List[np.ndarray] = []
+        self._delta_text_hash: List[int] = []
+        self._delta_flags: List[int] = []
+        self._delta_rows: Dict[bytes, int] = {}
+        self._delta_buckets: Dict[Tuple[int, int], List[int]] = {}
+
+    # --- hashing ---
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """None for text without shingles (only stopwords or one-letter words): every such
+        text would get the same signature and look identical to all the others."""
+        features = shingles(text)
+        if not len(features):
+            return None
+        return ((self._a * features[None, :] + self._b) % MERSENNE_PRIME).min(axis=1)
+
+    def band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """(n, num_perm) signatures -> (n, bands) 32-bit bucket keys."""
+        grouped = signatures.reshape(len(signatures), self.bands, self.rows_per_band)
+        return ((grouped * self._band_mix).sum(axis=2) & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+
+    # --- size ---
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._delta_ids)
+
+    @property
+    def delta_size(self) -> int:
+        return len(self._delta_ids)
+
+    def nbytes(self) -> int:
+        arrays = [self._ids, self._sig8, self._text_hash, self._flags, *self._band_keys, *self._band_rows]
+        return sum(a.nbytes for a in arrays)
+
+    # --- building ---
+
+    def build(self, rows: Iterable[Tuple[uuid.UUID, str, object, object]], batch_size: int = 10000):
+        """Bulk load from (id, text, status, problem_id) rows, replacing the current contents."""
+        ids, sigs, keys, hashes, flags = [], [], [], [], []
+        batch = []
+
+        def flush():
+            # Incidents without shingles are left out of the index
+            signed = [(row, self.signature(row[1])) for row in batch]
+            batch[:] = [row for row, signature in signed if signature is not None]
+            if not batch:
+                return
+            signatures = np.stack([signature for _, signature in signed if signature is not None])
+            ids.append(np.array([i.bytes for i, _, _, _ in batch], dtype="S16"))
+            sigs.append((signatures & np.uint64(0xFF)).astype(np.uint8))
+            keys.append(self.band_keys(signatures))
+            hashes.append(np.fromiter((zlib.crc32(t.encode()) for _, t, _, _ in batch), dtype=np.uint32, count=len(batch)))
+            flags.append(np.fromiter((_flags(s, p) for _, _, s, p in batch), dtype=np.uint8, count=len(batch)))
+            batch.clear()
+
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+
+        if ids:
+            arrays = (np.concatenate(ids), np.concatenate(sigs), np.concatenate(keys),
+                      np.concatenate(hashes), np.concatenate(flags))
+        else:
+            arrays = (np.empty(0, dtype="S16"), np.empty((0, self.num_perm), dtype=np.uint8),
+                      np.empty((0, self.bands), dtype=np.uint32), np.empty(0, dtype=np.uint32),
+                      np.empty(0, dtype=np.uint8))
+        with self.lock:
+            self._load(*arrays)
+            self._clear_delta()
+            self.ready = True
+
+    def _load(self, ids, sig8, keys, text_hash, flags):
+        order = np.argsort(ids, kind="stable")
+        self._ids, self._sig8, self._text_hash, self._flags = ids[order], sig8[order], text_hash[order], flags[order]
+        keys = keys[order]
+        self._band_keys, self._band_rows = [], []
+        for band in range(self.bands):
+            rows = np.argsort(keys[:, band], kind="stable").astype(np.int32)
+            self._band_rows.append(rows)
+            self._band_keys.append(keys[rows, band])
+
+    def _clear_delta(self):
+        self._delta_ids, self._delta_sig8, self._delta_keys = [], [], []
+        self._delta_text_hash, self._delta_flags = [], []
+        self._delta_rows, self._delta_buckets = {}, {}
+
+    def _merged_keys(self) -> np.ndarray:
+        keys = np.empty((len(self._ids), self.bands), dtype=np.uint32)
+        for band in range(self.bands):
+            keys[self._band_rows[band], band] = self._band_keys[band]
+        return keys
+
+    def merge(self):
+        """Folds the delta into the sorted arrays and drops superseded rows."""
+        with self.lock:
+            if not self._delta_ids and not (self._flags & FLAG_DELETED).any():
+                return
+            ids = np.concatenate([self._ids, np.array(self._delta_ids, dtype="S16")])
+            sig8 = np.concatenate([self._sig8, np.array(self._delta_sig8, dtype=np.uint8).reshape(-1, self.num_perm)])
+            keys = np.concatenate([self._merged_keys(), np.array(self._delta_keys, dtype=np.uint32).reshape(-1, self.bands)])
+            text_hash = np.concatenate([self._text_hash, np.array(self._delta_text_hash, dtype=np.uint32)])
+            flags = np.concatenate([self._flags, np.array(self._delta_flags, dtype=np.uint8)])
+            live = (flags & FLAG_DELETED) == 0
+            self._load(ids[live], sig8[live], keys[live], text_hash[live], flags[live])
+            self._clear_delta()
+
+    # --- incremental updates ---
+
+    def _find_row(self, raw_id: bytes) -> Optional[int]:
+        row = self._delta_rows.get(raw_id)
+        if row is not None:
+            return row
+        pos = int(np.searchsorted(self._ids, raw_id))
+        if pos < len(self._ids) and self._ids[pos] == raw_id and not self._flags[pos] & FLAG_DELETED:
+            return pos
+        return None
+
+    def _get_flags(self, row: int) -> int:
+        return int(self._flags[row]) if row < len(self._ids) else self._delta_flags[row - len(self._ids)]
+
+    def _set_flags(self, row: int, flags: int):
+        if row < len(self._ids):
+            self._flags[row] = flags
+        else:
+            self._delta_flags[row - len(self._ids)] = flags
+
+    def _text_hash_of(self, row: int) -> int:
+        return int(self._text_hash[row]) if row < len(self._ids) else self._delta_text_hash[row - len(self._ids)]
+
+    def upsert(self, incident_id: uuid.UUID, text: str, status, problem_id):
+        raw_id = incident_id.bytes
+        text_hash = zlib.crc32(text.encode())
+        flags = _flags(status, problem_id)
+        with self.lock:
+            row = self._find_row(raw_id)
+            if row is not None and self._text_hash_of(row) == text_hash:
+                self._set_flags(row, flags)
+                return
+            if row is not None:
+                self._set_flags(row, self._get_flags(row) | FLAG_DELETED)
+            signature = self.signature(text)
+            if signature is None:
+                return
+            keys = self.band_keys(signature[None, :])[0]
+            row = len(self._ids) + len(self._delta_ids)
+            self._delta_ids.append(raw_id)
+            self._delta_sig8.append((signature & np.uint64(0xFF)).astype(np.uint8))
+            self._delta_keys.append(keys)
+            self._delta_text_hash.append(text_hash)
+            self._delta_flags.append(flags)
+            self._delta_rows[raw_id] = row
+            for band, key in enumerate(keys):
+                self._delta_buckets.setdefault((band, int(key)), []).append(row)
+
+    # --- queries ---
+
+    def _sig8_rows(self, rows: np.ndarray) -> np.ndarray:
+        n = len(self._ids)
+        main = rows < n
+        out = np.empty((len(rows), self.num_perm), dtype=np.uint8)
+        out[main] = self._sig8[rows[main]]
+        for i in np.nonzero(~main)[0]:
+            out[i] = self._delta_sig8[rows[i] - n]
+        return out
+
+    def _flags_rows(self, rows: np.ndarray) -> np.ndarray:
+        n = len(self._ids)
+        return np.array([self._get_flags(int(r)) for r in rows], dtype=np.uint8) if (rows >= n).any() \
+            else self._flags[rows]
+
+    def _ids_rows(self, rows: Iterable[int]) -> List[uuid.UUID]:
+        n = len(self._ids)
+        return [_uuid(self._ids[r]) if r < n else _uuid(self._delta_ids[r - n]) for r in rows]
+
+    @staticmethod
+    def estimate_jaccard(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        # 8-bit MinHash: two different minima still collide with probability 1/256
+        agree = (a == b).mean(axis=-1)
+        return np.clip((agree - 1 / 256) / (1 - 1 / 256), 0.0, 1.0)
+
+    def query(self, text: str, limit: int = 10, threshold: float = SIMILARITY_THRESHOLD,
+              exclude: Optional[uuid.UUID] = None, open_only: bool = True) -> List[Tuple[uuid.UUID, float]]:
+        signature = self.signature(text)
+        if signature is None:
+            return []
+        keys = self.band_keys(signature[None, :])[0]
+        sig8 = (signature & np.uint64(0xFF)).astype(np.uint8)
+        with self.lock:
+            parts = []
+            for band, key in enumerate(keys):
+                band_keys = self._band_keys[band]
+                lo = int(np.searchsorted(band_keys, key, side="left"))
+                hi = int(np.searchsorted(band_keys, key, side="right"))
+                parts.append(self._band_rows[band][lo:min(hi, lo + SIMILARITY_MAX_BUCKET)])
+                parts.append(np.array(self._delta_buckets.get((band, int(key)), [])[:SIMILARITY_MAX_BUCKET], dtype=np.int32))
+            rows = np.unique(np.concatenate(parts)) if parts else np.empty(0, dtype=np.int32)
+            if not len(rows):
+                return []
+            flags = self._flags_rows(rows)
+            wanted = (flags & FLAG_DELETED) == 0
+            if open_only:
+                wanted &= (flags & FLAG_OPEN) != 0
+            rows = rows[wanted]
+            scores = self.estimate_jaccard(self._sig8_rows(rows), sig8)
+            keep = scores >= threshold
+            rows, scores = rows[keep], scores[keep]
+            ranked = np.argsort(-scores, kind="stable")
+            ids = self._ids_rows(int(r) for r in rows[ranked])
+        results = [(i, float(s)) for i, s in zip(ids, scores[ranked]) if i != exclude]
+        return results[:limit]
+
+    def clusters(self, min_size: int = 3, threshold: float = SIMILARITY_THRESHOLD) -> List[List[uuid.UUID]]:
+        """Groups of open incidents not yet linked to a problem that look like the same issue.
+
+        Rows sharing a bucket are joined (union-find) when their estimated
+        similarity clears ``threshold``; returns the groups of at least ``min_size``,
+        largest first.
+        """
+        self.merge()
+        with self.lock:
+            eligible = (self._flags & (FLAG_OPEN | FLAG_LINKED | FLAG_DELETED)) == FLAG_OPEN
+            parent = np.arange(len(self._ids))
+
+            def find(x):
+                root = x
+                while parent[root] != root:
+                    root = parent[root]
+                while parent[x] != root:
+                    parent[x], x = root, parent[x]
+                return root
+
+            for band in range(self.bands):
+                rows = self._band_rows[band]
+                mask = eligible[rows]
+                rows, keys = rows[mask], self._band_keys[band][mask]
+                if len(rows) < 2:
+                    continue
+                # Pair every member of a bucket with the first one, within the bucket cap
+                starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+                group_start = np.repeat(starts, np.diff(np.r_[starts, len(keys)]))
+                position = np.arange(len(keys)) - group_start
+                pairs = (position > 0) & (position < SIMILARITY_MAX_BUCKET)
+                left, right = rows[group_start[pairs]], rows[pairs]
+                similar = self.estimate_jaccard(self._sig8[left], self._sig8[right]) >= threshold
+                for a, b in zip(left[similar].tolist(), right[similar].tolist()):
+                    ra, rb = find(a), find(b)
+                    if ra != rb:
+                        parent[rb] = ra
+
+            members = np.flatnonzero(eligible)
+            roots = np.array([find(int(r)) for r in members], dtype=np.int64)
+            groups: Dict[int, List[int]] = {}
+            for row, root in zip(members.tolist(), roots.tolist()):
+                groups.setdefault(root, []).append(row)
+            result = sorted((g for g in groups.values() if len(g) >= min_size), key=len, reverse=True)
+            return [self._ids_rows(g) for g in result]
+
+
+index = SimilarityIndex()
+
+
+def _incident_rows(db: Session, since: Optional[datetime] = None):
+    query = db.query(
+        Incident.id, Incident.title, func.left(Incident.description, SIMILARITY_TEXT_CHARS),
+        Incident.status, Incident.problem_id, Incident.updated_at,
+    )
+    if since is not None:
+        query = query.filter(Incident.updated_at > since)
+    return query.yield_per(10000)
+
+
+def build_from_db(db: Session) -> SimilarityIndex:
+    started = time.monotonic()
+    fresh = SimilarityIndex()
+    watermark = db.query(func.max(Incident.updated_at)).scalar()
+    fresh.build((i, incident_text(t, d), s, p) for i, t, d, s, p, _ in _incident_rows(db))
+    fresh.watermark = watermark
+    logger.info(f"Similarity index built: {len(fresh)} incidents, {fresh.nbytes() / 1e6:.1f} MB "
+                f"in {time.monotonic() - started:.1f}s")
+    return fresh
+
+
+def catch_up(db: Session, idx: SimilarityIndex):
+    """Applies incidents created or changed by any worker since the last pass."""
+    if idx.watermark is None:
+        since = datetime.min
+    else:
+        # updated_at comes from each worker's clock; re-reading a little overlap is harmless
+        since = idx.watermark - timedelta(seconds=5)
+    latest = idx.watermark
+    for incident_id, title, description, status, problem_id, updated_at in _incident_rows(db, since):
+        idx.upsert(incident_id, incident_text(title, description), status, problem_id)
+        if latest is None or updated_at > latest:
+            latest = updated_at
+    idx.watermark = latest
+    if idx.delta_size > max(5000, len(idx) // 20):
+        idx.merge()
+
+
+def index_incident(incident: Incident):
+    """Called by this worker after committing an incident so it is searchable immediately."""
+    if index.ready:
+        index.upsert(incident.id, incident_text(incident.title, incident.description), incident.status, incident.problem_id)
+
+
+def _build_once():
+    global index
+    db = SessionLocal()
+    try:
+        fresh = build_from_db(db)
+        # Anything indexed locally while building is re-read by the first catch-up
+        index = fresh
+    finally:
+        db.close()
+
+
+def _catch_up_once():
+    db = SessionLocal()
+    try:
+        catch_up(db, index)
+    finally:
+        db.close()
+
+
+async def run_similarity_loop():
+    try:
+        await run_in_threadpool(_build_once)
+    except Exception as e:
+        logger.error(f"Similarity index build failed: {e}")
+    while True:
+        await asyncio.sleep(SIMILARITY_REFRESH_INTERVAL)
+        try:
+            if index.ready:
+                await run_in_threadpool(_catch_up_once)
+            else:
+                await run_in_threadpool(_build_once)
+        except Exception as e:
+            logger.error(f"Similarity index refresh failed: {e}")
@@ -0,0 +1,295 @@
+"""Business-hours SLA deadlines.
+
+A BusinessCalendar lists working hours per weekday in its own time zone plus
+holidays. CalendarEngine turns that into the sorted UTC working intervals of
+a range of days, each with the working seconds elapsed before it. Adding N
+business minutes is then two binary searches: one for the working time
+already elapsed at the start instant, one for the interval in which the
+target total is reached. The same searches run over whole numpy arrays when
+deadlines are recomputed in bulk. A policy without a calendar counts
+wall-clock minutes.
+
+Deadlines are a pure function of (created_at, policy, business minutes spent
+paused), so ``recompute_deadlines`` can rewrite every open incident in one
+set-based UPDATE after a policy or calendar changes.
+"""
+import io
+import os
+import threading
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from uuid import UUID
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import numpy as np
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from app.models.models import BusinessCalendar, Incident, IncidentPriority, IncidentStatus, SLAPolicy
+from app.services import reference_cache, sla_monitor
+
+# Days either side of today covered when an engine is built; extended on demand
+SLA_CALENDAR_DAYS_BEFORE = int(os.getenv("SLA_CALENDAR_DAYS_BEFORE", "730"))
+SLA_CALENDAR_DAYS_AFTER = int(os.getenv("SLA_CALENDAR_DAYS_AFTER", "365"))
+SLA_RECOMPUTE_BATCH = int(os.getenv("SLA_RECOMPUTE_BATCH", "50000"))
+
+OPEN_STATUSES = (IncidentStatus.OPEN, IncidentStatus.IN_PROGRESS)
+
+EPOCH = datetime(1970, 1, 1)
+COPY_NULL = "\\N"
+
+
+class CalendarError(ValueError):
+    pass
+
+
+def to_seconds(moment: datetime) -> int:
+    """Naive UTC datetime -> whole seconds since the epoch."""
+    return int((moment - EPOCH).total_seconds())
+
+
+def from_seconds(seconds) -> datetime:
+    return EPOCH + timedelta(seconds=int(seconds))
+
+
+def parse_hours(timezone_name: str, working_hours: Iterable[dict]) -> Tuple[ZoneInfo, Dict[int, List[Tuple[time, time]]]]:
+    try:
+        tz = ZoneInfo(timezone_name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise CalendarError(f"Unknown time zone {timezone_name!r}")
+    by_weekday: Dict[int, List[Tuple[time, time]]] = {}
+    for entry in working_hours:
+        try:
+            weekday = int(entry["weekday"])
+            start, end = time.fromisoformat(entry["start"]), time.fromisoformat(entry["end"])
+        except (KeyError, TypeError, ValueError):
+            raise CalendarError(f"Invalid working hours entry {entry!r}")
+        if not 0 <= weekday <= 6 or end <= start:
+            raise CalendarError(f"Invalid working hours entry {entry!r}")
+        by_weekday.setdefault(weekday, []).append((start, end))
+    for weekday, spans in by_weekday.items():
+        spans.sort()
+        if any(a[1] > b[0] for a, b in zip(spans, spans[1:])):
+            raise CalendarError(f"Overlapping working hours on weekday {weekday}")
+    if not by_weekday:
+        raise CalendarError("A calendar needs at least one working period")
+    return tz, by_weekday
+
+
+class CalendarEngine:
+    def __init__(self, timezone_name: str, working_hours: Iterable[dict], holidays: Iterable[date] = ()):
+        self.tz, self.hours = parse_hours(timezone_name, working_hours)
+        self.holidays: Set[date] = set(holidays)
+        self.lock = threading.Lock()
+        today = datetime.utcnow().date()
+        self._build(today - timedelta(days=SLA_CALENDAR_DAYS_BEFORE), today + timedelta(days=SLA_CALENDAR_DAYS_AFTER))
+
+    @classmethod
+    def from_model(cls, calendar: BusinessCalendar) -> "CalendarEngine":
+        return cls(calendar.timezone, calendar.working_hours, [h.day for h in calendar.holidays])
+
+    def _build(self, first: date, last: date):
+        starts, ends = [], []
+        day = first
+        while day <= last:
+            if day not in self.holidays:
+                for start, end in self.hours.get(day.weekday(), ()):
+                    local_start = datetime.combine(day, start, tzinfo=self.tz)
+                    local_end = datetime.combine(day, end, tzinfo=self.tz)
+                    starts.append(to_seconds(local_start.astimezone(timezone.utc).replace(tzinfo=None)))
+                    ends.append(to_seconds(local_end.astimezone(timezone.utc).replace(tzinfo=None)))
+            day += timedelta(days=1)
+        starts, ends = np.array(starts, dtype=np.int64), np.array(ends, dtype=np.int64)
+        lengths = ends - starts
+        cum_end = np.cumsum(lengths)
+        self.first, self.last = first, last
+        # One attribute, so a reader never mixes arrays from two builds
+        self._table = (starts, lengths, cum_end - lengths, cum_end)
+
+    def _extend(self, earlier: bool):
+        with self.lock:
+            span = self.last - self.first
+            if earlier:
+                self._build(self.first - span, self.last)
+            else:
+                self._build(self.first, self.last + span)
+
+    def elapsed(self, instants: np.ndarray) -> np.ndarray:
+        """Working seconds between the start of the table and each instant (seconds since the epoch)."""
+        while instants.min() < self._table[0][0]:
+            self._extend(earlier=True)
+        starts, lengths, cum, _ = self._table
+        i = np.searchsorted(starts, instants, side="right") - 1
+        return cum[i] + np.clip(instants - starts[i], 0, lengths[i])
+
+    def add_seconds(self, instants: np.ndarray, seconds: np.ndarray) -> np.ndarray:
+        """The instant at which ``seconds`` of working time have passed since each of ``instants``."""
+        if not len(instants):
+            return instants
+        target = self.elapsed(instants) + seconds
+        while target.max() > self._table[3][-1]:
+            self._extend(earlier=False)
+            target = self.elapsed(instants) + seconds
+        starts, _, cum, cum_end = self._table
+        # First interval whose running total reaches the target; ending exactly at
+        # a closing time gives that closing time, not the next opening
+        j = np.searchsorted(cum_end, target, side="left")
+        return np.maximum(starts[j] + (target - cum[j]), instants)
+
+    def add_minutes(self, moment: datetime, minutes: int) -> datetime:
+        result = self.add_seconds(np.array([to_seconds(moment)]), np.array([minutes * 60]))
+        return from_seconds(result[0])
+
+    def minutes_between(self, start: datetime, end: datetime) -> int:
+        elapsed = self.elapsed(np.array([to_seconds(start), to_seconds(end)]))
+        return int(max(elapsed[1] - elapsed[0], 0) // 60)
+
+
+# --- Reference data ---
+
+Policy = Tuple[int, Optional[UUID]]  # (resolution minutes, calendar id)
+
+
+def _load_policies(db: Session) -> Dict[IncidentPriority, Policy]:
+    rows = db.query(SLAPolicy.priority, SLAPolicy.resolution_time_minutes, SLAPolicy.calendar_id).all()
+    return {priority: (minutes, calendar_id) for priority, minutes, calendar_id in rows}
+
+
+def _load_calendars(db: Session) -> Dict[UUID, CalendarEngine]:
+    return {calendar.id: CalendarEngine.from_model(calendar) for calendar in db.query(BusinessCalendar).all()}
+
+
+def policies(db: Session) -> Dict[IncidentPriority, Policy]:
+    return reference_cache.cache.get(db, reference_cache.SLA_POLICIES, _load_policies)
+
+
+def calendar_for(db: Session, calendar_id: Optional[UUID]) -> Optional[CalendarEngine]:
+    if calendar_id is None:
+        return None
+    return reference_cache.cache.get(db, reference_cache.SLA_CALENDARS, _load_calendars).get(calendar_id)
+
+
+def deadline_for(db: Session, created_at: datetime, priority, paused_minutes: int = 0) -> Optional[datetime]:
+    policy = policies(db).get(priority)
+    if policy is None:
+        return None
+    minutes, calendar_id = policy
+    calendar = calendar_for(db, calendar_id)
+    if calendar is None:
+        # Whole seconds, like the bulk path, so recomputation leaves it untouched
+        return from_seconds(to_seconds(created_at) + (minutes + paused_minutes) * 60)
+    return calendar.add_minutes(created_at, minutes + paused_minutes)
+
+
+def pause(incident: Incident, now: Optional[datetime] = None):
+    incident.sla_paused_at = now or datetime.utcnow()
+    incident.sla_breach_at = None
+
+
+def resume(db: Session, incident: Incident, now: Optional[datetime] = None):
+    """Adds the time spent paused, counted on the policy's calendar, and restarts the clock."""
+    now = now or datetime.utcnow()
+    policy = policies(db).get(incident.priority)
+    calendar = calendar_for(db, policy[1]) if policy else None
+    if calendar is None:
+        paused = int((now - incident.sla_paused_at).total_seconds() // 60)
+    else:
+        paused = calendar.minutes_between(incident.sla_paused_at, now)
+    incident.sla_paused_minutes = (incident.sla_paused_minutes or 0) + paused
+    incident.sla_paused_at = None
+    incident.sla_breach_at = deadline_for(db, incident.created_at, incident.priority, incident.sla_paused_minutes)
+    if incident.sla_breach_at and incident.sla_breach_at > now:
+        incident.sla_breached_at = None
+
+
+# --- Bulk recomputation ---
+
+def compute_deadlines(created: np.ndarray, priorities: np.ndarray, paused_minutes: np.ndarray,
+                      policy_map: Dict[IncidentPriority, Policy],
+                      calendars: Dict[UUID, CalendarEngine]) -> np.ndarray:
+    """Deadlines (seconds since the epoch, -1 where no policy applies) for arrays of incidents."""
+    deadlines = np.full(len(created), -1, dtype=np.int64)
+    for priority, (minutes, calendar_id) in policy_map.items():
+        rows = np.flatnonzero(priorities == priority.value)
+        if not len(rows):
+            continue
+        seconds = (paused_minutes[rows] + minutes) * 60
+        calendar = calendars.get(calendar_id) if calendar_id else None
+        if calendar is None:
+            deadlines[rows] = created[rows] + seconds
+        else:
+            deadlines[rows] = calendar.add_seconds(created[rows], seconds)
+    return deadlines
+
+
+def _copy_rows(ids: List[str], priorities: np.ndarray, paused_minutes: np.ndarray,
+               deadlines: np.ndarray) -> io.StringIO:
+    stamps = np.where(deadlines >= 0, deadlines, 0).astype("datetime64[s]").astype(str)
+    stamps[deadlines < 0] = COPY_NULL
+    buffer = io.StringIO()
+    rows = zip(ids, priorities.tolist(), paused_minutes.astype(str).tolist(), stamps.tolist())
+    buffer.write("\n".join(map("\t".join, rows)))
+    buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+def recompute_deadlines(db: Session, priorities: Optional[Iterable[IncidentPriority]] = None,
+                        now: Optional[datetime] = None) -> int:
+    """Rewrites ``sla_breach_at`` of every open, running incident (of ``priorities``); commits.
+
+    Deadlines are computed in batches with numpy, streamed into a temporary
+    table with COPY and applied by a single UPDATE. The UPDATE re-checks the
+    priority, status and paused minutes the deadline was computed for, so
+    incidents changed in the meantime keep the deadline their own request gave
+    them. Returns the number of incidents whose deadline moved.
+    """
+    now = now or datetime.utcnow()
+    policy_map = _load_policies(db)
+    calendars = _load_calendars(db)
+    if priorities is not None:
+        wanted = set(priorities)
+        policy_map = {p: policy for p, policy in policy_map.items() if p in wanted}
+
+    query = select(Incident.id, Incident.created_at, Incident.priority, Incident.sla_paused_minutes).where(
+        Incident.status.in_(OPEN_STATUSES), Incident.sla_paused_at.is_(None),
+    )
+    if priorities is not None:
+        query = query.where(Incident.priority.in_(list(wanted)))
+
+    # Dropped on commit; a second call in the same transaction reuses the table
+    db.execute(text(
+        "CREATE TEMP TABLE IF NOT EXISTS sla_deadlines "
+        "(id uuid, priority text, paused_minutes integer, deadline timestamp) ON COMMIT DROP"
+    ))
+    db.execute(text("TRUNCATE sla_deadlines"))
+    cursor = db.connection().connection.cursor()
+    try:
+        for batch in db.execute(query.execution_options(yield_per=SLA_RECOMPUTE_BATCH)).partitions():
+            ids = [str(row[0]) for row in batch]
+            created = np.array([to_seconds(row[1]) for row in batch], dtype=np.int64)
+            batch_priorities = np.array([row[2].value for row in batch])
+            paused = np.array([row[3] or 0 for row in batch], dtype=np.int64)
+            deadlines = compute_deadlines(created, batch_priorities, paused, policy_map, calendars)
+            cursor.copy_expert("COPY sla_deadlines (id, priority, paused_minutes, deadline) FROM STDIN",
+                               _copy_rows(ids, batch_priorities, paused, deadlines))
+    finally:
+        cursor.close()
+
+    moved = db.execute(text(
+        """
+        UPDATE incidents AS i
+        SET sla_breach_at = d.deadline,
+            sla_breached_at = CASE WHEN d.deadline > :now THEN NULL ELSE i.sla_breached_at END,
+            updated_at = :now
+        FROM sla_deadlines AS d
+        WHERE i.id = d.id
+          AND i.priority::text = d.priority
+          AND i.status IN ('OPEN', 'IN_PROGRESS')
+          AND i.sla_paused_at IS NULL
+          AND COALESCE(i.sla_paused_minutes, 0) = d.paused_minutes
+          AND i.sla_breach_at IS DISTINCT FROM d.deadline
+        """
+    ), {"now": now}).rowcount
+    if moved:
+        sla_monitor.deadlines_changed(db)
+    db.commit()
+    return moved
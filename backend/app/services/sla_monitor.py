@@ -0,0 +1,258 @@
+"""Acts on ``incidents.sla_breach_at``: records and announces every SLA breach.
+
+One worker at a time is the monitor, chosen by a lease in the database. The
+leader keeps the deadlines of open incidents in a min-heap and sleeps until
+the earliest one, instead of polling the table. Changes that move a deadline
+(creation, priority or status changes) are sent as ``sla_changes``
+notifications from the request's transaction, so the leader re-reads just
+those incidents whichever worker handled the request. A full reload runs on
+promotion, after the listener reconnects, and every SLA_RELOAD_INTERVAL as a
+safety net.
+
+A breach is recorded by a conditional UPDATE of ``sla_breached_at`` together
+with an SLA_BREACH audit entry. The UPDATE only matches incidents that are
+still open and past their current deadline, so a stale heap entry or two
+leaders during a lease hand-over never record a breach twice. The same
+transaction publishes ``sla_events``, and every worker relays those to its
+own websocket clients.
+"""
+import asyncio
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Set, Tuple
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.core.pg_listen import listener, notify
+from app.core.websockets import manager
+from app.models.models import AuditLog, Incident, IncidentStatus
+from app.services import leases
+
+logger = logging.getLogger(__name__)
+
+SLA_LEASE_NAME = "sla-monitor"
+SLA_LEASE_TTL = timedelta(seconds=float(os.getenv("SLA_LEASE_TTL", "30")))
+SLA_RELOAD_INTERVAL = float(os.getenv("SLA_RELOAD_INTERVAL", "900"))
+SLA_BREACH_BATCH = int(os.getenv("SLA_BREACH_BATCH", "500"))
+
+CHANGES_CHANNEL = "sla_changes"
+EVENTS_CHANNEL = "sla_events"
+# sla_changes payload sent after a bulk recomputation instead of every id
+RELOAD_ALL = "*"
+# pg_notify payloads are limited to 8000 bytes
+EVENTS_PER_NOTIFY = 40
+
+OPEN_STATUSES = (IncidentStatus.OPEN, IncidentStatus.IN_PROGRESS)
+
+# (deadline, incident id)
+Entry = Tuple[datetime, str]
+
+
+def pending():
+    """Incidents still being watched; matches the ix_incidents_sla_pending partial index."""
+    return (
+        Incident.status.in_(OPEN_STATUSES),
+        Incident.sla_breach_at.isnot(None),
+        Incident.sla_breached_at.is_(None),
+    )
+
+
+def incident_changed(db: Session, incident_id):
+    """Tells the monitor to re-read this incident once the caller's transaction commits."""
+    notify(db, CHANGES_CHANNEL, str(incident_id))
+
+
+def deadlines_changed(db: Session):
+    """Tells the monitor to reload every deadline once the caller's transaction commits."""
+    notify(db, CHANGES_CHANNEL, RELOAD_ALL)
+
+
+class SlaMonitor:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.active = False
+        self.loaded = False
+        self._heap: List[Entry] = []
+        self._changed: Set[str] = set()
+        self.wake: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def mark_changed(self, incident_id: str):
+        if not self.active:
+            return
+        if incident_id == RELOAD_ALL:
+            self.loaded = False
+        else:
+            with self.lock:
+                self._changed.add(incident_id)
+        if self.wake is not None:
+            self.wake.set()
+
+    def has_changes(self) -> bool:
+        return bool(self._changed)
+
+    def clear(self):
+        with self.lock:
+            self._heap = []
+            self._changed = set()
+            self.loaded = False
+
+    def load(self, db: Session):
+        self.load_rows(db.query(Incident.sla_breach_at, Incident.id).filter(*pending()).yield_per(50000))
+
+    def load_rows(self, rows: Iterable[Tuple[datetime, object]]):
+        # Changes arriving during the scan are kept and re-read afterwards
+        with self.lock:
+            self._changed = set()
+        heap = [(deadline, str(incident_id)) for deadline, incident_id in rows]
+        heapq.heapify(heap)
+        with self.lock:
+            self._heap = heap
+            self.loaded = True
+
+    def apply_changes(self, db: Session):
+        with self.lock:
+            changed, self._changed = self._changed, set()
+        if not changed:
+            return
+        self.push(db.query(Incident.sla_breach_at, Incident.id).filter(Incident.id.in_(changed), *pending()).all())
+
+    def push(self, rows: Iterable[Tuple[datetime, object]]):
+        with self.lock:
+            # Old entries for these incidents stay in the heap and are skipped when they fire
+            for deadline, incident_id in rows:
+                heapq.heappush(self._heap, (deadline, str(incident_id)))
+
+    def pop_due(self, now: datetime, limit: int = SLA_BREACH_BATCH) -> List[Entry]:
+        due = []
+        with self.lock:
+            while self._heap and self._heap[0][0] <= now and len(due) < limit:
+                due.append(heapq.heappop(self._heap))
+        return due
+
+    def next_deadline(self) -> Optional[datetime]:
+        with self.lock:
+            return self._heap[0][0] if self._heap else None
+
+
+monitor = SlaMonitor()
+
+
+def record_breaches(db: Session, entries: List[Entry], now: Optional[datetime] = None) -> List[dict]:
+    """Records the breaches among ``entries`` that are still real; commits."""
+    now = now or datetime.utcnow()
+    rows = db.execute(
+        update(Incident).where(
+            Incident.id.in_({incident_id for _, incident_id in entries}),
+            Incident.sla_breach_at <= now,
+            *pending(),
+        ).values(sla_breached_at=now, updated_at=now).returning(Incident.id, Incident.incident_key, Incident.sla_breach_at)
+        .execution_options(synchronize_session=False)
+    ).all()
+    events = []
+    for incident_id, incident_key, deadline in rows:
+        db.add(AuditLog(incident_id=incident_id, actor_id=None, action="SLA_BREACH", new_value=deadline.isoformat()))
+        events.append({
+            "type": "INCIDENT_SLA_BREACHED",
+            "id": str(incident_id),
+            "incident_key": incident_key,
+            "sla_breach_at": deadline.isoformat(),
+        })
+    for start in range(0, len(events), EVENTS_PER_NOTIFY):
+        notify(db, EVENTS_CHANNEL, json.dumps(events[start:start + EVENTS_PER_NOTIFY]))
+    db.commit()
+    return events
+
+
+_relays: Set[asyncio.Future] = set()
+
+
+def _relay_events(payload: str):
+    """Runs on every worker: pushes breaches recorded by the leader to local websockets."""
+    events = json.loads(payload)
+
+    async def send():
+        for event in events:
+            await manager.broadcast(event)
+
+    task = asyncio.ensure_future(send())
+    _relays.add(task)
+    task.add_done_callback(_relays.discard)
+
+
+def _with_session(fn, *args):
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+listener.subscribe(CHANGES_CHANNEL, monitor.mark_changed)
+listener.subscribe(EVENTS_CHANNEL, _relay_events)
+# Notifications sent while the listener was down are lost; start over from the table
+listener.on_reconnect(lambda: setattr(monitor, "loaded", False))
+
+
+async def run_sla_monitor():
+    monitor.wake = asyncio.Event()
+    renew_every = SLA_LEASE_TTL.total_seconds() / 3
+    leader = False
+    lease_checked = float("-inf")
+    loaded_at = 0.0
+    try:
+        while True:
+            try:
+                if time.monotonic() - lease_checked >= renew_every:
+                    was_leader = leader
+                    leader = await run_in_threadpool(_with_session, leases.acquire, SLA_LEASE_NAME, SLA_LEASE_TTL)
+                    lease_checked = time.monotonic()
+                    monitor.active = leader
+                    if leader != was_leader:
+                        logger.info(f"SLA monitor {'started' if leader else 'stopped'} on {leases.WORKER_ID}")
+                        monitor.clear()
+                if leader:
+                    if not monitor.loaded or time.monotonic() - loaded_at >= SLA_RELOAD_INTERVAL:
+                        await run_in_threadpool(_with_session, monitor.load)
+                        loaded_at = time.monotonic()
+                        logger.info(f"SLA monitor watching {len(monitor)} deadlines")
+                    monitor.wake.clear()
+                    if monitor.has_changes():
+                        await run_in_threadpool(_with_session, monitor.apply_changes)
+                    while True:
+                        due = monitor.pop_due(datetime.utcnow())
+                        if not due:
+                            break
+                        events = await run_in_threadpool(_with_session, record_breaches, due)
+                        if events:
+                            logger.info(f"Recorded {len(events)} SLA breaches")
+            except Exception as e:
+                logger.error(f"SLA monitor failed: {e}")
+                monitor.clear()
+                await asyncio.sleep(5)
+                continue
+
+            timeout = renew_every - (time.monotonic() - lease_checked)
+            next_deadline = monitor.next_deadline() if leader else None
+            if next_deadline is not None:
+                timeout = min(timeout, (next_deadline - datetime.utcnow()).total_seconds())
+            try:
+                await asyncio.wait_for(monitor.wake.wait(), timeout=max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        monitor.active = False
+        if leader:
+            # Lets another worker take over now rather than after the lease expires
+            try:
+                await run_in_threadpool(_with_session, leases.release, SLA_LEASE_NAME)
+            except Exception as e:
+                logger.warning(f"Could not release the SLA monitor lease: {e}")
@@ -0,0 +1,184 @@
+"""SLA compliance over a period, computed in the database.
+
+The population is the incidents created in [start, end) that have an SLA
+deadline (paused and cancelled incidents are left out). Each one gets an
+outcome:
+
+- met: resolved or closed no later than ``sla_breach_at``
+- breached: resolved late, or still open past the deadline
+- at_risk: still open with the deadline inside the at-risk window
+- on_track: every other open incident
+
+Outcomes are counted per group (priority, department, category or assignee)
+in one grouped query. Window functions over the grouped rows then add each
+group's share of all breaches and its rank by breach rate. A second query
+buckets the same population by creation time, with a rolling compliance
+rate over the last ROLLING_BUCKETS buckets. Both queries only read columns
+stored in the ix_incidents_sla_report indexes, so Postgres can answer them
+with index-only scans of the period. Each statement runs under
+SLA_REPORT_TIMEOUT_MS; a report that cannot finish in that budget fails
+instead of piling up behind other requests.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import String, and_, case, cast, func, or_, select, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+from app.models.models import Category, Department, Incident, IncidentStatus, User
+
+SLA_REPORT_TIMEOUT_MS = int(os.getenv("SLA_REPORT_TIMEOUT_MS", "2000"))
+
+GROUPS = ("priority", "department", "category", "assignee")
+BUCKETS = ("day", "week", "month")
+ROLLING_BUCKETS = 7
+
+MET = "met"
+BREACHED = "breached"
+AT_RISK = "at_risk"
+ON_TRACK = "on_track"
+OUTCOMES = (MET, BREACHED, AT_RISK, ON_TRACK)
+
+DONE_STATUSES = (IncidentStatus.RESOLVED, IncidentStatus.CLOSED)
+
+# Postgres "query_canceled", raised when statement_timeout fires
+QUERY_CANCELED = "57014"
+
+
+class ReportTimeout(Exception):
+    pass
+
+
+def _outcome(now: datetime, at_risk: timedelta):
+    done = Incident.status.in_(DONE_STATUSES)
+    return case(
+        (and_(done, Incident.resolved_at <= Incident.sla_breach_at), MET),
+        (or_(done, Incident.sla_breach_at < now), BREACHED),
+        (Incident.sla_breach_at <= now + at_risk, AT_RISK),
+        else_=ON_TRACK,
+    )
+
+
+def _population(start: datetime, end: datetime, scoped: bool, department_id=None):
+    conditions = [
+        Incident.created_at >= start,
+        Incident.created_at < end,
+        Incident.sla_breach_at.isnot(None),
+        Incident.status != IncidentStatus.CANCELLED,
+    ]
+    if scoped:
+        conditions.append(Incident.department_id == department_id)
+    return conditions
+
+
+def _counts(outcome_column):
+    total = func.count()
+    return [total.label("total")] + [func.count().filter(outcome_column == o).label(o) for o in OUTCOMES]
+
+
+def _pct(part, whole):
+    return func.round(part * 100.0 / func.nullif(whole, 0), 2)
+
+
+def _group_key(group_by: str):
+    return {
+        "priority": Incident.priority,
+        "department": Incident.department_id,
+        "category": Incident.category_id,
+        "assignee": Incident.assignee_id,
+    }[group_by]
+
+
+def _with_labels(grouped, group_by: str):
+    """Joins names onto the (few) grouped rows rather than onto every incident."""
+    if group_by == "priority":
+        return select(grouped, cast(grouped.c.key, String).label("label")).select_from(grouped)
+    table, name = {
+        "department": (Department, Department.name),
+        "category": (Category, Category.name),
+        "assignee": (User, func.coalesce(User.full_name, User.email)),
+    }[group_by]
+    return select(grouped, func.coalesce(name, "Unassigned").label("label")) \
+        .select_from(grouped).outerjoin(table, table.id == grouped.c.key)
+
+
+def compute_report(db: Session, start: datetime, end: datetime, group_by: str = "priority",
+                   bucket: str = "week", at_risk: timedelta = timedelta(hours=4),
+                   scoped: bool = False, department_id=None, now: Optional[datetime] = None) -> dict:
+    """Incidents of every department, or with ``scoped`` only those of ``department_id``."""
+    now = now or datetime.utcnow()
+    outcome = _outcome(now, at_risk)
+    population = _population(start, end, scoped, department_id)
+
+    # Per group: counts, percentages, share of all breaches and rank by breach rate
+    rows = select(_group_key(group_by).label("key"), outcome.label("outcome")).where(*population).subquery()
+    grouped = select(rows.c.key, *_counts(rows.c.outcome)).group_by(rows.c.key).subquery()
+    labelled = _with_labels(grouped, group_by).subquery()
+    decided = labelled.c.met + labelled.c.breached
+    group_query = select(
+        labelled,
+        _pct(labelled.c.met, labelled.c.total).label("met_pct"),
+        _pct(labelled.c.breached, labelled.c.total).label("breached_pct"),
+        _pct(labelled.c.at_risk, labelled.c.total).label("at_risk_pct"),
+        _pct(labelled.c.met, decided).label("compliance_pct"),
+        _pct(labelled.c.breached, func.sum(labelled.c.breached).over()).label("share_of_breaches_pct"),
+        func.dense_rank().over(
+            order_by=(labelled.c.breached * 1.0 / func.nullif(labelled.c.total, 0)).desc()
+        ).label("breach_rank"),
+    ).order_by(text("breach_rank"), labelled.c.label)
+
+    # Per creation bucket, with a rolling compliance rate
+    period = func.date_trunc(bucket, Incident.created_at)
+    rows = select(period.label("period_start"), outcome.label("outcome")).where(*population).subquery()
+    series = select(rows.c.period_start, *_counts(rows.c.outcome)).group_by(rows.c.period_start).subquery()
+    window = {"order_by": series.c.period_start, "rows": (-(ROLLING_BUCKETS - 1), 0)}
+    series_query = select(
+        series,
+        _pct(series.c.met, series.c.met + series.c.breached).label("compliance_pct"),
+        _pct(func.sum(series.c.met).over(**window),
+             func.sum(series.c.met + series.c.breached).over(**window)).label("rolling_compliance_pct"),
+    ).order_by(series.c.period_start)
+
+    try:
+        # A savepoint, so a cancelled statement leaves the caller's transaction usable
+        with db.begin_nested():
+            db.execute(text(f"SET LOCAL statement_timeout = {int(SLA_REPORT_TIMEOUT_MS)}"))
+            groups = db.execute(group_query).mappings().all()
+            periods = db.execute(series_query).mappings().all()
+            db.execute(text("SET LOCAL statement_timeout TO DEFAULT"))
+    except OperationalError as e:
+        if getattr(e.orig, "pgcode", None) == QUERY_CANCELED:
+            raise ReportTimeout(f"The report did not finish within {SLA_REPORT_TIMEOUT_MS}ms")
+        raise
+
+    totals = {key: sum(g[key] for g in groups) for key in ("total",) + OUTCOMES}
+    decided_total = totals[MET] + totals[BREACHED]
+    return {
+        "start": start,
+        "end": end,
+        "group_by": group_by,
+        "bucket": bucket,
+        "at_risk_hours": at_risk.total_seconds() / 3600,
+        "summary": {
+            **totals,
+            "compliance_pct": round(totals[MET] * 100.0 / decided_total, 2) if decided_total else None,
+        },
+        "groups": [
+            {
+                "key": str(getattr(g["key"], "value", g["key"])) if g["key"] is not None else None,
+                **{k: g[k] for k in ("label", "total") + OUTCOMES},
+                **{k: float(g[k]) if g[k] is not None else None
+                   for k in ("met_pct", "breached_pct", "at_risk_pct", "compliance_pct", "share_of_breaches_pct")},
+                "breach_rank": g["breach_rank"],
+            }
+            for g in groups
+        ],
+        "periods": [
+            {
+                **{k: p[k] for k in ("period_start", "total") + OUTCOMES},
+                **{k: float(p[k]) if p[k] is not None else None for k in ("compliance_pct", "rolling_compliance_pct")},
+            }
+            for p in periods
+        ],
+        "computed_at": now,
+    }
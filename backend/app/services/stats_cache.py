@@ -0,0 +1,178 @@
+"""Per-worker cache of the dashboard stats, with stale-while-revalidate.
+
+Every manager's dashboard polls /incidents/stats, and all managers of a
+department get the same figures, as do all admins. Results are cached per
+(scope, department) key:
+
+- for STATS_CACHE_TTL_SECONDS after a computation they are served as is;
+- for STATS_CACHE_STALE_SECONDS after that they are still served, while a
+  background task recomputes them;
+- past that, or when never computed, the request computes them.
+
+Within a worker only one computation per key runs at a time: concurrent
+requests that need it wait for its result instead of starting their own.
+Incident writes call ``changed`` inside their transaction. On commit, the
+entries of the departments they touched and the all-departments entry turn
+stale in every worker, through a ``stats_changes`` notification. The next
+request still gets the old figures, and the background refresh it schedules
+picks up the write.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.core.metrics import STATS_CACHE, STATS_CACHE_COMPUTE_SECONDS, STATS_CACHE_INVALIDATIONS
+from app.core.pg_listen import listener, notify
+from app.models.models import UserRole
+
+logger = logging.getLogger(__name__)
+
+STATS_CACHE_TTL_SECONDS = float(os.getenv("STATS_CACHE_TTL_SECONDS", "10"))
+STATS_CACHE_STALE_SECONDS = float(os.getenv("STATS_CACHE_STALE_SECONDS", "60"))
+# A request waiting on another's computation gives up and computes itself after this long
+STATS_CACHE_WAIT_SECONDS = float(os.getenv("STATS_CACHE_WAIT_SECONDS", "30"))
+
+CHANGES_CHANNEL = "stats_changes"
+
+ALL = "all"
+DEPARTMENT = "department"
+
+# (scope, department_id); department_id is None for ALL
+Key = Tuple[str, object]
+Compute = Callable[[Session], dict]
+
+
+def key_for(role: UserRole, department_id) -> Key:
+    return (DEPARTMENT, department_id) if role == UserRole.MANAGER else (ALL, None)
+
+
+class Entry(NamedTuple):
+    value: dict
+    fresh_until: float
+    stale_until: float
+
+
+class StatsCache:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._entries: Dict[Key, Entry] = {}
+        # key -> computation in progress, shared by the requests waiting on it
+        self._inflight: Dict[Key, Future] = {}
+        # Bumped on every invalidation, so a computation that raced one is stored as stale
+        self._generations: Dict[Key, int] = {}
+
+    def invalidate(self, department_ids: Iterable, source: str = "local"):
+        keys = [(ALL, None)] + [(DEPARTMENT, d) for d in set(department_ids)]
+        with self.lock:
+            for key in keys:
+                self._generations[key] = self._generations.get(key, 0) + 1
+                entry = self._entries.get(key)
+                if entry is not None and entry.fresh_until > 0:
+                    self._entries[key] = entry._replace(fresh_until=0)
+                    STATS_CACHE_INVALIDATIONS.labels(source).inc()
+
+    def invalidate_all(self, source: str):
+        with self.lock:
+            departments = [d for scope, d in self._entries if scope == DEPARTMENT]
+        self.invalidate(departments, source=source)
+
+    def clear(self):
+        with self.lock:
+            self._entries.clear()
+            self._generations.clear()
+
+    def _claim(self, key: Key) -> Tuple[Future, int]:
+        """Called with the lock held: registers a computation of ``key``."""
+        future = Future()
+        self._inflight[key] = future
+        return future, self._generations.get(key, 0)
+
+    def _compute(self, db: Session, key: Key, compute: Compute, future: Future, generation: int) -> dict:
+        started = time.perf_counter()
+        try:
+            value = compute(db)
+        except BaseException as e:
+            with self.lock:
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        STATS_CACHE_COMPUTE_SECONDS.labels(key[0]).observe(time.perf_counter() - started)
+        now = time.monotonic()
+        with self.lock:
+            raced = self._generations.get(key, 0) != generation
+            self._entries[key] = Entry(value, 0 if raced else now + STATS_CACHE_TTL_SECONDS,
+                                       now + STATS_CACHE_TTL_SECONDS + STATS_CACHE_STALE_SECONDS)
+            self._inflight.pop(key, None)
+        future.set_result(value)
+        return value
+
+    def refresh(self, key: Key, compute: Compute):
+        """Recomputes ``key`` in its own session, unless a computation is already running."""
+        with self.lock:
+            if key in self._inflight:
+                return
+            future, generation = self._claim(key)
+        db = SessionLocal()
+        try:
+            self._compute(db, key, compute, future, generation)
+        except Exception as e:
+            logger.error(f"Refreshing the dashboard stats for {key} failed: {e}")
+        finally:
+            db.close()
+
+    def get(self, db: Session, key: Key, compute: Compute,
+            schedule: Optional[Callable[..., None]] = None) -> dict:
+        """The stats for ``key``; ``schedule(fn, *args)`` runs the refresh of a stale entry later."""
+        scope = key[0]
+        now = time.monotonic()
+        with self.lock:
+            entry = self._entries.get(key)
+            if entry is not None and now < entry.fresh_until:
+                STATS_CACHE.labels(scope, "hit").inc()
+                return entry.value
+            if entry is not None and now < entry.stale_until:
+                STATS_CACHE.labels(scope, "stale").inc()
+                if schedule is not None and key not in self._inflight:
+                    schedule(self.refresh, key, compute)
+                return entry.value
+            future = self._inflight.get(key)
+            if future is None:
+                future, generation = self._claim(key)
+                leader = True
+            else:
+                leader = False
+
+        if leader:
+            STATS_CACHE.labels(scope, "miss").inc()
+            return self._compute(db, key, compute, future, generation)
+        STATS_CACHE.labels(scope, "wait").inc()
+        try:
+            return future.result(timeout=STATS_CACHE_WAIT_SECONDS)
+        except TimeoutError:
+            logger.warning(f"Dashboard stats for {key} still computing after {STATS_CACHE_WAIT_SECONDS}s")
+            return compute(db)
+
+
+cache = StatsCache()
+
+
+def changed(db: Session, *department_ids):
+    """Marks the stats of ``department_ids`` (and of all departments) as changed by the caller's transaction."""
+    departments = set(department_ids)
+    for department_id in departments:
+        notify(db, CHANGES_CHANNEL, str(department_id) if department_id is not None else "")
+    event.listen(db, "after_commit", lambda session: cache.invalidate(departments), once=True)
+
+
+def _on_notify(payload: str):
+    cache.invalidate([uuid.UUID(payload)] if payload else [None], source="notify")
+
+
+listener.subscribe(CHANGES_CHANNEL, _on_notify)
+listener.on_reconnect(lambda: cache.invalidate_all(source="reset"))
@@ -0,0 +1,206 @@
+"""Attachment blob storage backends.
+
+Blobs are addressed by SHA-256 and laid out under hash-prefix shards
+(``ab/cd/abcd...``) so no directory or key prefix grows unbounded. The backend
+is picked with ATTACHMENT_STORAGE_BACKEND (``local`` or ``s3``).
+"""
+import os
+import shutil
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Optional
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ATTACHMENT_STORAGE_BACKEND = os.getenv("ATTACHMENT_STORAGE_BACKEND", "local")
+# Absolute so it does not depend on the working directory the server was started from
+ATTACHMENT_STORAGE_ROOT = os.path.abspath(os.getenv("ATTACHMENT_STORAGE_ROOT", os.path.join(BACKEND_DIR, "uploads")))
+ATTACHMENT_STAGING_DIR = os.getenv("ATTACHMENT_STAGING_DIR")
+
+S3_BUCKET = os.getenv("S3_BUCKET", "attachments")
+# e.g. http://minio:9000; empty means AWS itself, as when docker-compose passes it through unset
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL") or None
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_PRESIGN_EXPIRES = int(os.getenv("S3_PRESIGN_EXPIRES", "300"))
+
+
+def shard_key(sha256: str) -> str:
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+class StorageBackend(ABC):
+    """Interface used by the attachment endpoints. Keys come from ``shard_key``."""
+
+    # Local directory for in-flight uploads; on the same filesystem as the blobs when possible
+    staging_dir: str
+
+    @abstractmethod
+    def put(self, local_path: str, key: str, content_type: Optional[str] = None):
+        """Moves a finished local file into storage under ``key``."""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        ...
+
+    def local_path(self, key: str) -> Optional[str]:
+        """Filesystem path when the blob can be served directly, else None."""
+        return None
+
+    def download_url(self, key: str, filename: str, content_type: Optional[str] = None) -> Optional[str]:
+        """Pre-signed URL when the blob is served by the store itself, else None."""
+        return None
+
+    @abstractmethod
+    def delete(self, key: str):
+        """Removes ``key`` if present; for derived data that needs no rollback."""
+
+    @abstractmethod
+    def release(self, key: str) -> Optional[str]:
+        """First half of a delete, called before the DB commit. Returns a token for
+        ``purge`` (after commit) or ``restore`` (after rollback, or when the content
+        was uploaded again meanwhile)."""
+
+    @abstractmethod
+    def purge(self, token: str):
+        ...
+
+    @abstractmethod
+    def restore(self, token: str):
+        ...
+
+
+class LocalShardedStorage(StorageBackend):
+    def __init__(self, root: str = ATTACHMENT_STORAGE_ROOT):
+        self.root = os.path.abspath(root)
+        self.staging_dir = os.path.join(self.root, ".staging")
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def put(self, local_path: str, key: str, content_type: Optional[str] = None):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(local_path, path)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.path(key), "rb")
+
+    def local_path(self, key: str) -> Optional[str]:
+        return self.path(key)
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def release(self, key: str) -> Optional[str]:
+        # Move aside rather than unlink so a failed commit can put it back
+        tombstone = f"{self.path(key)}.deleted-{uuid.uuid4().hex}"
+        try:
+            os.replace(self.path(key), tombstone)
+        except FileNotFoundError:
+            return None
+        return tombstone
+
+    def purge(self, token: str):
+        try:
+            os.remove(token)
+        except FileNotFoundError:
+            pass
+
+    def restore(self, token: str):
+        os.replace(token, token.rsplit(".deleted-", 1)[0])
+
+
+class S3Storage(StorageBackend):
+    """S3-compatible object storage (AWS, MinIO, ...). Downloads are redirected to
+    pre-signed URLs so the bytes never pass through the API workers."""
+
+    def __init__(self, bucket: str = S3_BUCKET, endpoint_url: Optional[str] = S3_ENDPOINT_URL,
+                 region: str = S3_REGION, client=None):
+        if client is None:
+            import boto3
+            client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+        self.client = client
+        self.bucket = bucket
+        self.staging_dir = ATTACHMENT_STAGING_DIR or os.path.join(tempfile.gettempdir(), "attachment-staging")
+
+    def put(self, local_path: str, key: str, content_type: Optional[str] = None):
+        extra = {"ContentType": content_type} if content_type else None
+        self.client.upload_file(local_path, self.bucket, key, ExtraArgs=extra)
+        os.remove(local_path)
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError:
+            return False
+        return True
+
+    def open(self, key: str) -> BinaryIO:
+        return self.client.get_object(Bucket=self.bucket, Key=key)["Body"]
+
+    def download_url(self, key: str, filename: str, content_type: Optional[str] = None) -> Optional[str]:
+        params = {
+            "Bucket": self.bucket,
+            "Key": key,
+            "ResponseContentDisposition": f'attachment; filename="{filename}"',
+        }
+        if content_type:
+            params["ResponseContentType"] = content_type
+        return self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=S3_PRESIGN_EXPIRES)
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def release(self, key: str) -> Optional[str]:
+        # Objects cannot be renamed cheaply; the delete itself waits until after commit
+        return key
+
+    def purge(self, token: str):
+        self.client.delete_object(Bucket=self.bucket, Key=token)
+
+    def restore(self, token: str):
+        pass
+
+
+def build_storage() -> StorageBackend:
+    if ATTACHMENT_STORAGE_BACKEND == "s3":
+        return S3Storage()
+    return LocalShardedStorage()
+
+
+_storage: Optional[StorageBackend] = None
+
+def get_storage() -> StorageBackend:
+    global _storage
+    if _storage is None:
+        _storage = build_storage()
+    return _storage
+
+def set_storage(backend: Optional[StorageBackend]):
+    global _storage
+    _storage = backend
+
+
+def legacy_path(file_path: str) -> str:
+    """Files written before the storage backend existed were saved relative to the backend directory."""
+    return file_path if os.path.isabs(file_path) else os.path.join(BACKEND_DIR, file_path)
+
+
+def copy_into(storage: StorageBackend, source_path: str, key: str, content_type: Optional[str] = None):
+    """Copies (rather than moves) a local file into storage; used by the layout migration."""
+    os.makedirs(storage.staging_dir, exist_ok=True)
+    staged = os.path.join(storage.staging_dir, f"{uuid.uuid4()}.part")
+    shutil.copyfile(source_path, staged)
+    storage.put(staged, key, content_type)
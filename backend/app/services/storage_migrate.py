@@ -0,0 +1,137 @@
+"""Moves attachments from the old flat ``uploads/`` layout into the configured storage backend.
+
+    python -m app.services.storage_migrate [--dry-run]
+
+Two passes, each committing per blob so the run can be interrupted and resumed:
+
+1. Blobs whose ``storage_path`` is not yet a shard key are copied to
+   ``shard_key(sha256)`` and every attachment with that hash is repointed. Extra
+   copies owned by individual attachments are removed along with the old file.
+2. Attachments that were never hashed are hashed, counted against a (possibly
+   new) blob and repointed the same way.
+
+Old files are only removed after the commit that stops referencing them.
+"""
+import argparse
+import hashlib
+import logging
+import os
+from typing import Iterable
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import literal_column
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.models.models import Attachment, AttachmentBlob
+from app.services.storage import StorageBackend, copy_into, get_storage, legacy_path, shard_key
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _remove_files(paths: Iterable[str]):
+    for path in set(paths):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def migrate_blob(db: Session, storage: StorageBackend, sha256: str, dry_run: bool = False) -> bool:
+    blob = db.query(AttachmentBlob).filter(AttachmentBlob.sha256 == sha256).with_for_update().first()
+    key = shard_key(sha256)
+    if blob is None or blob.storage_path == key:
+        return False
+
+    attachments = db.query(Attachment).filter(Attachment.sha256 == sha256).all()
+    old_paths = [legacy_path(blob.storage_path)] + [legacy_path(a.file_path) for a in attachments if a.file_path != key]
+    source = next((p for p in old_paths if os.path.exists(p)), None)
+    if not storage.exists(key) and source is None:
+        logger.warning(f"Blob {sha256}: no copy found on disk, leaving it in place")
+        db.rollback()
+        return False
+    if dry_run:
+        db.rollback()
+        return True
+
+    if not storage.exists(key):
+        copy_into(storage, source, key, blob.content_type)
+    if not blob.size and source is not None:
+        blob.size = os.path.getsize(source)
+    blob.storage_path = key
+    for attachment in attachments:
+        attachment.file_path = key
+    db.commit()
+    _remove_files(p for p in old_paths if os.path.exists(p))
+    return True
+
+
+def migrate_unhashed(db: Session, storage: StorageBackend, attachment_id, dry_run: bool = False) -> bool:
+    attachment = db.query(Attachment).filter(Attachment.id == attachment_id).with_for_update().first()
+    if attachment is None or attachment.sha256 is not None:
+        return False
+    source = legacy_path(attachment.file_path)
+    if not os.path.exists(source):
+        logger.warning(f"Attachment {attachment.id}: {attachment.file_path} is missing, skipping")
+        db.rollback()
+        return False
+    if dry_run:
+        db.rollback()
+        return True
+
+    sha256 = file_sha256(source)
+    key = shard_key(sha256)
+    stmt = insert(AttachmentBlob).values(
+        sha256=sha256,
+        size=os.path.getsize(source),
+        content_type=attachment.content_type,
+        storage_path=key,
+        ref_count=1,
+    ).on_conflict_do_update(
+        index_elements=[AttachmentBlob.sha256],
+        set_={"ref_count": AttachmentBlob.ref_count + 1},
+    ).returning(AttachmentBlob.storage_path, literal_column("xmax = 0").label("inserted"))
+    storage_path, _ = db.execute(stmt).one()
+    if storage_path != key:
+        # Hash matches a blob that pass 1 could not move; leave it for a rerun
+        db.rollback()
+        return False
+
+    if not storage.exists(key):
+        copy_into(storage, source, key, attachment.content_type)
+    attachment.sha256 = sha256
+    attachment.file_path = key
+    db.commit()
+    _remove_files([source])
+    return True
+
+
+def run(dry_run: bool = False):
+    storage = get_storage()
+    db = SessionLocal()
+    try:
+        shas = [sha for (sha,) in db.query(AttachmentBlob.sha256).all()]
+        moved = sum(migrate_blob(db, storage, sha, dry_run) for sha in shas)
+        ids = [i for (i,) in db.query(Attachment.id).filter(Attachment.sha256.is_(None)).all()]
+        hashed = sum(migrate_unhashed(db, storage, i, dry_run) for i in ids)
+    finally:
+        db.close()
+    verb = "Would migrate" if dry_run else "Migrated"
+    logger.info(f"{verb} {moved} blobs and {hashed} unhashed attachments into {type(storage).__name__}")
+    return moved, hashed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Move attachments into the sharded storage layout")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be moved")
+    args = parser.parse_args()
+    run(dry_run=args.dry_run)
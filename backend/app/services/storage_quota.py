@@ -0,0 +1,79 @@
+"""Per-incident and per-department attachment usage and quotas.
+
+Usage is kept in ``storage_usage`` and adjusted in the same transaction as the
+attachment row, so enforcing a quota is a single conditional UPDATE on one row
+instead of a SUM over attachments. Sizes are logical (what was uploaded), not
+the deduplicated bytes on disk.
+"""
+import os
+from typing import List, Optional, Tuple
+from sqlalchemy import func, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from app.models.models import Incident, StorageUsage
+from app.services.uploads import UploadError
+
+# 0 disables a quota
+ATTACHMENT_QUOTA_PER_INCIDENT = int(os.getenv("ATTACHMENT_QUOTA_PER_INCIDENT_BYTES", str(10 * 1024 ** 3)))
+ATTACHMENT_QUOTA_PER_DEPARTMENT = int(os.getenv("ATTACHMENT_QUOTA_PER_DEPARTMENT_BYTES", "0"))
+
+INCIDENT_SCOPE = "incident"
+DEPARTMENT_SCOPE = "department"
+
+
+def _scopes(incident_id, department_id) -> List[Tuple[str, object, int]]:
+    scopes = [(INCIDENT_SCOPE, incident_id, ATTACHMENT_QUOTA_PER_INCIDENT)]
+    if department_id:
+        scopes.append((DEPARTMENT_SCOPE, department_id, ATTACHMENT_QUOTA_PER_DEPARTMENT))
+    return scopes
+
+
+def _quota_error(scope: str, quota: int) -> UploadError:
+    return UploadError(413, f"Attachment storage quota for this {scope} ({quota} bytes) would be exceeded")
+
+
+def check_quota(db: Session, incident: Incident, size: Optional[int]):
+    """Early rejection before any bytes are received; ``charge`` is the authoritative check."""
+    if not size:
+        return
+    for scope, scope_id, quota in _scopes(incident.id, incident.department_id):
+        if quota <= 0:
+            continue
+        used = db.query(StorageUsage.total_bytes).filter(
+            StorageUsage.scope == scope, StorageUsage.scope_id == scope_id
+        ).scalar() or 0
+        if used + size > quota:
+            raise _quota_error(scope, quota)
+
+
+def charge(db: Session, incident: Incident, size: int):
+    """Adds an attachment of ``size`` bytes to the incident's and department's usage.
+
+    Raises UploadError when a quota would be exceeded, possibly after charging
+    another scope: the caller runs it in a savepoint. The row locks taken here
+    serialize concurrent uploads to the same incident.
+    """
+    for scope, scope_id, quota in _scopes(incident.id, incident.department_id):
+        db.execute(insert(StorageUsage).values(
+            scope=scope, scope_id=scope_id, total_bytes=0, attachment_count=0
+        ).on_conflict_do_nothing())
+        stmt = update(StorageUsage).where(
+            StorageUsage.scope == scope, StorageUsage.scope_id == scope_id
+        ).values(
+            total_bytes=StorageUsage.total_bytes + size,
+            attachment_count=StorageUsage.attachment_count + 1,
+        )
+        if quota > 0:
+            stmt = stmt.where(StorageUsage.total_bytes + size <= quota)
+        if db.execute(stmt).rowcount == 0:
+            raise _quota_error(scope, quota)
+
+
+def refund(db: Session, incident_id, department_id, size: int):
+    for scope, scope_id, _ in _scopes(incident_id, department_id):
+        db.execute(update(StorageUsage).where(
+            StorageUsage.scope == scope, StorageUsage.scope_id == scope_id
+        ).values(
+            total_bytes=func.greatest(StorageUsage.total_bytes - size, 0),
+            attachment_count=func.greatest(StorageUsage.attachment_count - 1, 0),
+        ))
@@ -0,0 +1,179 @@
+"""Streaming multipart upload handling for attachments.
+
+The request body is parsed as it arrives, so size and type limits are enforced
+before anything hits the disk, and the SHA-256 / byte count are computed in the
+same pass. File writes happen in the threadpool to keep the event loop free.
+"""
+import fnmatch
+import hashlib
+import os
+import uuid
+from typing import List, Optional
+from fastapi import Request
+from fastapi.concurrency import run_in_threadpool
+from python_multipart.multipart import MultipartParser, parse_options_header
+
+ATTACHMENT_MAX_BYTES = int(os.getenv("ATTACHMENT_MAX_BYTES", str(100 * 1024 * 1024)))
+ATTACHMENT_ALLOWED_TYPES = [
+    t.strip() for t in os.getenv(
+        "ATTACHMENT_ALLOWED_TYPES",
+        "image/*,text/*,video/*,application/pdf,application/json,application/xml,application/zip,"
+        "application/gzip,application/x-gzip,application/x-tar,application/x-7z-compressed,"
+        "application/vnd.tcpdump.pcap,application/octet-stream,"
+        "application/msword,application/vnd.openxmlformats-officedocument.*,application/vnd.ms-excel"
+    ).split(",") if t.strip()
+]
+# Allowance for multipart boundaries and part headers when checking Content-Length
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class StreamedUpload:
+    def __init__(self, path: str, filename: str, content_type: str, size: int, sha256: str):
+        self.path = path
+        self.filename = filename
+        self.content_type = content_type
+        self.size = size
+        self.sha256 = sha256
+
+
+def is_allowed_type(content_type: str, allowed_types: Optional[List[str]] = None) -> bool:
+    allowed_types = ATTACHMENT_ALLOWED_TYPES if allowed_types is None else allowed_types
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    return any(fnmatch.fnmatch(content_type, pattern) for pattern in allowed_types)
+
+
+class _FilePartCollector:
+    """Parser callbacks; collects the bytes of the first file part named ``field_name``."""
+
+    def __init__(self, field_name: str, allowed_types: List[str]):
+        self.field_name = field_name
+        self.allowed_types = allowed_types
+        self.headers = {}
+        self._field = b""
+        self._value = b""
+        self.in_file = False
+        self.done = False
+        self.filename: Optional[str] = None
+        self.content_type: Optional[str] = None
+        self.pending: List[bytes] = []
+
+    def on_part_begin(self):
+        self.headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def on_header_end(self):
+        self.headers[self._field.decode("latin-1").lower()] = self._value.decode("latin-1")
+        self._field = b""
+        self._value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self.headers.get("content-disposition", ""))
+        name = options.get(b"name", b"").decode("utf-8", "replace")
+        filename = options.get(b"filename")
+        if self.done or name != self.field_name or filename is None:
+            return
+        self.filename = os.path.basename(filename.decode("utf-8", "replace")) or "upload"
+        self.content_type = self.headers.get("content-type", "application/octet-stream")
+        if not is_allowed_type(self.content_type, self.allowed_types):
+            raise UploadError(415, f"File type {self.content_type} is not allowed")
+        self.in_file = True
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self.in_file:
+            self.pending.append(data[start:end])
+
+    def on_part_end(self):
+        if self.in_file:
+            self.in_file = False
+            self.done = True
+
+    def callbacks(self):
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+        }
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def receive_upload(
+    request: Request,
+    dest_dir: str,
+    field_name: str = "file",
+    max_bytes: Optional[int] = None,
+    allowed_types: Optional[List[str]] = None,
+) -> StreamedUpload:
+    """Streams the ``field_name`` file part of a multipart request into ``dest_dir``.
+
+    Raises UploadError on a limit violation; partial files are always removed.
+    """
+    max_bytes = ATTACHMENT_MAX_BYTES if max_bytes is None else max_bytes
+    allowed_types = ATTACHMENT_ALLOWED_TYPES if allowed_types is None else allowed_types
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError(400, "Expected a multipart/form-data upload")
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes + MULTIPART_OVERHEAD:
+        raise UploadError(413, f"File exceeds the {max_bytes} byte limit")
+
+    collector = _FilePartCollector(field_name, allowed_types)
+    parser = MultipartParser(params[b"boundary"], collector.callbacks())
+
+    os.makedirs(dest_dir, exist_ok=True)
+    temp_path = os.path.join(dest_dir, f"{uuid.uuid4()}.part")
+    buffer = None
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            if not collector.pending:
+                continue
+            if buffer is None:
+                buffer = await run_in_threadpool(open, temp_path, "wb")
+            data = b"".join(collector.pending)
+            collector.pending = []
+            size += len(data)
+            if size > max_bytes:
+                raise UploadError(413, f"File exceeds the {max_bytes} byte limit")
+            hasher.update(data)
+            await run_in_threadpool(buffer.write, data)
+        parser.finalize()
+
+        if collector.filename is None:
+            raise UploadError(400, f"Missing file field '{field_name}'")
+        if buffer is None:
+            # Empty file
+            buffer = await run_in_threadpool(open, temp_path, "wb")
+        await run_in_threadpool(buffer.close)
+    except BaseException:
+        # Limit violation, client disconnect or cancellation: never leave a partial file behind
+        if buffer is not None:
+            await run_in_threadpool(buffer.close)
+        await run_in_threadpool(_remove, temp_path)
+        raise
+
+    return StreamedUpload(temp_path, collector.filename, collector.content_type, size, hasher.hexdigest())
@@ -0,0 +1,501 @@
+import hashlib
+import os
+import pytest
+from app.services import uploads
+from app.services.storage import LocalShardedStorage, set_storage, shard_key
+
+@pytest.fixture
+def upload_dir(tmp_path):
+    set_storage(LocalShardedStorage(str(tmp_path)))
+    yield tmp_path
+    set_storage(None)
+
+def _stored_files(root):
+    """Blob keys under the storage root, ignoring the staging area."""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d != ".staging"]
+        found.extend(os.path.relpath(os.path.join(dirpath, f), root) for f in filenames)
+    return sorted(found)
+
+def _staged_files(root):
+    staging = os.path.join(root, ".staging")
+    return os.listdir(staging) if os.path.isdir(staging) else []
+
+@pytest.fixture
+def incident_id(client, auth_header, db):
+    from app.models.models import Category
+    category = Category(name="IT Support", description="Test Category")
+    db.add(category)
+    db.commit()
+    response = client.post(
+        "/api/v1/incidents/",
+        headers=auth_header,
+        json={"title": "Attachment Test", "description": "Testing uploads", "category_id": str(category.id)}
+    )
+    return response.json()["id"]
+
+def test_upload_streams_and_hashes(client, auth_header, incident_id, upload_dir):
+    payload = os.urandom(200 * 1024)
+    response = client.post(
+        f"/api/v1/incidents/{incident_id}/upload",
+        headers=auth_header,
+        files={"file": ("screenshot.png", payload, "image/png")}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["file_name"] == "screenshot.png"
+    assert data["sha256"] == hashlib.sha256(payload).hexdigest()
+    assert _staged_files(upload_dir) == []
+    assert _stored_files(upload_dir) == [shard_key(data["sha256"])]
+
+def test_upload_over_limit_is_rejected_and_cleaned_up(client, auth_header, incident_id, upload_dir, monkeypatch):
+    monkeypatch.setattr(uploads, "ATTACHMENT_MAX_BYTES", 1024)
+    response = client.post(
+        f"/api/v1/incidents/{incident_id}/upload",
+        headers=auth_header,
+        files={"file": ("dump.log", os.urandom(4096), "text/plain")}
+    )
+    assert response.status_code == 413
+    assert _staged_files(upload_dir) == []
+    assert _stored_files(upload_dir) == []
+
+def test_upload_disallowed_type(client, auth_header, incident_id, upload_dir):
+    response = client.post(
+        f"/api/v1/incidents/{incident_id}/upload",
+        headers=auth_header,
+        files={"file": ("setup.exe", b"MZ\x90\x00", "application/x-msdownload")}
+    )
+    assert response.status_code == 415
+    assert _staged_files(upload_dir) == []
+    assert _stored_files(upload_dir) == []
+
+def test_identical_uploads_share_one_blob(client, auth_header, admin_auth_header, incident_id, upload_dir, db):
+    from app.models.models import AttachmentBlob
+    payload = os.urandom(64 * 1024)
+    ids = []
+    for name in ("first.png", "second.png"):
+        response = client.post(
+            f"/api/v1/incidents/{incident_id}/upload",
+            headers=auth_header,
+            files={"file": (name, payload, "image/png")}
+        )
+        ids.append(response.json()["id"])
+
+    sha256 = hashlib.sha256(payload).hexdigest()
+    blob = db.get(AttachmentBlob, sha256)
+    assert blob.ref_count == 2
+    assert _stored_files(upload_dir) == [shard_key(sha256)]
+
+    report = client.get("/api/v1/incidents/attachments/dedup-report", headers=admin_auth_header).json()
+    assert report["bytes_saved"] == len(payload)
+
+    client.delete(f"/api/v1/incidents/{ids[0]}", headers=auth_header)
+    assert _stored_files(upload_dir) == [shard_key(sha256)]
+
+    client.delete(f"/api/v1/incidents/{ids[1]}", headers=auth_header)
+    assert _stored_files(upload_dir) == []
+    db.expire_all()
+    assert db.get(AttachmentBlob, sha256) is None
+
+def test_rolled_back_upload_leaves_no_blob(db_engine, upload_dir):
+    from sqlalchemy.orm import Session
+    from app.services.blobs import acquire_blob
+    from app.services.storage import get_storage
+    storage = get_storage()
+    payload = os.urandom(16 * 1024)
+    os.makedirs(storage.staging_dir, exist_ok=True)
+    path = os.path.join(storage.staging_dir, "orphan.part")
+    with open(path, "wb") as f:
+        f.write(payload)
+    upload = uploads.StreamedUpload(path, "orphan.bin", "application/octet-stream", len(payload),
+                                    hashlib.sha256(payload).hexdigest())
+
+    with Session(db_engine) as session:
+        acquire_blob(session, upload, storage)
+        # Only moved into storage once the blob row is committed
+        assert _stored_files(upload_dir) == []
+        session.rollback()
+
+    assert _stored_files(upload_dir) == []
+    assert _staged_files(upload_dir) == []
+
+def _upload(client, auth_header, incident_id, payload, name="bundle.log", content_type="text/plain"):
+    response = client.post(
+        f"/api/v1/incidents/{incident_id}/upload",
+        headers=auth_header,
+        files={"file": (name, payload, content_type)}
+    )
+    return response.json()
+
+def test_storage_failure_after_commit_keeps_the_upload(client, auth_header, incident_id, upload_dir, monkeypatch):
+    from app.services.storage import get_storage
+    storage = get_storage()
+    payload = os.urandom(8 * 1024)
+    put = storage.put
+
+    def failing_put(*args, **kwargs):
+        raise OSError("disk unavailable")
+
+    monkeypatch.setattr(storage, "put", failing_put)
+    response = client.post(
+        f"/api/v1/incidents/{incident_id}/upload",
+        headers=auth_header,
+        files={"file": ("crash.dmp", payload, "application/octet-stream")}
+    )
+    # The attachment is committed, so the request succeeds even though the file is not stored
+    assert response.status_code == 200
+    assert _stored_files(upload_dir) == []
+    assert _staged_files(upload_dir) == []
+
+    # The next upload of the same content stores it
+    monkeypatch.setattr(storage, "put", put)
+    again = _upload(client, auth_header, incident_id, payload, "crash.dmp", "application/octet-stream")
+    assert again["sha256"] == response.json()["sha256"]
+    assert _stored_files(upload_dir) == [shard_key(again["sha256"])]
+
+def test_blob_uploaded_again_before_purge_is_kept(client, auth_header, incident_id, upload_dir, db):
+    from app.models.models import AttachmentBlob
+    from app.services.blobs import acquire_blob, purge_blob, release_blob
+    from app.services.storage import get_storage
+    storage = get_storage()
+    payload = os.urandom(8 * 1024)
+    sha256 = _upload(client, auth_header, incident_id, payload, "blob.bin", "application/octet-stream")["sha256"]
+
+    # The last reference is dropped and committed...
+    token = release_blob(db, sha256, storage)
+    db.commit()
+    # ...and the same content is uploaded again before the purge runs
+    staged = os.path.join(storage.staging_dir, "again.part")
+    with open(staged, "wb") as f:
+        f.write(payload)
+    acquire_blob(db, uploads.StreamedUpload(staged, "again.bin", "application/octet-stream", len(payload), sha256), storage)
+    db.commit()
+
+    assert purge_blob(db, sha256, storage, token) is False
+    assert _stored_files(upload_dir) == [shard_key(sha256)]
+    db.expire_all()
+    assert db.get(AttachmentBlob, sha256).ref_count == 1
+
+def test_download_conditional_get_returns_304(client, auth_header, incident_id, upload_dir):
+    payload = os.urandom(10 * 1024)
+    attachment = _upload(client, auth_header, incident_id, payload)
+    url = f"/api/v1/incidents/download/{attachment['id']}"
+
+    response = client.get(url, headers=auth_header)
+    assert response.status_code == 200
+    assert response.content == payload
+    etag = response.headers["etag"]
+    assert etag == f'"{hashlib.sha256(payload).hexdigest()}"'
+    assert "immutable" in response.headers["cache-control"]
+
+    response = client.get(url, headers={**auth_header, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+def test_download_single_and_multi_range(client, auth_header, incident_id, upload_dir):
+    payload = bytes(range(256)) * 40
+    attachment = _upload(client, auth_header, incident_id, payload)
+    url = f"/api/v1/incidents/download/{attachment['id']}"
+
+    response = client.get(url, headers={**auth_header, "Range": "bytes=100-199"})
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 100-199/{len(payload)}"
+    assert response.content == payload[100:200]
+
+    response = client.get(url, headers={**auth_header, "Range": "bytes=0-9,500-509"})
+    assert response.status_code == 206
+    assert response.headers["content-type"].startswith("multipart/byteranges")
+    assert payload[0:10] in response.content
+    assert payload[500:510] in response.content
+
+def test_download_if_range_mismatch_sends_full_body(client, auth_header, incident_id, upload_dir):
+    payload = os.urandom(4096)
+    attachment = _upload(client, auth_header, incident_id, payload)
+    url = f"/api/v1/incidents/download/{attachment['id']}"
+
+    response = client.get(url, headers={**auth_header, "Range": "bytes=0-99", "If-Range": '"stale"'})
+    assert response.status_code == 200
+    assert response.content == payload
+
+def test_s3_backend_redirects_to_presigned_url(client, auth_header, incident_id):
+    moto = pytest.importorskip("moto")
+    import boto3
+    from app.services.storage import S3Storage
+
+    with moto.mock_aws():
+        s3 = boto3.client("s3", region_name="us-east-1")
+        s3.create_bucket(Bucket="attachments")
+        set_storage(S3Storage(bucket="attachments", client=s3))
+        try:
+            payload = os.urandom(8 * 1024)
+            attachment = _upload(client, auth_header, incident_id, payload, name="trace.pcap")
+            key = shard_key(hashlib.sha256(payload).hexdigest())
+            assert s3.get_object(Bucket="attachments", Key=key)["Body"].read() == payload
+
+            response = client.get(
+                f"/api/v1/incidents/download/{attachment['id']}",
+                headers=auth_header,
+                follow_redirects=False,
+            )
+            assert response.status_code == 307
+            assert key in response.headers["location"]
+            assert "X-Amz-Signature" in response.headers["location"]
+
+            client.delete(f"/api/v1/incidents/{attachment['id']}", headers=auth_header)
+            assert "Contents" not in s3.list_objects_v2(Bucket="attachments")
+        finally:
+            set_storage(None)
+
+def test_resumable_upload_out_of_order(client, auth_header, incident_id, upload_dir, monkeypatch):
+    from app.services import resumable_uploads
+    monkeypatch.setattr(resumable_uploads, "UPLOAD_CHUNK_MIN_BYTES", 1024)
+    payload = os.urandom(10 * 1024 + 123)
+    response = client.post(
+        f"/api/v1/incidents/{incident_id}/uploads",
+        headers=auth_header,
+        json={"file_name": "heap.hprof", "content_type": "application/octet-stream",
+              "total_size": len(payload), "chunk_size": 4096}
+    )
+    assert response.status_code == 201
+    session = response.json()
+    assert session["total_chunks"] == 3
+    url = f"/api/v1/incidents/uploads/{session['id']}"
+
+    for index in (2, 0):
+        chunk = payload[index * 4096:(index + 1) * 4096]
+        response = client.put(f"{url}/chunks/{index}", headers=auth_header, content=chunk)
+        assert response.json()["sha256"] == hashlib.sha256(chunk).hexdigest()
+
+    status = client.get(url, headers=auth_header).json()
+    assert status["received_chunks"] == [0, 2]
+    assert status["received_ranges"] == [[0, 4096], [8192, len(payload)]]
+    assert client.post(f"{url}/complete", headers=auth_header).status_code == 409
+
+    # Retrying a received chunk is harmless; different content is not
+    assert client.put(f"{url}/chunks/0", headers=auth_header, content=payload[:4096]).status_code == 200
+    assert client.put(f"{url}/chunks/0", headers=auth_header, content=os.urandom(4096)).status_code == 409
+    client.put(f"{url}/chunks/1", headers=auth_header, content=payload[4096:8192])
+
+    response = client.post(f"{url}/complete", headers=auth_header)
+    assert response.status_code == 200
+    attachment = response.json()
+    assert attachment["sha256"] == hashlib.sha256(payload).hexdigest()
+    assert _stored_files(upload_dir) == [shard_key(attachment["sha256"])]
+    assert client.get(url, headers=auth_header).status_code == 404
+
+    download = client.get(f"/api/v1/incidents/download/{attachment['id']}", headers=auth_header)
+    assert download.content == payload
+
+def test_resumable_upload_over_quota_keeps_its_session(client, auth_header, incident_id, upload_dir, monkeypatch):
+    from app.services import resumable_uploads, storage_quota
+    from app.services.storage import get_storage
+    monkeypatch.setattr(resumable_uploads, "UPLOAD_CHUNK_MIN_BYTES", 1024)
+    payload = os.urandom(2048)
+    session = client.post(
+        f"/api/v1/incidents/{incident_id}/uploads",
+        headers=auth_header,
+        json={"file_name": "big.bin", "total_size": len(payload), "chunk_size": 1024}
+    ).json()
+    url = f"/api/v1/incidents/uploads/{session['id']}"
+    for index in (0, 1):
+        client.put(f"{url}/chunks/{index}", headers=auth_header, content=payload[index * 1024:(index + 1) * 1024])
+
+    monkeypatch.setattr(storage_quota, "ATTACHMENT_QUOTA_PER_INCIDENT", 1024)
+    assert client.post(f"{url}/complete", headers=auth_header).status_code == 413
+    # Session and staged file are still there, together
+    assert client.get(url, headers=auth_header).json()["received_chunks"] == [0, 1]
+    assert os.path.exists(resumable_uploads.session_path(get_storage(), session["id"]))
+
+    monkeypatch.setattr(storage_quota, "ATTACHMENT_QUOTA_PER_INCIDENT", 10 * 1024)
+    response = client.post(f"{url}/complete", headers=auth_header)
+    assert response.status_code == 200
+    assert response.json()["sha256"] == hashlib.sha256(payload).hexdigest()
+    assert client.get(url, headers=auth_header).status_code == 404
+
+def test_chunk_streams_in_outside_a_transaction(client, auth_header, incident_id, upload_dir, db, monkeypatch):
+    import asyncio
+    import uuid
+    from app.models.models import UploadChunk, UploadSession
+    from app.services import resumable_uploads
+    from app.services.storage import get_storage
+    monkeypatch.setattr(resumable_uploads, "UPLOAD_CHUNK_MIN_BYTES", 1024)
+    session_id = uuid.UUID(client.post(
+        f"/api/v1/incidents/{incident_id}/uploads",
+        headers=auth_header,
+        json={"file_name": "trace.bin", "total_size": 2048, "chunk_size": 1024}
+    ).json()["id"])
+    in_transaction = []
+
+    class SlowClient:
+        def __init__(self, *parts):
+            self.parts = parts
+
+        async def stream(self):
+            for part in self.parts:
+                in_transaction.append(db.in_transaction())
+                yield part
+
+    def send(index, *parts):
+        session = db.get(UploadSession, session_id, populate_existing=True)
+        return asyncio.run(resumable_uploads.write_chunk(SlowClient(*parts), db, get_storage(), session, index))
+
+    chunk = send(0, b"a" * 512, b"b" * 512)
+    db.commit()
+    assert chunk.sha256 == hashlib.sha256(b"a" * 512 + b"b" * 512).hexdigest()
+    assert in_transaction == [False, False]
+
+    # A body cut short is not recorded
+    with pytest.raises(uploads.UploadError):
+        send(1, b"c" * 100)
+    db.expire_all()
+    assert db.get(UploadChunk, (session_id, 1)) is None
+
+def test_expired_upload_sessions_are_cleaned_up(client, auth_header, incident_id, upload_dir, db, monkeypatch):
+    from datetime import datetime, timedelta
+    from app.services import resumable_uploads
+    from app.services.storage import get_storage
+    monkeypatch.setattr(resumable_uploads, "UPLOAD_CHUNK_MIN_BYTES", 1024)
+    session = client.post(
+        f"/api/v1/incidents/{incident_id}/uploads",
+        headers=auth_header,
+        json={"file_name": "capture.pcap", "total_size": 2048, "chunk_size": 1024}
+    ).json()
+    path = resumable_uploads.session_path(get_storage(), session["id"])
+    assert os.path.exists(path)
+
+    assert resumable_uploads.expire_sessions(db, get_storage(), now=datetime.utcnow() + timedelta(days=2)) == 1
+    assert not os.path.exists(path)
+    assert client.get(f"/api/v1/incidents/uploads/{session['id']}", headers=auth_header).status_code == 404
+
+def test_text_preview_is_cached_and_regenerated(client, auth_header, incident_id, upload_dir):
+    from app.services import previews
+    payload = "".join(f"2026-10-19 12:00:{i:02d} ERROR request failed\n" for i in range(500)).encode()
+    attachment = _upload(client, auth_header, incident_id, payload, name="app.log")
+    assert attachment["sha256"]
+    url = f"/api/v1/incidents/preview/{attachment['id']}"
+
+    response = client.get(url, headers=auth_header)
+    assert response.status_code == 200
+    assert response.text.count("\n") == previews.PREVIEW_TEXT_LINES
+    assert "immutable" in response.headers["cache-control"]
+    assert client.get(url, headers={**auth_header, "If-None-Match": response.headers["etag"]}).status_code == 304
+
+    # Lost previews are rebuilt on the next request
+    key = previews.preview_key(shard_key(attachment["sha256"]), previews.TEXT)
+    os.remove(os.path.join(upload_dir, key))
+    assert client.get(url, headers=auth_header).text == response.text
+
+def test_preview_not_available_for_binary(client, auth_header, incident_id, upload_dir):
+    attachment = _upload(client, auth_header, incident_id, os.urandom(1024), name="core.bin",
+                         content_type="application/octet-stream")
+    assert client.get(f"/api/v1/incidents/preview/{attachment['id']}", headers=auth_header).status_code == 404
+
+def test_upload_quota_and_usage_report(client, auth_header, admin_auth_header, incident_id, upload_dir, monkeypatch):
+    from app.services import storage_quota
+    monkeypatch.setattr(storage_quota, "ATTACHMENT_QUOTA_PER_INCIDENT", 10 * 1024)
+    first = _upload(client, auth_header, incident_id, os.urandom(6 * 1024), name="a.log")
+    assert first["file_size"] == 6 * 1024
+
+    response = client.post(
+        f"/api/v1/incidents/{incident_id}/upload",
+        headers=auth_header,
+        files={"file": ("b.log", os.urandom(6 * 1024), "text/plain")}
+    )
+    assert response.status_code == 413
+    assert _staged_files(upload_dir) == []
+
+    report = client.get("/api/v1/incidents/attachments/storage-usage", headers=admin_auth_header).json()
+    incident_usage = next(i for i in report["top_incidents"] if i["incident_id"] == incident_id)
+    assert incident_usage["total_bytes"] == 6 * 1024
+    assert incident_usage["attachment_count"] == 1
+
+    # Deleting frees the quota again
+    client.delete(f"/api/v1/incidents/{first['id']}", headers=auth_header)
+    assert _upload(client, auth_header, incident_id, os.urandom(6 * 1024), name="b.log")["file_size"] == 6 * 1024
+
+def test_download_all_attachments_as_zip(client, auth_header, incident_id, upload_dir):
+    import io
+    import zipfile
+    screenshot = os.urandom(32 * 1024)
+    log = b"2026-10-19 12:00:00 ERROR disk full\n" * 2000
+    _upload(client, auth_header, incident_id, screenshot, name="screen.png", content_type="image/png")
+    _upload(client, auth_header, incident_id, log, name="app.log")
+    _upload(client, auth_header, incident_id, log, name="app.log")
+
+    response = client.get(f"/api/v1/incidents/{incident_id}/attachments/archive", headers=auth_header)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/zip"
+
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.testzip() is None
+    assert archive.namelist() == ["screen.png", "app.log", "app (1).log"]
+    assert archive.getinfo("screen.png").compress_type == zipfile.ZIP_STORED
+    assert archive.getinfo("app.log").compress_type == zipfile.ZIP_DEFLATED
+    assert archive.read("screen.png") == screenshot
+    assert archive.read("app (1).log") == log
+
+    # A blob gone from storage is left out up front instead of cutting the stream short
+    from app.services.storage import get_storage
+    get_storage().delete(shard_key(hashlib.sha256(screenshot).hexdigest()))
+    response = client.get(f"/api/v1/incidents/{incident_id}/attachments/archive", headers=auth_header)
+    assert response.status_code == 200
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert archive.testzip() is None
+    assert archive.namelist() == ["app.log", "app (1).log"]
+
+def _slow_text_render(monkeypatch, started, release, on_render=None):
+    """Renders in a thread of the default executor, blocking until ``release`` is set."""
+    from app.services import previews
+
+    def render(kind, source_path, dest_path):
+        started.set()
+        release.wait(5)
+        previews.render_text(source_path, dest_path)
+        if on_render:
+            on_render()
+
+    monkeypatch.setattr(previews, "get_pool", lambda: None)
+    monkeypatch.setattr(previews, "render_preview", render)
+
+def _stored_blob(upload_dir, payload):
+    from app.services.storage import get_storage
+    storage = get_storage()
+    key = shard_key(hashlib.sha256(payload).hexdigest())
+    os.makedirs(os.path.dirname(storage.path(key)), exist_ok=True)
+    with open(storage.path(key), "wb") as f:
+        f.write(payload)
+    return storage, key
+
+def test_preview_render_survives_a_cancelled_caller(upload_dir, monkeypatch):
+    import asyncio
+    import threading
+    from app.services import previews
+    started, release = threading.Event(), threading.Event()
+    _slow_text_render(monkeypatch, started, release)
+    storage, key = _stored_blob(upload_dir, b"line one\nline two\n")
+
+    async def scenario():
+        first = asyncio.create_task(previews.ensure_preview(storage, key, "text/plain"))
+        second = asyncio.create_task(previews.ensure_preview(storage, key, "text/plain"))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        # The first caller's client disconnects mid-render
+        first.cancel()
+        release.set()
+        return await second
+
+    assert asyncio.run(scenario()) == previews.preview_key(key, previews.TEXT)
+    assert storage.exists(previews.preview_key(key, previews.TEXT))
+
+def test_preview_of_a_blob_deleted_while_rendering_is_dropped(upload_dir, monkeypatch):
+    import asyncio
+    import threading
+    from app.services import previews
+    started, release = threading.Event(), threading.Event()
+    release.set()
+    storage, key = _stored_blob(upload_dir, b"short-lived\n")
+    # Its last attachment is deleted after the render read it
+    _slow_text_render(monkeypatch, started, release, on_render=lambda: storage.delete(key))
+
+    assert asyncio.run(previews.ensure_preview(storage, key, "text/plain")) is None
+    assert _stored_files(upload_dir) == []
@@ -0,0 +1,79 @@
+import asyncio
+import uuid
+from datetime import timedelta
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+from app.core import pg_listen
+from app.core.database import engine
+from app.models.models import Lease
+from app.services import leases
+
+TTL = timedelta(seconds=30)
+
+
+def holder_of(db, name):
+    lease = db.get(Lease, name, populate_existing=True)
+    return lease.holder if lease else None
+
+
+def test_lease_is_exclusive_until_it_expires_then_stolen(db):
+    name = "test-lease"
+    assert leases.acquire(db, name, TTL, holder="a")
+    assert not leases.acquire(db, name, TTL, holder="b")
+    # Renewing our own live lease succeeds
+    assert leases.acquire(db, name, TTL, holder="a")
+    assert holder_of(db, name) == "a"
+
+    db.execute(
+        update(Lease)
+        .where(Lease.name == name)
+        .values(expires_at=func.timezone("utc", func.now()) - timedelta(seconds=1))
+    )
+    db.commit()
+
+    assert leases.acquire(db, name, TTL, holder="b")
+    assert not leases.acquire(db, name, TTL, holder="a")
+    assert holder_of(db, name) == "b"
+
+    # Only the holder can release
+    leases.release(db, name, holder="a")
+    assert holder_of(db, name) == "b"
+    leases.release(db, name, holder="b")
+    assert holder_of(db, name) is None
+    assert leases.acquire(db, name, TTL, holder="a")
+
+
+def test_notify_is_delivered_on_commit_and_dropped_on_rollback():
+    channel = f"test_{uuid.uuid4().hex[:8]}"
+    received = []
+    listener = pg_listen.PgListener()
+
+    async def scenario():
+        arrived = asyncio.Event()
+
+        def handler(payload):
+            received.append(payload)
+            arrived.set()
+
+        listener.subscribe(channel, handler)
+        task = asyncio.create_task(listener.run())
+        try:
+            # LISTEN is issued once the listener connects; keep sending until it hears one
+            for _ in range(25):
+                with Session(engine) as session:
+                    pg_listen.notify(session, channel, "dropped")
+                    session.rollback()
+                    pg_listen.notify(session, channel, "committed")
+                    session.commit()
+                try:
+                    await asyncio.wait_for(arrived.wait(), 0.2)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+    assert received and set(received) == {"committed"}
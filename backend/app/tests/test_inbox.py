@@ -0,0 +1,68 @@
+from app.models.models import Category, Incident, IncidentStatus, Notification
+from app.services.inbox import InboxService
+
+def _make_incident(db, reporter):
+    category = Category(name="IT Support", description="Test Category")
+    db.add(category)
+    db.commit()
+    incident = Incident(
+        incident_key="INC-TEST-001",
+        title="Inbox Test",
+        description="Testing the inbox",
+        reporter_id=reporter.id,
+        category_id=category.id,
+        status=IncidentStatus.OPEN,
+    )
+    db.add(incident)
+    db.commit()
+    return incident
+
+def test_assignment_lands_in_inbox(client, admin_auth_header, test_admin, test_user, db):
+    incident = _make_incident(db, test_user)
+
+    response = client.patch(
+        f"/api/v1/incidents/{incident.id}",
+        headers=admin_auth_header,
+        json={"assignee_id": str(test_admin.id)}
+    )
+    assert response.status_code == 200
+
+    response = client.get("/api/v1/notifications/unread-count", headers=admin_auth_header)
+    assert response.json() == {"unread_count": 1}
+
+    response = client.get("/api/v1/notifications/", headers=admin_auth_header)
+    items = response.json()["items"]
+    assert len(items) == 1
+    assert items[0]["type"] == "ASSIGNMENT"
+
+def test_mark_read_keeps_counter_in_step(client, auth_header, test_user, db):
+    incident = _make_incident(db, test_user)
+    for i in range(5):
+        InboxService.push(db, test_user.id, "COMMENT", f"Comment {i}", incident_id=incident.id)
+    db.commit()
+
+    first_page = client.get("/api/v1/notifications/?limit=2", headers=auth_header).json()
+    assert first_page["unread_count"] == 5
+    ids = [n["id"] for n in first_page["items"]]
+
+    response = client.post("/api/v1/notifications/mark-read", headers=auth_header, json={"ids": ids})
+    assert response.json() == {"unread_count": 3}
+
+    # Marking the same rows again must not decrement twice
+    response = client.post("/api/v1/notifications/mark-read", headers=auth_header, json={"ids": ids})
+    assert response.json() == {"unread_count": 3}
+
+    second_page = client.get(
+        "/api/v1/notifications/",
+        headers=auth_header,
+        params={
+            "limit": 2,
+            "before_created_at": first_page["next_before_created_at"],
+            "before_id": first_page["next_before_id"],
+        },
+    ).json()
+    assert not set(ids) & {n["id"] for n in second_page["items"]}
+
+    response = client.post("/api/v1/notifications/mark-read", headers=auth_header, json={"all": True})
+    assert response.json() == {"unread_count": 0}
+    assert db.query(Notification).filter(Notification.user_id == test_user.id, Notification.is_read == False).count() == 0
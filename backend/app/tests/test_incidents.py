@@ -94,3 +94,324 @@ def test_unauthorized_transition(client, auth_header, admin_auth_header, db):
         json={"status": "RESOLVED"}
     )
     assert response.status_code == 403
+
+def test_sla_breach_is_recorded_once_and_follows_priority(client, admin_auth_header, auth_header, db):
+    from datetime import datetime, timedelta
+    from app.models.models import AuditLog, Category, Incident, SLAPolicy
+    from app.services.sla_monitor import SlaMonitor, record_breaches
+
+    category = Category(name="IT Support", description="Test Category")
+    db.add(category)
+    db.add(SLAPolicy(name="High", priority=IncidentPriority.HIGH, resolution_time_minutes=60))
+    db.add(SLAPolicy(name="Low", priority=IncidentPriority.LOW, resolution_time_minutes=60 * 24 * 7))
+    db.commit()
+
+    ids = []
+    for title in ["Late", "On time"]:
+        response = client.post(
+            "/api/v1/incidents/",
+            headers=auth_header,
+            json={"title": title, "description": "SLA test", "priority": "HIGH", "category_id": str(category.id)},
+        )
+        ids.append(response.json()["id"])
+    late, on_time = (db.get(Incident, i) for i in ids)
+    assert late.sla_breach_at is not None
+    late.created_at -= timedelta(hours=3)
+    late.sla_breach_at -= timedelta(hours=3)
+    on_time.created_at -= timedelta(hours=3)
+    on_time.sla_breach_at -= timedelta(hours=3)
+    db.commit()
+
+    # Lowering the priority moves the deadline out, so only "Late" breaches
+    response = client.patch(f"/api/v1/incidents/{on_time.id}", headers=admin_auth_header, json={"priority": "LOW"})
+    assert response.status_code == 200
+    db.refresh(on_time)
+    assert on_time.sla_breach_at > datetime.utcnow()
+
+    monitor = SlaMonitor()
+    monitor.load(db)
+    due = monitor.pop_due(datetime.utcnow())
+    events = record_breaches(db, due)
+    assert [e["id"] for e in events] == [str(late.id)]
+    # A stale or duplicated entry never records the breach twice
+    assert record_breaches(db, due) == []
+
+    db.refresh(late)
+    assert late.sla_breached_at is not None
+    timeline = client.get(f"/api/v1/incidents/{late.id}/timeline", headers=admin_auth_header).json()
+    breach = [log for log in timeline if log["action"] == "SLA_BREACH"]
+    assert len(breach) == 1
+    assert breach[0]["actor_name"] == "System"
+    assert db.query(AuditLog).filter(AuditLog.action == "SLA_BREACH").count() == 1
+
+def test_sla_counts_business_hours_and_pauses_for_the_reporter(client, admin_auth_header, auth_header, db):
+    from datetime import datetime, timedelta
+    from app.models.models import Category, Incident, SLAPolicy
+    from app.services.sla_calendar import CalendarEngine, recompute_deadlines
+
+    working_hours = [{"weekday": day, "start": "09:00", "end": "17:00"} for day in range(5)]
+    response = client.post(
+        "/api/v1/sla/calendars",
+        headers=admin_auth_header,
+        json={"name": "Office", "timezone": "UTC", "working_hours": working_hours},
+    )
+    assert response.status_code == 200
+    calendar_id = response.json()["id"]
+    bad = client.post(
+        "/api/v1/sla/calendars",
+        headers=admin_auth_header,
+        json={"name": "Broken", "timezone": "Mars/Olympus", "working_hours": working_hours},
+    )
+    assert bad.status_code == 400
+
+    category = Category(name="IT Support", description="Test Category")
+    db.add(category)
+    policy = SLAPolicy(name="High", priority=IncidentPriority.HIGH, resolution_time_minutes=600, calendar_id=calendar_id)
+    db.add(policy)
+    db.commit()
+
+    response = client.post(
+        "/api/v1/incidents/",
+        headers=auth_header,
+        json={"title": "Printer", "description": "Jammed", "priority": "HIGH", "category_id": str(category.id)},
+    )
+    incident = db.get(Incident, response.json()["id"])
+    office = CalendarEngine("UTC", working_hours)
+    assert incident.sla_breach_at == office.add_minutes(incident.created_at, 600)
+    # Ten business hours always span more than one working day
+    assert incident.sla_breach_at - incident.created_at > timedelta(hours=10)
+
+    # Waiting on the reporter stops the clock; their reply restarts it
+    response = client.patch(f"/api/v1/incidents/{incident.id}", headers=admin_auth_header, json={"awaiting_reporter": True})
+    assert response.status_code == 200
+    assert response.json()["sla_breach_at"] is None
+    assert response.json()["sla_paused_at"] is not None
+    db.refresh(incident)
+    incident.sla_paused_at -= timedelta(days=7)
+    db.commit()
+    client.post(f"/api/v1/incidents/{incident.id}/comments", headers=auth_header, json={"content": "Still jammed"})
+    db.refresh(incident)
+    assert incident.sla_paused_at is None
+    assert incident.sla_paused_minutes == 5 * 8 * 60
+    assert incident.sla_breach_at == office.add_minutes(incident.created_at, 600 + 5 * 8 * 60)
+
+    # Changing the policy moves every open deadline in one pass
+    policy.resolution_time_minutes = 60
+    db.commit()
+    assert recompute_deadlines(db, [IncidentPriority.HIGH]) == 1
+    db.refresh(incident)
+    assert incident.sla_breach_at == office.add_minutes(incident.created_at, 60 + 5 * 8 * 60)
+    assert recompute_deadlines(db, [IncidentPriority.HIGH]) == 0
+
+    # A name or priority that is already taken is refused, not a server error
+    night = client.post(
+        "/api/v1/sla/calendars",
+        headers=admin_auth_header,
+        json={"name": "Night", "timezone": "UTC", "working_hours": working_hours},
+    ).json()
+    response = client.patch(f"/api/v1/sla/calendars/{night['id']}", headers=admin_auth_header, json={"name": "Office"})
+    assert response.status_code == 400
+    low = SLAPolicy(name="Low", priority=IncidentPriority.LOW, resolution_time_minutes=600)
+    db.add(low)
+    db.commit()
+    response = client.patch(f"/api/v1/sla/policies/{low.id}", headers=admin_auth_header, json={"priority": "HIGH"})
+    assert response.status_code == 400
+    assert client.get("/api/v1/sla/policies", headers=admin_auth_header).status_code == 200
+
+def test_service_request_gets_the_deadline_recomputation_would_give_it(client, auth_header, db):
+    from app.models.models import Category, Incident, ServiceItem, SLAPolicy
+    from app.services.sla_calendar import recompute_deadlines
+
+    category = Category(name="IT Support", description="Test Category")
+    db.add(category)
+    db.add(SLAPolicy(name="Low", priority=IncidentPriority.LOW, resolution_time_minutes=60 * 24))
+    db.commit()
+    item = ServiceItem(name="Laptop", description="A new laptop", base_priority=IncidentPriority.LOW, category_id=category.id)
+    db.add(item)
+    db.commit()
+
+    response = client.post(f"/api/v1/catalog/{item.id}/request", headers=auth_header, json={})
+    assert response.status_code == 201
+    incident = db.get(Incident, response.json()["id"])
+    assert incident.sla_breach_at is not None
+    assert recompute_deadlines(db, [IncidentPriority.LOW]) == 0
+
+def test_sla_report_counts_outcomes_per_priority(client, admin_auth_header, auth_header, db):
+    from datetime import datetime, timedelta
+    from app.models.models import Category, Incident, SLAPolicy
+
+    category = Category(name="IT Support", description="Test Category")
+    db.add(category)
+    db.add(SLAPolicy(name="High", priority=IncidentPriority.HIGH, resolution_time_minutes=60))
+    db.add(SLAPolicy(name="Low", priority=IncidentPriority.LOW, resolution_time_minutes=60 * 24 * 7))
+    db.commit()
+
+    incidents = {}
+    for title, priority in [("on time", "HIGH"), ("late", "HIGH"), ("overdue", "HIGH"), ("at risk", "LOW"), ("fine", "LOW")]:
+        response = client.post(
+            "/api/v1/incidents/",
+            headers=auth_header,
+            json={"title": title, "description": "SLA report", "priority": priority, "category_id": str(category.id)},
+        )
+        incidents[title] = db.get(Incident, response.json()["id"])
+    now = datetime.utcnow()
+    for title in ["on time", "late", "overdue"]:
+        incident = incidents[title]
+        incident.created_at = now - timedelta(hours=3)
+        incident.sla_breach_at = now - timedelta(hours=2)
+    incidents["on time"].status = IncidentStatus.RESOLVED
+    incidents["on time"].resolved_at = now - timedelta(hours=2, minutes=30)
+    incidents["late"].status = IncidentStatus.RESOLVED
+    incidents["late"].resolved_at = now - timedelta(hours=1)
+    incidents["at risk"].sla_breach_at = now + timedelta(hours=2)
+    db.commit()
+
+    response = client.get("/api/v1/incidents/sla-report?group_by=priority&bucket=day", headers=admin_auth_header)
+    assert response.status_code == 200
+    report = response.json()
+    assert report["summary"] == {
+        "total": 5, "met": 1, "breached": 2, "at_risk": 1, "on_track": 1, "compliance_pct": 33.33,
+    }
+    high, low = report["groups"]
+    assert (high["key"], high["breached"], high["breach_rank"]) == ("HIGH", 2, 1)
+    assert high["share_of_breaches_pct"] == 100.0
+    assert (low["key"], low["at_risk"], low["on_track"], low["breach_rank"]) == ("LOW", 1, 1, 2)
+    assert sum(p["total"] for p in report["periods"]) == 5
+
+    assert client.get("/api/v1/incidents/sla-report", headers=auth_header).status_code == 403
+    too_long = client.get(
+        "/api/v1/incidents/sla-report?start=2024-01-01T00:00:00&end=2026-01-01T00:00:00", headers=admin_auth_header
+    )
+    assert too_long.status_code == 400
+    # A bound in UTC with a "Z" is compared with the defaulted, naive end
+    since = (now - timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    response = client.get("/api/v1/incidents/sla-report", params={"start": since}, headers=admin_auth_header)
+    assert response.status_code == 200
+    assert response.json()["summary"]["total"] == 5
+
+def test_rollups_follow_incident_writes(client, admin_auth_header, auth_header, db):
+    from app.models.models import Category, IncidentRollupDaily, IncidentStatusTotal
+    from app.services import rollups
+
+    category = Category(name="IT Support", description="Test Category")
+    db.add(category)
+    db.commit()
+
+    ids = []
+    for title in ["printer", "vpn"]:
+        response = client.post(
+            "/api/v1/incidents/",
+            headers=auth_header,
+            json={"title": title, "description": "Rollups", "priority": "LOW", "category_id": str(category.id)},
+        )
+        ids.append(response.json()["id"])
+    for status in ["IN_PROGRESS", "RESOLVED"]:
+        client.patch(f"/api/v1/incidents/{ids[0]}", headers=admin_auth_header, json={"status": status})
+    # Reopened with a new priority, then resolved again
+    client.patch(f"/api/v1/incidents/{ids[0]}", headers=admin_auth_header, json={"status": "IN_PROGRESS"})
+    client.patch(f"/api/v1/incidents/{ids[0]}", headers=admin_auth_header, json={"priority": "HIGH"})
+    response = client.patch(f"/api/v1/incidents/{ids[0]}", headers=admin_auth_header, json={"status": "RESOLVED"})
+    assert response.status_code == 200
+
+    days = db.query(IncidentRollupDaily).filter(IncidentRollupDaily.category_id == category.id).all()
+    assert sum(d.created_count for d in days) == 2
+    high = [d for d in days if d.priority == IncidentPriority.HIGH]
+    assert [(d.created_count, d.resolved_count, d.reopened_count) for d in high] == [(1, 1, 1)]
+    totals = {(t.priority, t.status): t.incident_count for t in db.query(IncidentStatusTotal).all() if t.incident_count}
+    assert totals == {(IncidentPriority.HIGH, IncidentStatus.RESOLVED): 1, (IncidentPriority.LOW, IncidentStatus.OPEN): 1}
+    assert not any(rollups.verify(db).values())
+
+    stats = client.get("/api/v1/incidents/stats", headers=admin_auth_header).json()
+    assert stats["by_status"] == {"RESOLVED": 1, "OPEN": 1}
+    assert set(stats["mttr"]["by_priority"]) == {"HIGH"}
+    assert len(stats["trend"]) == 1
+
+def test_resolution_percentiles_from_sketches_match_exact(client, admin_auth_header, auth_header, db):
+    from datetime import datetime, timedelta
+    from app.models.models import Category, Incident
+    from app.services import rollups
+
+    category = Category(name="IT Support", description="Test Category")
+    db.add(category)
+    db.commit()
+
+    now = datetime.utcnow()
+    for hours in [1, 2, 3, 4, 200]:
+        response = client.post(
+            "/api/v1/incidents/",
+            headers=auth_header,
+            json={"title": f"{hours}h", "description": "Percentiles", "priority": "HIGH", "category_id": str(category.id)},
+        )
+        incident = db.get(Incident, response.json()["id"])
+        # Backdated past the API, so the sketches are rebuilt below
+        incident.created_at = now - timedelta(hours=hours)
+        incident.status = IncidentStatus.RESOLVED
+        incident.resolved_at = now
+    db.commit()
+    rollups.lock(db)
+    rollups.rebuild(db)
+
+    sketch = client.get("/api/v1/incidents/resolution-percentiles", headers=admin_auth_header).json()
+    exact = client.get("/api/v1/incidents/resolution-percentiles?mode=exact", headers=admin_auth_header).json()
+    assert sketch["overall"]["count"] == exact["overall"]["count"] == 5
+    assert sketch["overall"]["p50_hours"] == pytest.approx(3, rel=0.02)
+    assert exact["overall"]["p50_hours"] == pytest.approx(3, abs=0.01)
+    assert [g["key"] for g in sketch["by_priority"]] == ["HIGH"]
+    since = (now - timedelta(days=2)).isoformat() + "+00:00"
+    response = client.get("/api/v1/incidents/resolution-percentiles", params={"start": since}, headers=admin_auth_header)
+    assert response.status_code == 200
+    assert response.json()["overall"]["count"] == 5
+    # One slow incident drags the mean far from the median
+    stats = client.get("/api/v1/incidents/stats", headers=admin_auth_header).json()
+    assert stats["mttr"]["overall"] == pytest.approx(42, abs=0.01)
+    assert stats["mttr"]["percentiles"]["p50_hours"] == pytest.approx(3, rel=0.02)
+    assert client.get("/api/v1/incidents/resolution-percentiles", headers=auth_header).status_code == 403
+
+
+def test_analytics_export_is_incremental_and_streams_arrow(client, admin_auth_header, auth_header, db, tmp_path):
+    from datetime import datetime, timedelta
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    from app.models.models import Category
+    from app.services import analytics_export
+
+    category = Category(name="IT Support", description="Test Category")
+    db.add(category)
+    db.commit()
+
+    response = client.post(
+        "/api/v1/incidents/",
+        headers=auth_header,
+        json={"title": "Export me", "description": "Export", "priority": "LOW", "category_id": str(category.id)},
+    )
+    incident_id = response.json()["id"]
+    incidents = analytics_export.DATASETS["incidents"]
+    later = datetime.utcnow() + timedelta(minutes=5)
+
+    assert analytics_export.export_dataset(db, incidents, str(tmp_path), now=later) == 1
+    # Nothing changed since the watermark
+    assert analytics_export.export_dataset(db, incidents, str(tmp_path), now=later + timedelta(seconds=1)) == 0
+
+    client.patch(f"/api/v1/incidents/{incident_id}", headers=admin_auth_header, json={"status": "IN_PROGRESS"})
+    assert analytics_export.export_dataset(db, incidents, str(tmp_path), now=later + timedelta(minutes=10)) == 1
+    table = ds.dataset(str(tmp_path / "incidents"), format="parquet", partitioning="hive").to_table()
+    assert table.column("id").to_pylist() == [incident_id, incident_id]
+    assert sorted(table.column("status").to_pylist()) == ["IN_PROGRESS", "OPEN"]
+    assert set(table.column("month").to_pylist()) == {datetime.utcnow().strftime("%Y-%m")}
+
+    response = client.get(f"/api/v1/exports/incidents?until={later.isoformat()}", headers=admin_auth_header)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == analytics_export.IPC_MEDIA_TYPE
+    streamed = pa.ipc.open_stream(response.content).read_all()
+    assert streamed.column("id").to_pylist() == [incident_id]
+    # An offset on one bound and none on the other is compared in UTC
+    aware = (later - timedelta(hours=1)).isoformat() + "+00:00"
+    response = client.get("/api/v1/exports/incidents", params={"since": aware, "until": later.isoformat()},
+                          headers=admin_auth_header)
+    assert response.status_code == 200
+    assert pa.ipc.open_stream(response.content).read_all().column("id").to_pylist() == [incident_id]
+    response = client.get("/api/v1/exports/incidents", params={"since": later.isoformat(), "until": aware},
+                          headers=admin_auth_header)
+    assert response.status_code == 400
+    assert client.get("/api/v1/exports/incidents", headers=auth_header).status_code == 403
+    assert client.get("/api/v1/exports/users", headers=admin_auth_header).status_code == 404
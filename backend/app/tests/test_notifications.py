@@ -0,0 +1,91 @@
+import socket
+import pytest
+from datetime import datetime
+from aiosmtpd.controller import Controller
+from app.models.models import NotificationOutbox, OutboxStatus
+from app.services.outbox_worker import SMTPConnectionPool, process_batch
+
+class RecordingHandler:
+    def __init__(self, reject=()):
+        self.reject = set(reject)
+        self.envelopes = []
+        self.sessions = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.reject:
+            return "550 mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.envelopes.append(envelope)
+        return "250 Message accepted for delivery"
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def smtp_server():
+    handler = RecordingHandler(reject={"bounce@example.com"})
+    controller = Controller(handler, hostname="127.0.0.1", port=_free_port())
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+def _create_incident(client, auth_header, db, title):
+    from app.models.models import Category
+    category = Category(name="IT Support", description="Test Category")
+    db.add(category)
+    db.commit()
+    return client.post(
+        "/api/v1/incidents/",
+        headers=auth_header,
+        json={"title": title, "description": "Outbox test", "category_id": str(category.id)}
+    )
+
+def test_incident_creation_writes_outbox_row(client, auth_header, db):
+    response = _create_incident(client, auth_header, db, "Outbox Incident")
+    assert response.status_code == 200
+
+    entry = db.query(NotificationOutbox).filter(NotificationOutbox.template == "incident_created").one()
+    assert entry.recipient_email == "test@example.com"
+    assert entry.status == OutboxStatus.PENDING
+    assert entry.context["incident_key"] == response.json()["incident_key"]
+
+def test_worker_delivers_batch_over_one_connection(client, auth_header, db, smtp_server):
+    controller, handler = smtp_server
+    for i in range(3):
+        _create_incident(client, auth_header, db, f"Batch {i}")
+
+    pool = SMTPConnectionPool(controller.hostname, controller.port)
+    claimed = process_batch(db, pool)
+    db.commit()
+    pool.close()
+
+    assert claimed == 3
+    assert len(handler.envelopes) == 3
+    assert len(handler.sessions) == 1
+    assert all(e.rcpt_tos == ["test@example.com"] for e in handler.envelopes)
+    assert db.query(NotificationOutbox).filter(NotificationOutbox.status == OutboxStatus.SENT).count() == 3
+
+def test_rejected_recipient_is_retried_with_backoff(db, smtp_server):
+    controller, handler = smtp_server
+    db.add(NotificationOutbox(template="welcome", recipient_email="bounce@example.com", context={"recipient_name": "Bounce"}))
+    db.add(NotificationOutbox(template="welcome", recipient_email="ok@example.com", context={"recipient_name": "Ok"}))
+    db.commit()
+
+    pool = SMTPConnectionPool(controller.hostname, controller.port)
+    process_batch(db, pool)
+    db.commit()
+    pool.close()
+
+    bounced = db.query(NotificationOutbox).filter(NotificationOutbox.recipient_email == "bounce@example.com").one()
+    delivered = db.query(NotificationOutbox).filter(NotificationOutbox.recipient_email == "ok@example.com").one()
+    assert bounced.status == OutboxStatus.PENDING
+    assert bounced.attempts == 1
+    assert bounced.next_attempt_at > datetime.utcnow()
+    assert delivered.status == OutboxStatus.SENT
+    assert len(handler.envelopes) == 1
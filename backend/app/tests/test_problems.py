@@ -0,0 +1,212 @@
+import pytest
+
+@pytest.fixture
+def category_id(db):
+    from app.models.models import Category
+    category = Category(name="IT Support", description="Test Category")
+    db.add(category)
+    db.commit()
+    return str(category.id)
+
+def _create_incident(client, auth_header, category_id, title):
+    response = client.post(
+        "/api/v1/incidents/",
+        headers=auth_header,
+        json={"title": title, "description": "Problem test", "category_id": category_id}
+    )
+    return response.json()["id"]
+
+def test_problem_list_is_paginated_and_filtered(client, admin_auth_header):
+    for i in range(5):
+        client.post("/api/v1/problems/", headers=admin_auth_header, json={"title": f"Problem {i}"})
+
+    first = client.get("/api/v1/problems/?limit=3", headers=admin_auth_header).json()
+    assert [p["title"] for p in first["items"]] == ["Problem 4", "Problem 3", "Problem 2"]
+    assert first["next_before_id"]
+
+    second = client.get(
+        "/api/v1/problems/",
+        headers=admin_auth_header,
+        params={"limit": 3, "before_created_at": first["next_before_created_at"], "before_id": first["next_before_id"]},
+    ).json()
+    assert [p["title"] for p in second["items"]] == ["Problem 1", "Problem 0"]
+    assert second["next_before_id"] is None
+
+    closed = client.get("/api/v1/problems/?status=CLOSED", headers=admin_auth_header).json()
+    assert closed["items"] == []
+
+def test_problem_returns_incident_count_and_paginated_incidents(client, auth_header, admin_auth_header, category_id):
+    problem = client.post("/api/v1/problems/", headers=admin_auth_header, json={"title": "Disk full"}).json()
+    incident_ids = [_create_incident(client, auth_header, category_id, f"Disk alert {i}") for i in range(3)]
+    for incident_id in incident_ids:
+        client.post(f"/api/v1/problems/{problem['id']}/incidents/{incident_id}", headers=admin_auth_header)
+
+    detail = client.get(f"/api/v1/problems/{problem['id']}", headers=admin_auth_header).json()
+    assert detail["incident_count"] == 3
+    assert "incidents" not in detail
+
+    page = client.get(f"/api/v1/problems/{problem['id']}/incidents?limit=2", headers=admin_auth_header).json()
+    assert len(page["items"]) == 2
+    rest = client.get(
+        f"/api/v1/problems/{problem['id']}/incidents",
+        headers=admin_auth_header,
+        params={"limit": 2, "before_created_at": page["next_before_created_at"], "before_id": page["next_before_id"]},
+    ).json()
+    assert {i["id"] for i in page["items"] + rest["items"]} == set(incident_ids)
+
+@pytest.fixture
+def similarity_index(monkeypatch):
+    from app.services import similarity
+    index = similarity.SimilarityIndex()
+    index.build([])
+    # Keep the startup build from replacing the empty index with the database contents
+    monkeypatch.setattr(similarity, "build_from_db", lambda db: index)
+    monkeypatch.setattr(similarity, "index", index)
+    return index
+
+def test_similar_incidents_and_problem_candidates(similarity_index, client, auth_header, admin_auth_header, category_id):
+    description = "Remote staff in the finance office lose the VPN connection every few minutes"
+    duplicates = []
+    for title in ["VPN keeps disconnecting", "VPN keeps disconnecting for finance", "VPN keeps disconnecting again"]:
+        response = client.post(
+            "/api/v1/incidents/",
+            headers=auth_header,
+            json={"title": title, "description": description, "category_id": category_id},
+        )
+        duplicates.append(response.json()["id"])
+    other = client.post(
+        "/api/v1/incidents/",
+        headers=auth_header,
+        json={"title": "Printer out of toner", "description": "Third floor printer", "category_id": category_id},
+    ).json()["id"]
+
+    similar = client.get(f"/api/v1/incidents/{duplicates[0]}/similar", headers=admin_auth_header).json()
+    assert {i["id"] for i in similar} == set(duplicates[1:])
+    assert all(i["similarity"] >= 0.5 for i in similar)
+    assert client.get(f"/api/v1/incidents/{duplicates[0]}/similar", headers=auth_header).status_code == 403
+
+    candidates = client.get("/api/v1/problems/candidates", headers=admin_auth_header).json()
+    assert len(candidates) == 1
+    assert candidates[0]["size"] == 3
+    assert {i["id"] for i in candidates[0]["incidents"]} == set(duplicates)
+    assert other not in {i["id"] for i in candidates[0]["incidents"]}
+
+    # Linked incidents are no longer candidates
+    problem = client.post("/api/v1/problems/", headers=admin_auth_header, json={"title": "VPN drops"}).json()
+    client.post(f"/api/v1/problems/{problem['id']}/incidents/{duplicates[0]}", headers=admin_auth_header)
+    assert client.get("/api/v1/problems/candidates", headers=admin_auth_header).json() == []
+
+def test_text_without_shingles_is_not_indexed():
+    import uuid
+    from app.models.models import IncidentStatus
+    from app.services import similarity
+    index = similarity.SimilarityIndex()
+    vpn, empty, stopwords, edited = (uuid.uuid4() for _ in range(4))
+    index.build([
+        (vpn, "VPN keeps disconnecting for finance", IncidentStatus.OPEN, None),
+        (empty, "", IncidentStatus.OPEN, None),
+        (stopwords, "the and for with", IncidentStatus.OPEN, None),
+    ])
+    index.upsert(uuid.uuid4(), "a b c", IncidentStatus.OPEN, None)
+    index.upsert(edited, "Printer out of toner", IncidentStatus.OPEN, None)
+    index.upsert(edited, "x", IncidentStatus.OPEN, None)
+
+    # The VPN incident, and the printer row the edit superseded until the next merge
+    assert len(index) == 2
+    assert index.query("the and for") == []
+    assert index.query("") == []
+    assert [i for i, _ in index.query("VPN keeps disconnecting for finance")] == [vpn]
+    assert index.query("Printer out of toner") == []
+    index.merge()
+    assert len(index) == 1
+    assert index.clusters(min_size=2) == []
+
+def test_overdue_and_due_soon_actions_fire_once(client, db, admin_auth_header, test_admin, test_user):
+    from datetime import datetime, timedelta
+    from app.models.models import Notification, NotificationOutbox
+    from app.services.action_scheduler import ActionScheduler, fire
+
+    problem = client.post("/api/v1/problems/", headers=admin_auth_header, json={"title": "Backups failing"}).json()
+    now = datetime.utcnow()
+    due_dates = {"late": now - timedelta(hours=3), "soon": now + timedelta(hours=2), "later": now + timedelta(days=7)}
+    for description, due_date in due_dates.items():
+        client.post(
+            f"/api/v1/problems/{problem['id']}/actions",
+            headers=admin_auth_header,
+            json={"description": description, "assignee_id": str(test_user.id), "due_date": due_date.isoformat()},
+        )
+
+    overdue = client.get(f"/api/v1/problems/actions/overdue?assignee_id={test_user.id}", headers=admin_auth_header).json()
+    assert [a["description"] for a in overdue["items"]] == ["late"]
+    due_soon = client.get("/api/v1/problems/actions/due-soon?limit=1", headers=admin_auth_header).json()
+    assert [a["description"] for a in due_soon["items"]] == ["soon"]
+    rest = client.get(
+        "/api/v1/problems/actions/due-soon",
+        headers=admin_auth_header,
+        params={"limit": 1, "after_due_date": due_soon["next_after_due_date"], "after_id": due_soon["next_after_id"]},
+    ).json()
+    assert rest["items"] == []
+
+    scheduler = ActionScheduler()
+    scheduler.load(db, now)
+    entries = scheduler.pop_due(now)
+    events = [fire(db, entry) for entry in entries]
+    assert sorted(e["type"] for e in events) == ["ACTION_DUE_SOON", "ACTION_OVERDUE"]
+
+    # A second worker holding the same entries sends nothing, and neither does a reload
+    assert [fire(db, entry) for entry in entries] == [None, None]
+    scheduler.load(db, now)
+    assert scheduler.pop_due(now) == []
+    assert db.query(Notification).filter(Notification.user_id == test_user.id).count() == 2
+    assert db.query(NotificationOutbox).filter(NotificationOutbox.template.like("action_%")).count() == 2
+
+def test_problem_impact_is_cached_until_inputs_change(client, auth_header, admin_auth_header, category_id):
+    problem = client.post("/api/v1/problems/", headers=admin_auth_header, json={"title": "Mail relay down"}).json()
+    incident_ids = [_create_incident(client, auth_header, category_id, f"No mail {i}") for i in range(3)]
+    for incident_id in incident_ids[:2]:
+        client.post(f"/api/v1/problems/{problem['id']}/incidents/{incident_id}", headers=admin_auth_header)
+
+    impact = client.get(f"/api/v1/problems/{problem['id']}/impact", headers=admin_auth_header).json()
+    assert impact["incident_count"] == 2
+    assert impact["open_count"] == 2
+    assert impact["mean_resolution_hours"] is None
+    assert sum(p["incident_count"] for p in impact["rate"]) == 2
+    cached = client.get(f"/api/v1/problems/{problem['id']}/impact", headers=admin_auth_header).json()
+    assert cached["computed_at"] == impact["computed_at"]
+
+    client.post(f"/api/v1/problems/{problem['id']}/incidents/{incident_ids[2]}", headers=admin_auth_header)
+    linked = client.get(f"/api/v1/problems/{problem['id']}/impact", headers=admin_auth_header).json()
+    assert linked["incident_count"] == 3
+
+    client.patch(f"/api/v1/incidents/{incident_ids[0]}", headers=admin_auth_header, json={"status": "IN_PROGRESS"})
+    client.patch(f"/api/v1/incidents/{incident_ids[0]}", headers=admin_auth_header, json={"status": "RESOLVED"})
+    resolved = client.get(f"/api/v1/problems/{problem['id']}/impact?bucket=day", headers=admin_auth_header).json()
+    assert resolved["open_count"] == 2
+    assert resolved["resolved_count"] == 1
+    assert resolved["mean_resolution_hours"] is not None
+
+def test_change_windows_conflict_and_fill_the_calendar(client, admin_auth_header):
+    problem = client.post("/api/v1/problems/", headers=admin_auth_header, json={"title": "Storage upgrade"}).json()
+    url = f"/api/v1/problems/{problem['id']}/changes"
+
+    first = client.post(url, headers=admin_auth_header, json={
+        "title": "Firmware update", "scheduled_start": "2031-03-30T22:00:00", "scheduled_end": "2031-04-01T02:00:00",
+    })
+    assert first.status_code == 200
+
+    overlapping = {"title": "Array rebuild", "scheduled_start": "2031-04-01T01:00:00", "scheduled_end": "2031-04-01T03:00:00"}
+    conflict = client.post(url, headers=admin_auth_header, json=overlapping)
+    assert conflict.status_code == 409
+    assert [c["id"] for c in conflict.json()["detail"]["conflicts"]] == [first.json()["id"]]
+    assert client.post(f"{url}?allow_conflicts=true", headers=admin_auth_header, json=overlapping).status_code == 200
+
+    # Back-to-back windows do not overlap
+    adjacent = {"title": "Cleanup", "scheduled_start": "2031-04-01T03:00:00", "scheduled_end": "2031-04-01T04:00:00"}
+    assert client.post(url, headers=admin_auth_header, json=adjacent).status_code == 200
+    inverted = {"title": "Bad", "scheduled_start": "2031-04-02T03:00:00", "scheduled_end": "2031-04-02T01:00:00"}
+    assert client.post(url, headers=admin_auth_header, json=inverted).status_code == 400
+
+    march = client.get("/api/v1/changes/calendar?year=2031&month=3", headers=admin_auth_header).json()
+    assert [c["title"] for c in march["changes"]] == ["Firmware update"]
+    april = client.get("/api/v1/changes/calendar?year=2031&month=4", headers=admin_auth_header).json()
+    assert [c["title"] for c in april["changes"]] == ["Firmware update", "Array rebuild", "Cleanup"]
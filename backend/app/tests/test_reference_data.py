@@ -0,0 +1,41 @@
+from app.core.metrics import REFERENCE_CACHE
+from app.models.models import Category, ReferenceVersion
+from app.services import reference_cache
+
+
+def _hits(kind):
+    return REFERENCE_CACHE.labels(kind, "hit")._value.get()
+
+
+def test_reference_cache_follows_admin_writes(client, admin_auth_header, db):
+    response = client.post("/api/v1/categories/", headers=admin_auth_header, json={"name": "Network"})
+    assert response.status_code == 200
+    category_id = response.json()["id"]
+
+    assert [c["name"] for c in client.get("/api/v1/categories/").json()] == ["Network"]
+    hits = _hits(reference_cache.CATEGORIES)
+    client.get("/api/v1/categories/")
+    assert _hits(reference_cache.CATEGORIES) == hits + 1
+
+    # A write through the API drops this worker's copy on commit
+    response = client.post(
+        "/api/v1/categories/subcategories",
+        headers=admin_auth_header,
+        json={"name": "VPN", "category_id": category_id},
+    )
+    assert response.status_code == 200
+    categories = client.get("/api/v1/categories/").json()
+    assert [s["name"] for s in categories[0]["subcategories"]] == ["VPN"]
+
+
+def test_reference_cache_catches_up_on_version_check(client, db):
+    assert client.get("/api/v1/categories/").json() == []
+
+    # Another worker's write: the version row moves, but this worker missed the notification
+    db.add(Category(name="Hardware"))
+    db.add(ReferenceVersion(name=reference_cache.CATEGORIES, version=7))
+    db.commit()
+    assert client.get("/api/v1/categories/").json() == []
+
+    reference_cache.cache._verified_at = float("-inf")
+    assert [c["name"] for c in client.get("/api/v1/categories/").json()] == ["Hardware"]
@@ -0,0 +1,49 @@
+import threading
+import time
+from app.services import stats_cache
+from app.services.stats_cache import StatsCache
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = StatsCache()
+    release = threading.Event()
+    calls = []
+
+    def compute(db):
+        calls.append(db)
+        release.wait(5)
+        return {"by_status": {"OPEN": len(calls)}}
+
+    key = (stats_cache.DEPARTMENT, "ops")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(None, key, compute))) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    while not cache._inflight:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == [{"by_status": {"OPEN": 1}}] * 20
+
+
+def test_stale_entries_are_served_while_refreshed(monkeypatch):
+    cache = StatsCache()
+    key = (stats_cache.ALL, None)
+    values = iter([{"n": 1}, {"n": 2}])
+    scheduled = []
+    compute = lambda db: next(values)
+
+    assert cache.get(None, key, compute, schedule=lambda *args: scheduled.append(args)) == {"n": 1}
+    assert cache.get(None, key, compute, schedule=lambda *args: scheduled.append(args)) == {"n": 1}
+    assert scheduled == []
+
+    # An incident write in any department makes the all-departments entry stale
+    cache.invalidate(["ops"])
+    assert cache.get(None, key, compute, schedule=lambda *args: scheduled.append(args)) == {"n": 1}
+    refresh, refresh_key, refresh_compute = scheduled[0]
+    monkeypatch.setattr(stats_cache, "SessionLocal", lambda: type("Session", (), {"close": lambda self: None})())
+    refresh(refresh_key, refresh_compute)
+    assert cache.get(None, key, compute) == {"n": 2}
@@ -0,0 +1,144 @@
+import asyncio
+import msgpack
+from prometheus_client import REGISTRY
+from app.core import websockets
+from app.core.websockets import ConnectionManager
+
+
+class FakeWebSocket:
+    """Records what the manager sends; stands in for a starlette WebSocket."""
+
+    def __init__(self, subprotocols=(), host="10.0.0.1"):
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.client = type("Client", (), {"host": host})()
+        self.accepted_subprotocol = None
+        self.accepted = False
+        self.closed_with = None
+        self.frames = []
+
+    async def accept(self, subprotocol=None):
+        self.accepted = True
+        self.accepted_subprotocol = subprotocol
+
+    async def send_text(self, data):
+        self.frames.append(data)
+
+    async def send_bytes(self, data):
+        self.frames.append(data)
+
+    async def close(self, code=1000):
+        self.closed_with = code
+
+
+def test_msgpack_is_negotiated_and_each_frame_encoded_once_per_format(monkeypatch):
+    encoded = []
+    encode_frame = websockets.encode_frame
+
+    def counting_encode(message, fmt):
+        encoded.append(fmt)
+        return encode_frame(message, fmt)
+
+    monkeypatch.setattr(websockets, "encode_frame", counting_encode)
+    manager = ConnectionManager()
+    binary = [FakeWebSocket(["msgpack"], host=f"10.0.0.{i}") for i in range(3)]
+    text = [FakeWebSocket(host=f"10.0.1.{i}") for i in range(2)]
+
+    async def scenario():
+        for ws in binary + text:
+            assert await manager.connect(ws)
+        await manager.broadcast({"type": "INCIDENT_CREATED", "id": "abc"})
+
+    asyncio.run(scenario())
+
+    assert [ws.accepted_subprotocol for ws in binary] == ["msgpack"] * 3
+    assert [ws.accepted_subprotocol for ws in text] == [None] * 2
+    assert sorted(encoded) == ["json", "msgpack"]
+    # Every msgpack subscriber got the very same encoded frame
+    assert all(ws.frames[0] is binary[0].frames[0] for ws in binary)
+    assert msgpack.unpackb(binary[0].frames[0], raw=False) == {"type": "INCIDENT_CREATED", "id": "abc"}
+    assert text[0].frames[0] == '{"type":"INCIDENT_CREATED","id":"abc"}'
+    assert websockets.decode_frame({"type": "websocket.receive", "bytes": msgpack.packb({"type": "PING"})}) == {"type": "PING"}
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_token_is_read_from_a_subprotocol_and_never_echoed():
+    ws = FakeWebSocket(["json", "bearer.header.payload.signature"])
+    assert websockets.token_from_subprotocols(ws) == "header.payload.signature"
+    assert websockets.token_from_subprotocols(FakeWebSocket(["json"])) is None
+
+    asyncio.run(ConnectionManager().connect(ws))
+    assert ws.accepted_subprotocol == "json"
+
+
+def test_connection_caps_per_user_per_ip_and_global(monkeypatch):
+    monkeypatch.setattr(websockets, "WS_MAX_CONNECTIONS_PER_USER", 2)
+    monkeypatch.setattr(websockets, "WS_MAX_CONNECTIONS_PER_IP", 3)
+    monkeypatch.setattr(websockets, "WS_MAX_CONNECTIONS", 6)
+    manager = ConnectionManager()
+    before = {r: sample("ws_rejected_total", reason=r) for r in ("user_limit", "ip_limit", "global_limit")}
+
+    async def connect(ws, user_id=None):
+        return await manager.connect(ws, user_id=user_id, role="STAFF")
+
+    async def scenario():
+        results = [await connect(FakeWebSocket(host=f"10.0.0.{i}"), user_id="u1") for i in range(3)]
+        same_ip = [await connect(FakeWebSocket(host="10.0.1.1")) for _ in range(4)]
+        rest = [await connect(FakeWebSocket(host=f"10.0.2.{i}")) for i in range(2)]
+        return results, same_ip, rest
+
+    per_user, per_ip, rest = asyncio.run(scenario())
+
+    assert per_user == [True, True, False]
+    assert per_ip == [True, True, True, False]
+    # 2 + 3 + 1 open: the global cap turns the next one away
+    assert rest == [True, False]
+    assert len(manager.active_connections) == 6
+    assert sample("ws_rejected_total", reason="user_limit") - before["user_limit"] == 1
+    assert sample("ws_rejected_total", reason="ip_limit") - before["ip_limit"] == 1
+    assert sample("ws_rejected_total", reason="global_limit") - before["global_limit"] == 1
+
+
+def test_heartbeat_pings_live_sockets_and_reaps_idle_ones():
+    manager = ConnectionManager()
+    live, idle = FakeWebSocket(host="10.0.0.1"), FakeWebSocket(["msgpack"], host="10.0.0.2")
+    reaped = sample("ws_reaped_total")
+
+    async def scenario():
+        await manager.connect(live, role="STAFF", topics={"incidents"})
+        await manager.connect(idle, role="STAFF", topics={"incidents"})
+        gauge = sample("ws_connections", role="STAFF", topic="incidents")
+        manager.connections[idle].last_seen -= websockets.WS_IDLE_TIMEOUT + 1
+        await manager.sweep()
+        return gauge
+
+    gauge = asyncio.run(scenario())
+
+    assert live.frames == ['{"type":"PING"}']
+    assert idle.frames == [] and idle.closed_with == websockets.CLOSE_POLICY_VIOLATION
+    assert manager.active_connections == [live]
+    assert sample("ws_reaped_total") - reaped == 1
+    assert sample("ws_connections", role="STAFF", topic="incidents") == gauge - 1
+
+
+def test_drain_closes_sockets_for_reconnect_and_refuses_new_ones():
+    manager = ConnectionManager()
+    sockets = [FakeWebSocket(host=f"10.0.0.{i}") for i in range(3)]
+    late = FakeWebSocket()
+
+    async def scenario():
+        manager.start()
+        for ws in sockets:
+            await manager.connect(ws)
+        await manager.broadcast({"type": "INCIDENT_UPDATED", "id": "x"})
+        await manager.drain()
+        return await manager.connect(late)
+
+    assert asyncio.run(scenario()) is False
+    assert [ws.closed_with for ws in sockets] == [websockets.CLOSE_SERVICE_RESTART] * 3
+    assert late.closed_with == websockets.CLOSE_TRY_AGAIN_LATER and not late.accepted
+    assert manager.active_connections == [] and manager.per_ip == {}
+    assert manager._heartbeat_task is None
+    assert sample("ws_broadcast_seconds_count") >= 1
@@ -0,0 +1,67 @@
+"""Accuracy and cost of the time-to-resolve sketches against exact percentiles.
+
+Usage: python -m benchmarks.resolution_sketch [--incidents 2000000] [--days 365]
+
+Draws heavy-tailed resolution times (log-normal, plus a few multi-week
+outliers) spread over --days days, bins them per day the way the rollups
+do, then answers p50/p90/p99 over the whole period and over the last 30
+days by merging the daily sketches. The answers are compared with exact
+percentiles (linear interpolation, as percentile_cont) of the raw
+durations, and the sketch rows that a query reads are counted.
+"""
+import argparse
+import time
+import numpy as np
+from app.services.resolution_sketch import BOUNDS, QUANTILES, RELATIVE_ACCURACY, bin_of, quantiles
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--incidents", type=int, default=2_000_000)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    seconds = np.rint(rng.lognormal(np.log(4 * 3600), 1.2, args.incidents)).astype(np.int64)
+    outliers = rng.random(args.incidents) < 0.01
+    seconds[outliers] = rng.integers(14 * 86400, 60 * 86400, outliers.sum())
+    days = rng.integers(0, args.days, args.incidents)
+
+    # Vectorised bin_of; the spot check keeps it honest
+    bins = np.searchsorted(np.array(BOUNDS), seconds, side="right")
+    assert all(bin_of(int(s)) == b for s, b in zip(seconds[:10_000], bins[:10_000]))
+
+    started = time.perf_counter()
+    keys, counts = np.unique(days * (len(BOUNDS) + 1) + bins, return_counts=True)
+    daily = {}
+    for key, count in zip(keys.tolist(), counts.tolist()):
+        daily.setdefault(key // (len(BOUNDS) + 1), {})[key % (len(BOUNDS) + 1)] = count
+    rows = sum(len(d) for d in daily.values())
+    print(f"binning: {args.incidents} durations into {rows} day/bin rows "
+          f"in {time.perf_counter() - started:.2f}s")
+
+    for label, first_day in [(f"{args.days} days", 0), ("last 30 days", args.days - 30)]:
+        started = time.perf_counter()
+        merged = {}
+        read = 0
+        for day in range(first_day, args.days):
+            for b, count in daily.get(day, {}).items():
+                merged[b] = merged.get(b, 0) + count
+                read += 1
+        estimates = quantiles(merged)
+        merge_ms = (time.perf_counter() - started) * 1000
+
+        population = seconds[days >= first_day]
+        started = time.perf_counter()
+        exact = np.percentile(population, [q * 100 for q in QUANTILES])
+        sort_ms = (time.perf_counter() - started) * 1000
+
+        errors = [abs(e - x) / x for e, x in zip(estimates, exact)]
+        print(f"{label}: merged {read} rows in {merge_ms:.1f}ms vs exact over {len(population)} in {sort_ms:.1f}ms")
+        for q, e, x, err in zip(QUANTILES, estimates, exact, errors):
+            print(f"  p{round(q * 100):<3} sketch {e / 3600:9.2f}h  exact {x / 3600:9.2f}h  error {err:.4%}")
+        assert max(errors) <= RELATIVE_ACCURACY * 1.05, "sketch outside its accuracy bound"
+
+
+if __name__ == "__main__":
+    main()
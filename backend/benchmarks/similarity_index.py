@@ -0,0 +1,93 @@
+"""Build time, memory and lookup latency of the incident similarity index.
+
+Usage: python -m benchmarks.similarity_index [--incidents 1000000] [--open-ratio 0.05] [--queries 1000]
+
+Incidents are generated from a few hundred issue templates with random
+hosts, users and filler words, so realistic near-duplicate groups exist.
+Memory is reported both as the index arrays and as the growth in peak RSS.
+"""
+import argparse
+import random
+import resource
+import time
+import uuid
+from app.models.models import IncidentStatus
+from app.services.similarity import SimilarityIndex, incident_text
+
+SUBJECTS = ["VPN", "email", "printer", "laptop", "payroll app", "CRM", "wifi", "SAP", "shared drive", "Teams",
+            "badge reader", "monitor", "database", "backup job", "website", "phone", "ERP", "scanner"]
+SYMPTOMS = ["keeps disconnecting", "is very slow", "shows an error on login", "does not start", "times out",
+            "crashes when saving", "cannot be reached", "rejects my password", "lost all settings",
+            "sync is stuck", "prints blank pages", "returns error 500"]
+CONTEXT = ["since the update this morning", "for the whole finance team", "after the office move",
+           "only on the third floor", "when working from home", "for new starters", "every few minutes",
+           "after the password change", "on all machines in the lab", "since yesterday afternoon"]
+FILLER = ["please help", "urgent", "this blocks month end", "tried restarting already", "colleagues see it too",
+          "ticket raised before", "screenshot attached", "happens intermittently", "no changes on my side"]
+
+
+def rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def generate(n: int, open_ratio: float, seed: int = 7):
+    rng = random.Random(seed)
+    templates = [(s, y, c) for s in SUBJECTS for y in SYMPTOMS for c in CONTEXT]
+    for _ in range(n):
+        subject, symptom, context = rng.choice(templates)
+        title = f"{subject} {symptom}"
+        words = [subject, symptom, context, f"host srv-{rng.randrange(5000)}", f"user u{rng.randrange(100000)}"]
+        words += rng.sample(FILLER, rng.randrange(1, 4))
+        rng.shuffle(words)
+        status = IncidentStatus.OPEN if rng.random() < open_ratio else IncidentStatus.CLOSED
+        yield uuid.uuid4(), incident_text(title, ". ".join(words)), status, None
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--incidents", type=int, default=1_000_000)
+    parser.add_argument("--open-ratio", type=float, default=0.05)
+    parser.add_argument("--queries", type=int, default=1000)
+    args = parser.parse_args()
+
+    rows = list(generate(args.incidents, args.open_ratio))
+    base_rss = rss_mb()
+    index = SimilarityIndex()
+    start = time.perf_counter()
+    index.build(rows)
+    build_s = time.perf_counter() - start
+    print(f"build: {args.incidents} incidents in {build_s:.1f}s ({args.incidents / build_s:,.0f}/s)")
+    print(f"memory: index arrays {index.nbytes() / 1e6:.1f} MB, peak RSS growth {rss_mb() - base_rss:.1f} MB")
+
+    rng = random.Random(1)
+    probes = [text for _, text, _, _ in rng.sample(rows, min(args.queries, len(rows)))]
+    latencies, hits = [], 0
+    for text in probes:
+        start = time.perf_counter()
+        hits += len(index.query(text, limit=10))
+        latencies.append((time.perf_counter() - start) * 1000)
+    print(f"query: p50 {percentile(latencies, 50):.2f} ms, p99 {percentile(latencies, 99):.2f} ms, "
+          f"{hits / len(probes):.1f} results per query")
+
+    start = time.perf_counter()
+    for incident_id, text, status, problem_id in generate(10000, args.open_ratio, seed=8):
+        index.upsert(incident_id, text, status, problem_id)
+    insert_s = time.perf_counter() - start
+    start = time.perf_counter()
+    index.merge()
+    print(f"incremental: 10000 upserts in {insert_s:.2f}s, merge {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    clusters = index.clusters(min_size=3)
+    print(f"clusters: {len(clusters)} over {int(args.incidents * args.open_ratio)} open incidents "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
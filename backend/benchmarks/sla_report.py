@@ -0,0 +1,96 @@
+"""SLA compliance report latency on a 5M-incident table.
+
+Usage: DATABASE_URL=... python -m benchmarks.sla_report [--incidents 5000000] [--runs 5] [--keep]
+
+Needs a scratch Postgres database at head revision. Generates the incidents
+with generate_series (tagged BENCH-n), VACUUM ANALYZEs so the report indexes
+can serve index-only scans, then times compute_report for every grouping,
+for 30- and 365-day periods, with and without a department scope, against
+SLA_REPORT_TIMEOUT_MS. The generated rows are deleted afterwards unless
+--keep is given.
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from app.core.database import SessionLocal, engine
+from app.services import sla_report
+
+SEED = """
+INSERT INTO departments (id, name, created_at)
+SELECT gen_random_uuid(), 'bench-dept-' || g, now() FROM generate_series(1, 20) g
+ON CONFLICT (name) DO NOTHING;
+INSERT INTO categories (id, name, is_active)
+SELECT gen_random_uuid(), 'bench-cat-' || g, true FROM generate_series(1, 30) g
+WHERE NOT EXISTS (SELECT 1 FROM categories WHERE name = 'bench-cat-' || g);
+INSERT INTO users (id, email, hashed_password, full_name, role, is_active, created_at)
+SELECT gen_random_uuid(), 'bench-' || g || '@example.com', 'x', 'Bench ' || g, 'STAFF', true, now()
+FROM generate_series(1, 200) g ON CONFLICT (email) DO NOTHING;
+"""
+
+INCIDENTS = """
+WITH depts AS (SELECT array_agg(id) AS ids FROM departments WHERE name LIKE 'bench-dept-%'),
+     cats AS (SELECT array_agg(id) AS ids FROM categories WHERE name LIKE 'bench-cat-%'),
+     staff AS (SELECT array_agg(id) AS ids FROM users WHERE email LIKE 'bench-%@example.com')
+INSERT INTO incidents (id, incident_key, title, status, priority, reporter_id, department_id, category_id,
+                       assignee_id, created_at, updated_at, resolved_at, sla_breach_at, sla_paused_minutes)
+SELECT gen_random_uuid(), 'BENCH-' || g, 'Benchmark incident',
+       (CASE WHEN r.done THEN 'RESOLVED' ELSE (ARRAY['OPEN', 'IN_PROGRESS'])[1 + g % 2] END)::incidentstatus,
+       (ARRAY['LOW', 'MEDIUM', 'HIGH', 'CRITICAL'])[1 + r.p]::incidentpriority,
+       staff.ids[1], depts.ids[1 + g % 20], cats.ids[1 + g % 30], staff.ids[1 + g % 200],
+       r.created, r.created,
+       CASE WHEN r.done THEN r.created + random() * interval '72 hours' END,
+       r.created + (ARRAY[interval '48 hours', interval '24 hours', interval '8 hours', interval '4 hours'])[1 + r.p],
+       0
+FROM generate_series(1, :n) g, depts, cats, staff,
+     LATERAL (SELECT :now - random() * interval '730 days' AS created,
+                     random() < 0.85 AS done,
+                     (g % 4) AS p) r
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--incidents", type=int, default=5_000_000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--keep", action="store_true")
+    args = parser.parse_args()
+
+    now = datetime.utcnow()
+    db = SessionLocal()
+    try:
+        started = time.perf_counter()
+        db.execute(text(SEED))
+        db.execute(text(INCIDENTS), {"n": args.incidents, "now": now})
+        db.commit()
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.execute(text("VACUUM ANALYZE incidents"))
+        print(f"seed: {args.incidents} incidents in {time.perf_counter() - started:.0f}s")
+
+        department_id = db.execute(text("SELECT id FROM departments WHERE name = 'bench-dept-1'")).scalar()
+        print(f"budget: {sla_report.SLA_REPORT_TIMEOUT_MS}ms per statement")
+        for days in (30, 365):
+            for scoped in (False, True):
+                for group_by in sla_report.GROUPS:
+                    timings = []
+                    for _ in range(args.runs):
+                        started = time.perf_counter()
+                        sla_report.compute_report(db, now - timedelta(days=days), now, group_by=group_by,
+                                                  bucket="week" if days <= 90 else "month",
+                                                  scoped=scoped, department_id=department_id, now=now)
+                        timings.append((time.perf_counter() - started) * 1000)
+                        db.rollback()
+                    scope = "department" if scoped else "all"
+                    print(f"{days:>3}d {scope:<10} {group_by:<10} "
+                          f"p50 {statistics.median(timings):7.1f}ms  max {max(timings):7.1f}ms")
+    finally:
+        if not args.keep:
+            db.rollback()
+            db.execute(text("DELETE FROM incidents WHERE incident_key LIKE 'BENCH-%'"))
+            db.commit()
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
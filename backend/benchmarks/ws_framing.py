@@ -0,0 +1,79 @@
+"""Bytes on the wire and server CPU per 1k websocket events, JSON vs MessagePack.
+
+Usage: python -m benchmarks.ws_framing [--events 1000] [--sockets 200]
+
+permessage-deflate is modelled the way uvicorn/websockets apply it: one raw
+deflate stream per connection with context takeover, SYNC_FLUSH per message
+and the trailing 00 00 ff ff stripped.
+"""
+import argparse
+import time
+import uuid
+import zlib
+from app.core.websockets import encode_frame, JSON_FORMAT, MSGPACK_FORMAT
+
+def sample_events(n: int):
+    types = ["INCIDENT_CREATED", "INCIDENT_UPDATED", "COMMENT_CREATED"]
+    for i in range(n):
+        t = types[i % len(types)]
+        if t == "COMMENT_CREATED":
+            yield {"type": t, "incident_id": str(uuid.uuid4())}
+        else:
+            yield {"type": t, "id": str(uuid.uuid4())}
+
+def frame_header_len(payload_len: int) -> int:
+    # Server-to-client frames are unmasked
+    if payload_len < 126:
+        return 2
+    if payload_len < 65536:
+        return 4
+    return 10
+
+def deflate(compressor, payload: bytes) -> bytes:
+    data = compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    return data[:-4] if data.endswith(b"\x00\x00\xff\xff") else data
+
+def measure(fmt: str, events, sockets: int):
+    to_bytes = (lambda f: f.encode()) if fmt == JSON_FORMAT else (lambda f: f)
+
+    start = time.process_time()
+    frames = [to_bytes(encode_frame(e, fmt)) for e in events]
+    encode_once = time.process_time() - start
+
+    start = time.process_time()
+    for _ in range(sockets):
+        for e in events:
+            to_bytes(encode_frame(e, fmt))
+    encode_per_socket = time.process_time() - start
+
+    raw = sum(len(f) + frame_header_len(len(f)) for f in frames)
+
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    start = time.process_time()
+    deflated = [deflate(compressor, f) for f in frames]
+    deflate_cpu = time.process_time() - start
+    compressed = sum(len(f) + frame_header_len(len(f)) for f in deflated)
+
+    return {
+        "raw_bytes": raw,
+        "deflate_bytes": compressed,
+        "encode_ms": encode_once * 1000,
+        "encode_per_socket_ms": encode_per_socket * 1000,
+        "deflate_ms": deflate_cpu * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=1000)
+    parser.add_argument("--sockets", type=int, default=200)
+    args = parser.parse_args()
+
+    events = list(sample_events(args.events))
+    print(f"{args.events} events, fan-out to {args.sockets} sockets")
+    print(f"{'format':<10}{'raw B':>10}{'deflate B':>12}{'encode ms':>12}{'deflate ms':>12}{'encode x sockets ms':>22}")
+    for fmt in (JSON_FORMAT, MSGPACK_FORMAT):
+        r = measure(fmt, events, args.sockets)
+        print(f"{fmt:<10}{r['raw_bytes']:>10}{r['deflate_bytes']:>12}{r['encode_ms']:>12.2f}{r['deflate_ms']:>12.2f}{r['encode_per_socket_ms']:>22.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from sqlalchemy.orm import Session
 from app.core.database import SessionLocal
 from app.models.models import SLAPolicy, IncidentPriority, Category, ServiceItem, Department
+from app.services import reference_cache
 import uuid
 
 def seed():
@@ -39,6 +40,8 @@ def seed():
             if not existing:
                 db.add(ServiceItem(**item))
 
+        # Running workers drop their cached copies
+        reference_cache.bump(db, *reference_cache.KINDS)
         db.commit()
         print("Seed data created successfully.")
     except Exception as e:
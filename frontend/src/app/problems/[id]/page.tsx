@@ -1,7 +1,8 @@
 'use client';
 
-import { useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
+import { useInfiniteQuery, useQuery, useMutation, useQueryClient } from '@tanstack/react-query';
 import api from '@/lib/api';
+import { firstKeysetCursor, nextKeysetCursor, KeysetCursor, KeysetPage } from '@/lib/keyset';
 import { DashboardLayout } from '@/components/layout/dashboard-layout';
 import { Card } from '@/components/ui/card';
 import { Button } from '@/components/ui/button';
@@ -129,6 +130,20 @@ export default function ProblemDetailPage() {
     }
   });
 
+  const {
+    data: linkedPages,
+    fetchNextPage: fetchMoreLinkedIncidents,
+    hasNextPage: hasMoreLinkedIncidents,
+    isFetchingNextPage: isFetchingLinkedIncidents,
+  } = useInfiniteQuery({
+    queryKey: ['problem-incidents', id],
+    queryFn: async ({ pageParam }: { pageParam: KeysetCursor }) =>
+      (await api.get<KeysetPage<any>>(`/problems/${id}/incidents`, { params: { limit: 50, ...pageParam } })).data,
+    initialPageParam: firstKeysetCursor,
+    getNextPageParam: nextKeysetCursor,
+  });
+  const linkedIncidents = linkedPages?.pages.flatMap((page) => page.items) ?? [];
+
   const { data: allIncidents = [] } = useQuery({
     queryKey: ['all-incidents'],
     queryFn: async () => (await api.get('/incidents/')).data,
@@ -139,6 +154,7 @@ export default function ProblemDetailPage() {
     onSuccess: () => {
       toast.success('Incident linked to problem');
       queryClient.invalidateQueries({ queryKey: ['problem', id] });
+      queryClient.invalidateQueries({ queryKey: ['problem-incidents', id] });
       setIsLinkIncidentOpen(false);
     }
   });
@@ -475,7 +491,7 @@ export default function ProblemDetailPage() {
               </div>
               
               <div className="grid gap-3">
-                {problem.incidents?.map((inc: any) => (
+                {linkedIncidents.map((inc: any) => (
                   <Card key={inc.id} className="p-4 bg-black/20 border-primary/10 flex justify-between items-center group hover:border-primary/30 transition-all">
                     <div className="flex items-center gap-4">
                       <Ticket className="w-4 h-4 text-primary/60 group-hover:text-primary transition-colors" />
@@ -487,7 +503,18 @@ export default function ProblemDetailPage() {
                     <Badge variant="outline" className="text-[9px] h-4 uppercase">{inc.status}</Badge>
                   </Card>
                 ))}
-                {!problem.incidents?.length && (
+                {hasMoreLinkedIncidents && (
+                  <Button
+                    variant="ghost"
+                    size="sm"
+                    className="w-full text-xs"
+                    onClick={() => fetchMoreLinkedIncidents()}
+                    disabled={isFetchingLinkedIncidents}
+                  >
+                    {isFetchingLinkedIncidents ? 'Loading...' : 'Load more incidents'}
+                  </Button>
+                )}
+                {!linkedIncidents.length && (
                   <div className="text-center py-12 text-muted-foreground border-2 border-dashed border-primary/5 rounded-2xl flex flex-col items-center gap-3 opacity-40">
                     <Ticket className="w-8 h-8 opacity-20" />
                     <p className="text-xs font-bold uppercase tracking-widest">No Linked Incidents</p>
@@ -1,8 +1,9 @@
 'use client';
 
 import { useState } from 'react';
-import { useQuery, useMutation } from '@tanstack/react-query';
+import { useInfiniteQuery, useMutation } from '@tanstack/react-query';
 import api from '@/lib/api';
+import { firstKeysetCursor, nextKeysetCursor, KeysetCursor, KeysetPage } from '@/lib/keyset';
 import Link from 'next/link';
 import { DashboardLayout } from '@/components/layout/dashboard-layout';
 import { Card } from '@/components/ui/card';
@@ -41,10 +42,21 @@ export default function ProblemManagementPage() {
   const [newProblem, setNewProblem] = useState({ title: '', description: '', root_cause: '' });
   const [newChange, setNewChange] = useState({ title: '', description: '', risk_level: 'LOW' });
 
-  const { data: problems = [], isLoading, refetch } = useQuery({
+  const {
+    data,
+    isLoading,
+    refetch,
+    fetchNextPage,
+    hasNextPage,
+    isFetchingNextPage,
+  } = useInfiniteQuery({
     queryKey: ['problems'],
-    queryFn: async () => (await api.get('/problems/')).data,
+    queryFn: async ({ pageParam }: { pageParam: KeysetCursor }) =>
+      (await api.get<KeysetPage<any>>('/problems/', { params: { limit: 50, ...pageParam } })).data,
+    initialPageParam: firstKeysetCursor,
+    getNextPageParam: nextKeysetCursor,
   });
+  const problems = data?.pages.flatMap((page) => page.items) ?? [];
 
   const createMutation = useMutation({
     mutationFn: async (data: any) => (await api.post('/problems/', data)).data,
@@ -68,7 +80,8 @@ export default function ProblemManagementPage() {
       refetch();
     },
     onError: (err: any) => {
-      toast.error(err.response?.data?.detail || "Failed to submit change");
+      const detail = err.response?.data?.detail;
+      toast.error(detail?.message || detail || "Failed to submit change");
     }
   });
 
@@ -246,12 +259,25 @@ export default function ProblemManagementPage() {
               </Card>
             ))}
 
-            {filteredProblems.length === 0 && (
+            {filteredProblems.length === 0 && !hasNextPage && (
               <div className="flex flex-col items-center justify-center py-20 text-muted-foreground opacity-50 border border-dashed border-primary/20 rounded-lg">
                 <ShieldAlert className="w-12 h-12 mb-4" />
                 <p>No analysis records found.</p>
               </div>
             )}
+
+            {hasNextPage && (
+              <div className="flex justify-center pt-2">
+                <Button
+                  variant="outline"
+                  className="border-primary/20"
+                  onClick={() => fetchNextPage()}
+                  disabled={isFetchingNextPage}
+                >
+                  {isFetchingNextPage ? 'Loading...' : 'Load more'}
+                </Button>
+              </div>
+            )}
           </div>
         )}
 
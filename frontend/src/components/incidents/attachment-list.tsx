@@ -20,6 +20,29 @@ interface AttachmentListProps {
   canDelete?: boolean;
 }
 
+function formatBytes(bytes: number) {
+  if (bytes < 1024) return `${bytes} B`;
+  if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(2)} KB`;
+  if (bytes < 1024 * 1024 * 1024) return `${(bytes / (1024 * 1024)).toFixed(2)} MB`;
+  return `${(bytes / (1024 * 1024 * 1024)).toFixed(2)} GB`;
+}
+
+function AttachmentThumbnail({ attachment }: { attachment: any }) {
+  // Small server-rendered preview instead of the full original
+  const { data: url } = useQuery({
+    queryKey: ['attachment-preview', attachment.id],
+    queryFn: async () => {
+      const response = await api.get(`/incidents/preview/${attachment.id}`, { responseType: 'blob' });
+      return window.URL.createObjectURL(response.data);
+    },
+    staleTime: Infinity,
+    retry: false,
+  });
+
+  if (!url) return <FileIcon className="w-5 h-5 text-primary/60" />;
+  return <img src={url} alt={attachment.file_name} className="w-full h-full object-cover" loading="lazy" />;
+}
+
 export function AttachmentList({ incidentId, canDelete = false }: AttachmentListProps) {
   const queryClient = useQueryClient();
   const [previewFile, setPreviewFile] = useState<any>(null);
@@ -106,9 +129,9 @@ export function AttachmentList({ incidentId, canDelete = false }: AttachmentList
           <Card key={file.id} className="bg-black/20 border-primary/10 p-3 flex items-center justify-between group">
             <div className="flex items-center gap-3 min-w-0">
               <div className="w-10 h-10 rounded bg-primary/10 flex items-center justify-center flex-shrink-0">
-                {isImage(file.content_type) ? (
+                {file.preview_kind === 'thumbnail' ? (
                    <div className="w-full h-full rounded overflow-hidden flex items-center justify-center">
-                      <FileIcon className="w-5 h-5 text-primary/60" />
+                      <AttachmentThumbnail attachment={file} />
                    </div>
                 ) : (
                   <FileIcon className="w-5 h-5 text-primary/60" />
@@ -119,7 +142,7 @@ export function AttachmentList({ incidentId, canDelete = false }: AttachmentList
                   {file.file_name}
                 </p>
                 <p className="text-[9px] text-muted-foreground uppercase font-mono">
-                  {file.file_size} • {file.uploader_name}
+                  {formatBytes(file.file_size)} • {file.uploader_name}
                 </p>
               </div>
             </div>
@@ -0,0 +1,15 @@
+// Keyset-paginated list endpoints return a page of items plus the cursor of the next page
+export type KeysetPage<T> = {
+  items: T[];
+  next_before_created_at?: string | null;
+  next_before_id?: string | null;
+};
+
+export type KeysetCursor = { before_created_at?: string; before_id?: string };
+
+export const firstKeysetCursor: KeysetCursor = {};
+
+export const nextKeysetCursor = <T,>(page: KeysetPage<T>): KeysetCursor | undefined =>
+  page.next_before_id && page.next_before_created_at
+    ? { before_created_at: page.next_before_created_at, before_id: page.next_before_id }
+    : undefined;
@@ -36,13 +36,17 @@ export const useWebSockets = () => {
     let reconnectTimeout: NodeJS.Timeout;
 
     const connect = () => {
-      const url = getWsUrl();
-      if (!url) return;
+      const baseUrl = getWsUrl();
+      if (!baseUrl) return;
+      // Identify the socket so the server can apply per-user connection caps. The token
+      // travels as a subprotocol rather than in the URL, which ends up in access logs.
+      const token = localStorage.getItem('token');
+      const protocols = token ? ['json', `bearer.${token}`] : undefined;
       
-      console.log('[WS] Attempting connection to:', url);
+      console.log('[WS] Attempting connection to:', baseUrl);
       
       try {
-        socket = new WebSocket(url);
+        socket = new WebSocket(baseUrl, protocols);
 
         // Heartbeat interval to keep connection alive
         let heartbeatInterval: NodeJS.Timeout;
@@ -61,6 +65,12 @@ export const useWebSockets = () => {
             const data = JSON.parse(event.data);
             console.log('[WS] Message received:', data);
 
+            // Answer server heartbeats so the connection is not reaped as idle
+            if (data.type === 'PING') {
+              socket.send(JSON.stringify({ type: 'PONG' }));
+              return;
+            }
+
             if (data.type === 'INCIDENT_CREATED' || data.type === 'INCIDENT_UPDATED') {
               console.log('[WS] Force refetching incident queries');
               queryClient.refetchQueries({ 